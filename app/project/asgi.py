@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.MATCHER_PRELOAD:
+    from sandbox.matching import preload_matcher  # noqa: E402
+    preload_matcher()
+
+from sandbox.events import EventStreamApp  # noqa: E402, needs the apps loaded
+from sandbox.views import RECRUITER_ID  # noqa: E402
+
+# Event streams are held by idle coroutines instead of Django's sync iteration
+application = EventStreamApp(django_application, '/inbox/events/', RECRUITER_ID)
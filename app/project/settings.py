@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 import pathlib
 
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'sandbox.profiling.ProfileMiddleware',
+    'sandbox.routing.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,7 +73,8 @@ TEMPLATES = [
         },
     },
     {
-        "BACKEND": "django_jinja.backend.Jinja2",
+        # django_jinja with template render timing
+        "BACKEND": "sandbox.profiling.Jinja2",
         'APP_DIRS': True,
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'OPTIONS': {
@@ -81,6 +85,17 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'project.wsgi.application'
 
+# Per-view limits checked by sandbox.profiling.ProfileMiddleware, keys are url names.
+# Measures: queries, duplicates (repeated SQL), db_ms, render_ms
+VIEW_BUDGETS = {
+    'inbox': {'queries': 5, 'duplicates': 0},
+    'inbox_async': {'queries': 5, 'duplicates': 0},
+    'inbox_thread': {'queries': 2, 'duplicates': 0},
+    'inbox_thread_async': {'queries': 2, 'duplicates': 0},
+}
+# Fail requests over budget while running tests, only log otherwise
+VIEW_BUDGETS_RAISE = 'test' in sys.argv
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -93,9 +108,68 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': 'db',  # Use the service name from docker-compose.yml
         'PORT': '5432',
+        # Persistent connections, also reused by the async views' worker threads
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
     }
 }
 
+# Inbox reads, see sandbox.routing. Same server as default unless REPLICA_HOST is set
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'HOST': os.getenv('REPLICA_HOST', DATABASES['default']['HOST']),
+    'PORT': os.getenv('REPLICA_PORT', DATABASES['default']['PORT']),
+    'TEST': {'MIRROR': 'default'},
+}
+REPLICA_DATABASE = 'replica'
+DATABASE_ROUTERS = ['sandbox.routing.ReplicaRouter']
+# Seconds a client that wrote keeps reading from the primary, covers replication lag
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+# Persistent connections idle for this many seconds are pinged before reuse
+CONN_HEALTH_CHECK_IDLE = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Rendered inbox cards shared by all processes of the host, see sandbox.fragments
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('FRAGMENT_CACHE_DIR', '/tmp/djinni-fragments'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Inbox facet counts, shared so an invalidation reaches every process, see sandbox.facets
+    'facets': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('FACETS_CACHE_DIR', '/tmp/djinni-facets'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+FRAGMENT_LRU_SIZE = 5000
+
+# Candidate matcher of each process, see sandbox.matching. Preloading loads it
+# before serving, once in the master process under gunicorn --preload
+MATCHER_PRELOAD = os.getenv('MATCHER_PRELOAD', '') == '1'
+MATCHER_REFRESH_SECONDS = int(os.getenv('MATCHER_REFRESH_SECONDS', 60))
+
+
+# Email
+# https://docs.djangoproject.com/en/3.2/topics/email/
+# Notification digests, see sandbox.notifications. Defaults to a local debug server:
+# python -m smtpd -n -c DebuggingServer localhost:1025
+
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 1025))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Djinni <notifications@djinni.co>')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -0,0 +1,354 @@
+"""
+Vectorized match scoring for many candidates against one job.
+
+Produces exactly the same scores as ``sandbox.scoring.compute_score`` but
+works on column arrays instead of model instances, so re-scoring all the
+applicants of a job is a handful of NumPy operations.
+"""
+import numpy as np
+
+from .models import JobPosting, MessageThread
+from .scoring import (
+    BREAKDOWN_BITS,
+    ENGLISH_ORDINAL,
+    ENGLISH_STEP_PENALTY,
+    EXPERIENCE_YEARS,
+    WEIGHTS,
+    split_words,
+)
+from .regions import accepted_regions, country_regions
+from .skills import candidate_skill_ids, parse_skills
+
+EMPLOYMENT_FLAGS = {
+    'fulltime': 1,
+    'remote': 2,
+    'parttime': 4,
+    'relocate': 8,
+    'move': 16,
+}
+
+CANDIDATE_FIELDS = (
+    'salary_min',
+    'experience_years',
+    'english_level',
+    'country_code',
+    'primary_keyword',
+    'secondary_keyword',
+    'employment',
+    'can_relocate',
+    'domain_zones',
+    'uninterested_company_types',
+)
+
+
+class TokenSets:
+    """Ragged per-row sets of integer token ids, stored flat."""
+
+    def __init__(self, vocab, values, split):
+        # Profile fields repeat a lot, parse each distinct string once
+        parsed = {}
+        ids, lengths = [], []
+        for value in values:
+            row = parsed.get(value)
+            if row is None:
+                row = parsed[value] = [vocab.setdefault(t, len(vocab)) for t in split(value)]
+            ids.extend(row)
+            lengths.append(len(row))
+        self.vocab = vocab
+        self.ids = np.array(ids, dtype=np.int32)
+        self.row_of = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        self.size = len(lengths)
+
+    @classmethod
+    def _from_arrays(cls, vocab, ids, row_of, size):
+        tokens = cls.__new__(cls)
+        tokens.vocab, tokens.ids, tokens.row_of, tokens.size = vocab, ids, row_of, size
+        return tokens
+
+    def _row_starts(self):
+        """Offset of each row's first token, None unless tokens are stored row by row."""
+        if not hasattr(self, '_starts'):
+            row_of = self.row_of
+            self._starts = None
+            if np.all(row_of[1:] >= row_of[:-1]):
+                self._starts = np.searchsorted(row_of, np.arange(self.size + 1, dtype=np.int32))
+        return self._starts
+
+    def take(self, positions):
+        """Rows at the given distinct positions, in that order."""
+        starts = self._row_starts()
+        if starts is not None:
+            # Gather the rows' slices, in time proportional to their tokens
+            begin = starts[positions]
+            lengths = starts[positions + 1] - begin
+            offsets = np.cumsum(lengths) - lengths
+            index = np.repeat(begin - offsets, lengths) + np.arange(lengths.sum())
+            row_of = np.repeat(np.arange(len(positions), dtype=np.int32), lengths)
+            return self._from_arrays(self.vocab, self.ids[index], row_of, len(positions))
+        new_row = np.full(self.size, -1, dtype=np.int32)
+        new_row[positions] = np.arange(len(positions), dtype=np.int32)
+        keep = new_row[self.row_of] >= 0
+        return self._from_arrays(self.vocab, self.ids[keep], new_row[self.row_of[keep]], len(positions))
+
+    def concat(self, other):
+        assert self.vocab is other.vocab
+        return self._from_arrays(
+            self.vocab,
+            np.concatenate([self.ids, other.ids]),
+            np.concatenate([self.row_of, other.row_of + self.size]),
+            self.size + other.size,
+        )
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.row_of.nbytes
+
+    def count_hits(self, tokens):
+        """Number of the given tokens present in each row."""
+        wanted = [self.vocab[t] for t in tokens if t in self.vocab]
+        if not wanted:
+            return np.zeros(self.size, dtype=np.int64)
+        hits = np.isin(self.ids, wanted)
+        return np.bincount(self.row_of[hits], minlength=self.size)
+
+
+class CandidateColumns:
+    """
+    Scoring fields of a list of candidates as arrays, independent of the job.
+
+    ``rows`` are tuples of ``CANDIDATE_FIELDS`` values, ``skills`` holds each
+    candidate's skills either as free text (the default ``skill_split``) or
+    as already parsed collections such as Skill ids. Countries are kept as
+    region bitmasks (sandbox.regions). Strings (keywords, skill and
+    preference tokens) are integer-coded through ``vocab``, pass the same
+    dict to build columns that can be concatenated.
+    """
+
+    ARRAYS = ('salary', 'experience', 'english', 'regions', 'primary', 'secondary', 'can_relocate', 'employment')
+    TOKENS = ('skills', 'domain_zones', 'company_types')
+
+    def __init__(self, rows, skills, skill_split=parse_skills, vocab=None):
+        (salary, experience, english, country, primary, secondary,
+         employment, can_relocate, domain_zones, company_types) = zip(*rows) if rows else ((),) * 10
+
+        self.vocab = vocab = {} if vocab is None else vocab
+        self.size = len(rows)
+        self.salary = np.array([s or 0 for s in salary], dtype=np.int64)
+        self.experience = np.array([e or 0.0 for e in experience], dtype=np.float64)
+        self.english = np.array([ENGLISH_ORDINAL.get(e, 0) for e in english], dtype=np.int8)
+        self.regions = np.array([country_regions(c) for c in country], dtype=np.int8)
+        self.primary = self._codes((k or '').lower() for k in primary)
+        self.secondary = self._codes((k or '').lower() for k in secondary)
+        self.can_relocate = np.array(can_relocate, dtype=bool)
+        flags = {}
+        for value in set(employment):
+            flags[value] = sum(EMPLOYMENT_FLAGS.get(w, 0) for w in split_words(value))
+        self.employment = np.array([flags[e] for e in employment], dtype=np.int8)
+
+        self.skills = TokenSets(vocab, skills, skill_split)
+        self.domain_zones = TokenSets(vocab, domain_zones, split_words)
+        self.company_types = TokenSets(vocab, company_types, split_words)
+
+    def _codes(self, values):
+        vocab = self.vocab
+        return np.array([vocab.setdefault(v, len(vocab)) for v in values], dtype=np.int32)
+
+    def _code(self, value):
+        """Code of a job-side string, -1 (matching nothing) if no candidate has it."""
+        return self.vocab.get(value, -1)
+
+    def _derive(self, size, column):
+        """Columns sharing the vocab, ``column(name)`` builds each array or TokenSets."""
+        columns = CandidateColumns.__new__(CandidateColumns)
+        columns.vocab, columns.size = self.vocab, size
+        for name in self.ARRAYS + self.TOKENS:
+            setattr(columns, name, column(name))
+        return columns
+
+    def take(self, positions):
+        """Columns of the rows at the given distinct positions, in that order."""
+        positions = np.asarray(positions, dtype=np.int64)
+        return self._derive(len(positions), lambda name: getattr(self, name).take(positions))
+
+    def concat(self, other):
+        """Rows of ``other`` appended, both must share the vocab."""
+        assert self.vocab is other.vocab
+
+        def column(name):
+            if name in self.TOKENS:
+                return getattr(self, name).concat(getattr(other, name))
+            return np.concatenate([getattr(self, name), getattr(other, name)])
+
+        return self._derive(self.size + other.size, column)
+
+    @property
+    def nbytes(self):
+        return (
+            sum(getattr(self, name).nbytes for name in self.ARRAYS)
+            + sum(getattr(self, name).nbytes for name in self.TOKENS)
+        )
+
+    def _full(self, component):
+        return np.full(self.size, WEIGHTS[component], dtype=np.int64)
+
+    def keyword_points(self, job):
+        weight = WEIGHTS['keyword']
+        job_primary = (job.primary_keyword or '').lower()
+        job_secondary = (job.secondary_keyword or '').lower()
+        if not job_primary:
+            return self._full('keyword')
+        primary_code = self._code(job_primary)
+
+        close = self.secondary == primary_code
+        partial = np.zeros(self.size, dtype=bool)
+        if job_secondary:
+            secondary_code = self._code(job_secondary)
+            close |= self.primary == secondary_code
+            partial = self.secondary == secondary_code
+        return np.select(
+            [self.primary == primary_code, close, partial],
+            [weight, weight * 3 // 4, weight // 2],
+            default=0,
+        )
+
+    def skills_points(self, job, wanted):
+        if not wanted:
+            return self._full('skills')
+        return WEIGHTS['skills'] * self.skills.count_hits(wanted) // len(wanted)
+
+    def salary_points(self, job):
+        weight = WEIGHTS['salary']
+        budget = job.salary_max or job.salary_min or 0
+        if budget <= 0:
+            return self._full('salary')
+        falloff = np.maximum(weight * (2 * budget - self.salary) // budget, 0)
+        return np.where(self.salary <= budget, weight, falloff)
+
+    def experience_points(self, job):
+        weight = WEIGHTS['experience']
+        required = EXPERIENCE_YEARS.get(job.exp_years, 0)
+        if required == 0:
+            return self._full('experience')
+        partial = (weight * self.experience / required).astype(np.int64)
+        return np.where(self.experience >= required, weight, partial)
+
+    def english_points(self, job):
+        weight = WEIGHTS['english']
+        required = ENGLISH_ORDINAL.get(job.english_level, 0)
+        english = self.english.astype(np.int64)
+        partial = np.maximum(weight - ENGLISH_STEP_PENALTY * (required - english), 0)
+        return np.where(english >= required, weight, partial)
+
+    def location_points(self, job):
+        weight = WEIGHTS['location']
+        mask = accepted_regions(job)
+        if mask is None:
+            return self._full('location')
+        in_region = (self.regions & mask) != 0
+        relocation = job.relocate_type not in ('', JobPosting.RelocateType.NO_RELOCATE)
+        relocates = self.can_relocate & relocation
+        return np.select([in_region, relocates], [weight, weight // 2], default=0)
+
+    def employment_points(self, job):
+        flags = self.employment
+        remote_type = job.remote_type or ''
+        if remote_type == JobPosting.RemoteType.OFFICE:
+            mask = EMPLOYMENT_FLAGS['fulltime'] | EMPLOYMENT_FLAGS['relocate'] | EMPLOYMENT_FLAGS['move']
+        elif remote_type == JobPosting.RemoteType.FULL_REMOTE:
+            mask = EMPLOYMENT_FLAGS['remote']
+        elif remote_type == JobPosting.RemoteType.PARTLY_REMOTE:
+            mask = EMPLOYMENT_FLAGS['fulltime'] | EMPLOYMENT_FLAGS['remote']
+        else:
+            mask = None
+
+        ok = np.ones(self.size, dtype=bool) if mask is None else (flags & mask) != 0
+        if job.is_parttime:
+            ok &= (flags & EMPLOYMENT_FLAGS['parttime']) != 0
+        return np.where(ok, WEIGHTS['employment'], 0)
+
+    def preferences_points(self, job):
+        domain = (job.domain or '').lower()
+        company_type = (job.company_type or '').lower()
+        dislikes = np.zeros(self.size, dtype=bool)
+        if domain:
+            dislikes |= self.domain_zones.count_hits([domain]) > 0
+        if company_type:
+            dislikes |= self.company_types.count_hits([company_type]) > 0
+        return np.where(dislikes, 0, WEIGHTS['preferences'])
+
+    def components(self, job, job_skills=None):
+        """
+        Points per component, shape ``(len(COMPONENTS), size)``.
+
+        ``job_skills`` must use the same representation as the candidates'
+        skills, by default the job's parsed ``extra_keywords``.
+        """
+        if job_skills is None:
+            job_skills = parse_skills(job.extra_keywords)
+        return np.stack([
+            self.keyword_points(job),
+            self.skills_points(job, set(job_skills)),
+            self.salary_points(job),
+            self.experience_points(job),
+            self.english_points(job),
+            self.location_points(job),
+            self.employment_points(job),
+            self.preferences_points(job),
+        ]).astype(np.int64)
+
+    def scores(self, job, job_skills=None):
+        """Score vector for the job, same order as the loaded rows."""
+        return self.components(job, job_skills).sum(axis=0)
+
+
+def pack_components(components):
+    """Vectorized ``scoring.pack_breakdown`` of a ``components()`` result."""
+    shifts = np.arange(len(components), dtype=np.int64)[:, None] * BREAKDOWN_BITS
+    return (components << shifts).sum(axis=0)
+
+
+def rescore_job(job, batch_size=1000, candidate_ids=None, features=None):
+    """
+    Recompute ``match_score`` of every thread of the job, or only of the
+    given candidates' threads, returns the number of changed rows.
+
+    Skill overlap is computed over the linked Skill ids, see sandbox.skills.
+    Candidate columns come from the ``features`` store when given
+    (sandbox.features), otherwise they are read along with the threads.
+    """
+    threads = MessageThread.objects.filter(job=job).order_by('id')
+    if candidate_ids is not None:
+        threads = threads.filter(candidate_id__in=candidate_ids)
+    candidate_fields = () if features is not None else (f'candidate__{f}' for f in CANDIDATE_FIELDS)
+    rows = list(threads.values_list(
+        'id', 'match_score', 'score_breakdown', 'candidate_id', *candidate_fields
+    ))
+    if not rows:
+        return 0
+
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    current = np.array([r[1] for r in rows], dtype=np.int64)
+    current_breakdown = np.array([r[2] for r in rows], dtype=np.int64)
+    if features is not None:
+        columns = features.columns_for([r[3] for r in rows])
+    else:
+        skill_ids = candidate_skill_ids(threads.values('candidate_id'))
+        columns = CandidateColumns(
+            [r[4:] for r in rows],
+            [tuple(skill_ids.get(r[3], ())) for r in rows],
+            skill_split=lambda ids: ids,
+        )
+    components = columns.components(job, job.skills.values_list('id', flat=True))
+    scores = components.sum(axis=0)
+    breakdown = pack_components(components)
+
+    changed = np.flatnonzero((scores != current) | (breakdown != current_breakdown))
+    MessageThread.objects.bulk_update(
+        [
+            MessageThread(id=int(ids[i]), match_score=int(scores[i]), score_breakdown=int(breakdown[i]))
+            for i in changed
+        ],
+        ['match_score', 'score_breakdown'],
+        batch_size=batch_size,
+    )
+    return len(changed)
@@ -0,0 +1,26 @@
+"""Small helpers shared by the bench_* management commands."""
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def timed(fn, *args, **kwargs):
+    """``(seconds, result)`` of one call."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def summary(samples):
+    """p50/p95/max of timings in seconds, formatted in ms."""
+    return (
+        f"p50 {percentile(samples, 50) * 1000:8.2f} ms  "
+        f"p95 {percentile(samples, 95) * 1000:8.2f} ms  "
+        f"max {max(samples, default=0) * 1000:8.2f} ms"
+    )
@@ -0,0 +1,101 @@
+"""
+Bulk inbox actions.
+
+Each action changes every selected thread of a recruiter with one UPDATE
+instead of a save per thread. Save signals do not run for it, so the
+action does their work in bulk within the same transaction: the affected
+rows are locked and read first, their counter deltas are computed from the
+before and after states, action messages are added with one bulk_create
+and the threads move to them (``last_message``, ``last_updated``) in the
+same UPDATE.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from . import counters
+from .facets import invalidate_facet_counts
+from .models import Action, Bucket, Message, MessageThread
+
+STATE_FIELDS = ('id', 'job_id', 'candidate_id', 'bucket', 'last_sender', 'last_seen_recruiter', 'last_updated')
+
+# Message added to threads moved into the bucket
+BUCKET_ACTIONS = {
+    Bucket.ARCHIVE.value: Action.ARCHIVE,
+    Bucket.NOTINTERESTED.value: Action.NOTINTERESTED,
+    Bucket.SHORTLIST.value: Action.SHORTLIST,
+}
+
+
+def _state(recruiter_id, row):
+    return counters.ThreadState(
+        recruiter_id,
+        row['job_id'],
+        row['bucket'],
+        counters.is_unread(row['bucket'], row['last_sender'], row['last_seen_recruiter'], row['last_updated']),
+    )
+
+
+def _apply(recruiter_id, selected, pending, changes, action=None):
+    """
+    Set ``changes`` on the ``selected`` threads (ids or a queryset) matching
+    ``pending``, adding an ``action`` message to each. Returns how many changed.
+    """
+    threads = MessageThread.objects.filter(recruiter_id=recruiter_id, id__in=selected).filter(pending)
+    with transaction.atomic():
+        # Id order so concurrent bulk actions lock rows in the same order
+        rows = list(threads.order_by('id').select_for_update().values(*STATE_FIELDS))
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+
+        if action:
+            now = timezone.now()
+            Message.objects.bulk_create([
+                Message(
+                    thread_id=row['id'], recruiter_id=recruiter_id, candidate_id=row['candidate_id'],
+                    job_id=row['job_id'], sender=Message.Sender.RECRUITER, action=action, created=now,
+                )
+                for row in rows
+            ])
+            # Same as a message saved one by one, see signals.advance_thread_to_new_message
+            changes = {
+                **changes,
+                'last_updated': now,
+                'last_sender': Message.Sender.RECRUITER,
+                'last_message': Subquery(
+                    Message.objects.filter(thread_id=OuterRef('pk')).order_by('-created', '-id').values('id')[:1]
+                ),
+            }
+        MessageThread.objects.filter(id__in=ids).update(**changes)
+
+        counters.threads_changed(
+            (_state(recruiter_id, row), _state(recruiter_id, {**row, **changes})) for row in rows
+        )
+        invalidate_facet_counts(recruiter_id)
+    return len(rows)
+
+
+def move_to_bucket(recruiter_id, selected, bucket):
+    bucket = Bucket(bucket).value
+    return _apply(recruiter_id, selected, ~Q(bucket=bucket), {'bucket': bucket}, BUCKET_ACTIONS.get(bucket))
+
+
+def set_favorite(recruiter_id, selected, favorite=True):
+    return _apply(recruiter_id, selected, ~Q(recruiter_favorite=favorite), {'recruiter_favorite': favorite})
+
+
+def mark_read(recruiter_id, selected):
+    unseen = Q(last_seen_recruiter__isnull=True) | Q(last_seen_recruiter__lt=F('last_updated'))
+    return _apply(recruiter_id, selected, unseen, {'last_seen_recruiter': timezone.now()})
+
+
+# Bulk action name -> function(recruiter_id, selected)
+ACTIONS = {
+    **{bucket.value: partial(move_to_bucket, bucket=bucket.value) for bucket in Bucket},
+    'favorite': partial(set_favorite, favorite=True),
+    'unfavorite': partial(set_favorite, favorite=False),
+    'read': mark_read,
+}
@@ -0,0 +1,199 @@
+"""
+Denormalized inbox counters.
+
+``InboxCounter`` rows (one per recruiter with ``job=None`` plus one per job)
+and the ``JobPosting`` count fields are kept in step incrementally: save
+signals turn every thread state change and every new message into F()
+increments. ``reconcile_counters`` recomputes everything from the source
+tables in bulk to repair drift, e.g. after queryset updates.
+"""
+from collections import Counter, namedtuple
+from datetime import datetime, time
+
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Action, ArchivedMessage, Bucket, InboxCounter, JobPosting, Message, MessageThread
+
+BUCKET_COLUMNS = {bucket.value: f'bucket_{bucket.value}' for bucket in Bucket}
+COUNTER_COLUMNS = ('unread', *BUCKET_COLUMNS.values())
+
+# Threads the recruiter is done with never count as unread
+CLOSED_BUCKETS = (Bucket.ARCHIVE.value, Bucket.NOTINTERESTED.value)
+
+UNREAD = (
+    Q(last_sender=Message.Sender.CANDIDATE)
+    & ~Q(bucket__in=CLOSED_BUCKETS)
+    & (Q(last_seen_recruiter__isnull=True) | Q(last_seen_recruiter__lt=F('last_updated')))
+)
+
+ThreadState = namedtuple('ThreadState', 'recruiter_id job_id bucket unread')
+
+
+def is_unread(bucket, last_sender, last_seen_recruiter, last_updated):
+    """Python twin of the UNREAD condition."""
+    return (
+        last_sender == Message.Sender.CANDIDATE
+        and bucket not in CLOSED_BUCKETS
+        and (last_seen_recruiter is None or last_seen_recruiter < last_updated)
+    )
+
+
+def thread_state(thread, loaded=False):
+    value = thread.loaded_value if loaded else (lambda field: getattr(thread, field))
+    return ThreadState(
+        value('recruiter_id'),
+        value('job_id'),
+        value('bucket'),
+        is_unread(value('bucket'), value('last_sender'), value('last_seen_recruiter'), value('last_updated')),
+    )
+
+
+def _counter_rows(recruiter_id, job_id):
+    """Ids of the counter rows a change to a thread of this recruiter and job touches."""
+    ids = []
+    for key_job_id in (None, job_id) if job_id else (None,):
+        counter, _ = InboxCounter.objects.get_or_create(recruiter_id=recruiter_id, job_id=key_job_id)
+        ids.append(counter.pk)
+    return ids
+
+
+def _increment(recruiter_id, job_id, changes):
+    changes = {column: n for column, n in changes.items() if n}
+    if not changes:
+        return
+    InboxCounter.objects.filter(pk__in=_counter_rows(recruiter_id, job_id)).update(
+        **{column: F(column) + n for column, n in changes.items()}
+    )
+    if job_id and changes.get('unread'):
+        JobPosting.objects.filter(pk=job_id).update(unread_count=F('unread_count') + changes['unread'])
+
+
+def _state_changes(state, sign):
+    changes = Counter(unread=sign * int(state.unread))
+    if state.bucket in BUCKET_COLUMNS:
+        changes[BUCKET_COLUMNS[state.bucket]] += sign
+    return changes
+
+
+def threads_changed(transitions):
+    """Move the counters for ``(before, after)`` ThreadState pairs, ``before`` is None for new threads."""
+    deltas = {}
+    for before, after in transitions:
+        if before == after:
+            continue
+        if before is not None:
+            deltas.setdefault((before.recruiter_id, before.job_id), Counter()).update(_state_changes(before, -1))
+        deltas.setdefault((after.recruiter_id, after.job_id), Counter()).update(_state_changes(after, 1))
+
+    for (recruiter_id, job_id), changes in deltas.items():
+        _increment(recruiter_id, job_id, changes)
+
+
+def thread_saved(thread, created):
+    """Move the counters from the thread's loaded state to its current one."""
+    before = None if created else thread_state(thread, loaded=True)
+    threads_changed([(before, thread_state(thread))])
+
+
+def message_created(message):
+    if message.action == Action.APPLY:
+        if message.job_id:
+            JobPosting.objects.filter(pk=message.job_id).update(
+                applications_count=F('applications_count') + 1
+            )
+        today = timezone.localdate()
+        if timezone.localdate(message.created) == today:
+            InboxCounter.objects.filter(pk__in=_counter_rows(message.recruiter_id, message.job_id)).update(
+                applications_today=Case(
+                    When(applications_day=today, then=F('applications_today') + 1),
+                    default=Value(1),
+                ),
+                applications_day=today,
+            )
+    elif message.action == Action.POKE and message.job_id:
+        JobPosting.objects.filter(pk=message.job_id).update(sent_count=F('sent_count') + 1)
+
+
+def recruiter_counter(recruiter_id):
+    """The recruiter-wide counter row, unsaved zeros if there is none yet."""
+    counter = InboxCounter.objects.filter(recruiter_id=recruiter_id, job__isnull=True).first()
+    return counter or InboxCounter(recruiter_id=recruiter_id)
+
+
+def reconcile_counters(recruiter_ids=None, batch_size=500):
+    """Recompute all counters from threads and messages, returns the number of repaired rows."""
+    today = timezone.localdate()
+    day_start = timezone.make_aware(datetime.combine(today, time.min))
+
+    threads = MessageThread.objects.order_by()
+    messages = Message.objects.order_by()
+    archived = ArchivedMessage.objects.order_by()
+    counters = InboxCounter.objects.all()
+    jobs = JobPosting.objects.all()
+    if recruiter_ids is not None:
+        threads = threads.filter(recruiter_id__in=recruiter_ids)
+        messages = messages.filter(recruiter_id__in=recruiter_ids)
+        archived = archived.filter(recruiter_id__in=recruiter_ids)
+        counters = counters.filter(recruiter_id__in=recruiter_ids)
+        jobs = jobs.filter(recruiter_id__in=recruiter_ids)
+
+    aggregates = {'unread': Count('id', filter=UNREAD)}
+    for bucket, column in BUCKET_COLUMNS.items():
+        aggregates[column] = Count('id', filter=Q(bucket=bucket))
+
+    expected = {}
+
+    def add(key, column, n):
+        expected.setdefault(key, Counter())[column] += n
+
+    for row in threads.values('recruiter_id', 'job_id').annotate(**aggregates):
+        for column in COUNTER_COLUMNS:
+            add((row['recruiter_id'], None), column, row[column])
+            if row['job_id']:
+                add((row['recruiter_id'], row['job_id']), column, row[column])
+
+    applied_today = messages.filter(action=Action.APPLY, created__gte=day_start)
+    for row in applied_today.values('recruiter_id', 'job_id').annotate(n=Count('id')):
+        add((row['recruiter_id'], None), 'applications_today', row['n'])
+        if row['job_id']:
+            add((row['recruiter_id'], row['job_id']), 'applications_today', row['n'])
+
+    fields = [*COUNTER_COLUMNS, 'applications_today', 'applications_day']
+    existing = {(c.recruiter_id, c.job_id): c for c in counters}
+    to_update, to_create = [], []
+    for key in expected.keys() | existing.keys():
+        values = {column: expected.get(key, {}).get(column, 0) for column in fields[:-1]}
+        values['applications_day'] = today
+        counter = existing.get(key)
+        if counter is None:
+            to_create.append(InboxCounter(recruiter_id=key[0], job_id=key[1], **values))
+        elif any(getattr(counter, f) != v for f, v in values.items()):
+            for f, v in values.items():
+                setattr(counter, f, v)
+            to_update.append(counter)
+    InboxCounter.objects.bulk_update(to_update, fields, batch_size=batch_size)
+    InboxCounter.objects.bulk_create(to_create, batch_size=batch_size)
+
+    # Per-job fields on JobPosting
+    job_counts = {}
+    for row in threads.filter(job__isnull=False).values('job_id').annotate(n=Count('id', filter=UNREAD)):
+        job_counts.setdefault(row['job_id'], Counter())['unread_count'] = row['n']
+    # Totals over the whole history, archived months included
+    for history in (messages, archived):
+        per_action = history.filter(job__isnull=False, action__in=[Action.APPLY, Action.POKE])
+        for row in per_action.values('job_id', 'action').annotate(n=Count('id')):
+            column = 'applications_count' if row['action'] == Action.APPLY else 'sent_count'
+            job_counts.setdefault(row['job_id'], Counter())[column] += row['n']
+
+    job_fields = ['unread_count', 'applications_count', 'sent_count']
+    stale_jobs = []
+    for job in jobs.only('id', *job_fields).iterator():
+        values = {f: job_counts.get(job.id, {}).get(f, 0) for f in job_fields}
+        if any(getattr(job, f) != v for f, v in values.items()):
+            for f, v in values.items():
+                setattr(job, f, v)
+            stale_jobs.append(job)
+    JobPosting.objects.bulk_update(stale_jobs, job_fields, batch_size=batch_size)
+
+    return len(to_update) + len(to_create) + len(stale_jobs)
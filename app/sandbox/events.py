@@ -0,0 +1,234 @@
+"""
+Inbox change events.
+
+An insert trigger on sandbox_message (migrations 0012 and 0014) sends
+``NOTIFY inbox_events, '<recruiter id>'`` on commit. Each process keeps a
+single ``Listener``: a daemon thread with its own connection, blocked in
+select() until a notification arrives, which then wakes the subscriptions
+of that recruiter. Subscribers are only told that something changed, they
+fetch the changed cards from the delta endpoint (``views.inbox_changes``).
+
+Event streams are served by ``event_stream`` (a blocking generator for the
+sync view, one server thread per client) and by ``EventStreamApp``, an
+ASGI app holding one idle coroutine per client, see project/asgi.py.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'inbox_events'
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT = 15
+RECONNECT_DELAY = 1
+
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+# Tell EventSource to reconnect after 5s if the stream drops
+RETRY = b'retry: 5000\n\n'
+PING = b': ping\n\n'
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class Subscription:
+    """Wakes when the recruiter's inbox changes."""
+
+    def __init__(self, recruiter_id):
+        self.recruiter_id = recruiter_id
+        self._event = threading.Event()
+
+    def notify(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        """Whether a change arrived within ``timeout`` seconds."""
+        changed = self._event.wait(timeout)
+        self._event.clear()
+        return changed
+
+
+class AsyncSubscription(Subscription):
+    """``Subscription`` waited on from the event loop it was created in."""
+
+    def __init__(self, recruiter_id):
+        self.recruiter_id = recruiter_id
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+class Listener:
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_read, self._stop_write = os.pipe()
+        # Set while listening
+        self.connected = threading.Event()
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.recruiter_id].add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='inbox-events', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.recruiter_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.recruiter_id]
+
+    def stop(self):
+        os.write(self._stop_write, b'x')
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._stop_read)
+        os.close(self._stop_write)
+
+    def _publish(self, recruiter_ids=None):
+        """Wake the subscribers of the given recruiters, of all if None."""
+        with self._lock:
+            if recruiter_ids is None:
+                woken = [s for subscribers in self._subscriptions.values() for s in subscribers]
+            else:
+                woken = [s for r in recruiter_ids for s in self._subscriptions.get(r, ())]
+        for subscription in woken:
+            subscription.notify()
+
+    def _connect(self):
+        params = connections[self.alias].get_connection_params()
+        connection = psycopg2.connect(**params)
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        connection.cursor().execute(f"LISTEN {CHANNEL}")
+        return connection
+
+    def _run(self):
+        connection = None
+        while True:
+            try:
+                if connection is None:
+                    connection = self._connect()
+                    self.connected.set()
+                    # Changes may have been missed while disconnected
+                    self._publish()
+                readable, _, _ = select.select([connection, self._stop_read], [], [])
+                if self._stop_read in readable:
+                    break
+                connection.poll()
+                recruiter_ids = set()
+                while connection.notifies:
+                    recruiter_ids.add(int(connection.notifies.pop(0).payload))
+                self._publish(recruiter_ids)
+            except psycopg2.Error:
+                logger.exception("Inbox event listener lost its connection")
+                self.connected.clear()
+                if connection is not None:
+                    connection.close()
+                connection = None
+                time.sleep(RECONNECT_DELAY)
+        self.connected.clear()
+        if connection is not None:
+            connection.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def listener():
+    """The listener of this process, started with its first subscription."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = Listener()
+        return _listener
+
+
+def stop_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def event_stream(recruiter_id, heartbeat=HEARTBEAT):
+    """Event stream body for a sync StreamingHttpResponse."""
+    source = listener()
+    subscription = source.subscribe(Subscription(recruiter_id))
+    try:
+        yield RETRY
+        while True:
+            yield format_event('changed', {}) if subscription.wait(heartbeat) else PING
+    finally:
+        source.unsubscribe(subscription)
+
+
+class EventStreamApp:
+    """ASGI app serving the event stream at ``path``, other requests go to ``app``."""
+
+    def __init__(self, app, path, recruiter_id, heartbeat=HEARTBEAT):
+        self.app = app
+        self.path = path
+        self.recruiter_id = recruiter_id
+        self.heartbeat = heartbeat
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.app(scope, receive, send)
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                *((k.lower().encode(), v.encode()) for k, v in STREAM_HEADERS.items()),
+            ],
+        })
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        source = listener()
+        subscription = source.subscribe(AsyncSubscription(self.recruiter_id))
+        try:
+            await send({'type': 'http.response.body', 'body': RETRY, 'more_body': True})
+            while not disconnected.done():
+                changed = asyncio.ensure_future(subscription.wait(self.heartbeat))
+                await asyncio.wait([changed, disconnected], return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    changed.cancel()
+                    break
+                body = format_event('changed', {}) if changed.result() else PING
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            source.unsubscribe(subscription)
+            disconnected.cancel()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
@@ -0,0 +1,95 @@
+"""
+Streaming inbox export.
+
+Rows come from a server-side cursor (``values_list().iterator()``), so
+neither the queryset nor the output is ever held in memory: a few thousand
+tuples are fetched at a time and written out in chunks of ``FLUSH_ROWS``.
+The first chunk is sent after the first fetch, whatever the export size.
+Used by ``views.inbox_export`` and the ``export_inbox`` command.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BigIntegerField, Case, CharField, F, Value, When
+
+from .facets import filter_threads
+from .models import MessageThread
+
+
+def _identified(lookup, blank='', output_field=None):
+    """``lookup``, or ``blank`` for anonymous threads, as the inbox hides it."""
+    return Case(When(is_anonymous=True, then=Value(blank)), default=F(lookup), output_field=output_field)
+
+
+# Column -> thread lookup or expression, in output order
+COLUMNS = {
+    'thread_id': 'id',
+    'created': 'created',
+    'last_updated': 'last_updated',
+    'bucket': 'bucket',
+    'first_message': 'first_message',
+    'favorite': 'recruiter_favorite',
+    'match_score': 'match_score',
+    'job_id': 'job_id',
+    'job': 'job__position',
+    'candidate_id': _identified('candidate_id', None, BigIntegerField()),
+    'name': _identified('candidate__name', output_field=CharField()),
+    'position': 'candidate__position',
+    'primary_keyword': 'candidate__primary_keyword',
+    'secondary_keyword': 'candidate__secondary_keyword',
+    'salary_min': 'candidate__salary_min',
+    'experience_years': 'candidate__experience_years',
+    'english_level': 'candidate__english_level',
+    'country': 'candidate__country_code',
+    'skills': 'candidate__skills_cache',
+}
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+CHUNK_SIZE = 2000
+FLUSH_ROWS = 500
+
+
+def export_threads(recruiter_id, params=None, job_ids=(), using=None):
+    """The recruiter's threads matching the inbox filters in ``params``, oldest first."""
+    threads = MessageThread.objects.using(using).filter(recruiter_id=recruiter_id)
+    if params is not None:
+        threads = filter_threads(threads, params)
+    if job_ids:
+        threads = threads.filter(job_id__in=job_ids)
+    return threads.order_by('id')
+
+
+class _Line:
+    """File-like target for csv.writer returning the line instead of writing it."""
+
+    def write(self, line):
+        return line
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(rows):
+    names = list(COLUMNS)
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(threads, format='csv', chunk_size=CHUNK_SIZE):
+    """Text of the export in chunks of up to ``FLUSH_ROWS`` lines."""
+    rows = threads.values_list(*COLUMNS.values()).iterator(chunk_size=chunk_size)
+    lines = _csv_lines(rows) if format == 'csv' else _jsonl_lines(rows)
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= FLUSH_ROWS:
+            yield ''.join(buffer)
+            buffer.clear()
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,140 @@
+"""
+Inbox filter facets.
+
+All facet counts of a recruiter's inbox come from one aggregate query:
+threads are grouped by candidate country and every other facet option is
+a conditional ``Count(..., filter=Q(...))`` summed over those groups.
+Counts are cached per recruiter in the ``facets`` cache, shared by all
+processes, and dropped when a thread changes bucket or gets a new message,
+see sandbox.signals.
+"""
+from django.core.cache import caches
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from .models import COUNTRY_CHOICES, Bucket, EnglishLevel, MessageThread
+
+FACETS_CACHE = 'facets'
+FACETS_CACHE_TIMEOUT = 300
+
+COUNTRY = 'country'
+
+# name -> (label, [(value, label, condition), ...])
+FACETS = {
+    'english': ("English", [
+        (value, label, Q(candidate__english_level=value)) for value, label in EnglishLevel.choices
+    ]),
+    'experience': ("Experience", [
+        ('0-1', "Less than 1 year", Q(candidate__experience_years__lt=1)),
+        ('1-3', "1-3 years", Q(candidate__experience_years__gte=1, candidate__experience_years__lt=3)),
+        ('3-5', "3-5 years", Q(candidate__experience_years__gte=3, candidate__experience_years__lt=5)),
+        ('5+', "5+ years", Q(candidate__experience_years__gte=5)),
+    ]),
+    'salary': ("Salary", [
+        ('fits', "Within budget", Q(candidate__salary_min__lte=F('budget'))),
+        ('above', "Above budget", Q(candidate__salary_min__gt=F('budget'))),
+        ('unknown', "No budget", Q(budget__isnull=True)),
+    ]),
+    'bucket': ("Bucket", [
+        (bucket.value, bucket.value.title(), Q(bucket=bucket.value)) for bucket in Bucket
+    ]),
+    'favorite': ("Favorites", [
+        ('yes', "Favorites", Q(recruiter_favorite=True)),
+    ]),
+}
+
+
+def with_budget(threads):
+    """Annotate the job's salary budget, max or else min, null when unknown."""
+    return threads.annotate(budget=Coalesce(
+        NullIf('job__salary_max', Value(0)), NullIf('job__salary_min', Value(0))
+    ))
+
+
+def filter_threads(threads, params):
+    """Apply the facet filters selected in ``params`` (a QueryDict)."""
+    threads = with_budget(threads)
+    for name, (_, options) in FACETS.items():
+        selected = set(params.getlist(name))
+        conditions = [q for value, _, q in options if value in selected]
+        if conditions:
+            condition = Q()
+            for q in conditions:
+                condition |= q
+            threads = threads.filter(condition)
+
+    countries = params.getlist(COUNTRY)
+    if countries:
+        threads = threads.filter(candidate__country_code__in=countries)
+    return threads
+
+
+def compute_facet_counts(recruiter_id):
+    keys = []
+    aggregates = {'total': Count('id')}
+    for name, (_, options) in FACETS.items():
+        for value, _, condition in options:
+            aggregates[f'f{len(keys)}'] = Count('id', filter=condition)
+            keys.append((name, value))
+
+    threads = with_budget(MessageThread.objects.filter(recruiter_id=recruiter_id))
+    rows = threads.order_by().values('candidate__country_code').annotate(**aggregates)
+
+    counts = {name: {value: 0 for value, _, _ in options} for name, (_, options) in FACETS.items()}
+    countries = {}
+    for row in rows:
+        countries[row['candidate__country_code'] or ''] = row['total']
+        for i, (name, value) in enumerate(keys):
+            counts[name][value] += row[f'f{i}']
+    counts[COUNTRY] = dict(sorted(countries.items(), key=lambda c: -c[1]))
+    return counts
+
+
+def _cache_key(recruiter_id):
+    return f'inbox-facets:{recruiter_id}'
+
+
+def facet_counts(recruiter_id):
+    """Cached ``{facet: {value: count}}`` for the recruiter's whole inbox."""
+    key = _cache_key(recruiter_id)
+    counts = caches[FACETS_CACHE].get(key)
+    if counts is None:
+        counts = compute_facet_counts(recruiter_id)
+        caches[FACETS_CACHE].set(key, counts, FACETS_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_facet_counts(recruiter_id):
+    caches[FACETS_CACHE].delete(_cache_key(recruiter_id))
+
+
+def facet_links(counts, params):
+    """Facets with per-option counts and toggle urls, for templates."""
+    country_names = dict(COUNTRY_CHOICES)
+    facets = [
+        (name, label, [(value, option_label) for value, option_label, _ in options])
+        for name, (label, options) in FACETS.items()
+    ]
+    facets.append((COUNTRY, "Country", [(code, country_names.get(code, code or "Unknown")) for code in counts[COUNTRY]]))
+
+    result = []
+    for name, label, options in facets:
+        selected = params.getlist(name)
+        links = []
+        for value, option_label in options:
+            query = params.copy()
+            query.pop('cursor', None)
+            query.pop('partial', None)
+            values = [v for v in selected if v != value]
+            if value not in selected:
+                values.append(value)
+            query.setlist(name, values)
+            links.append({
+                'value': value,
+                'label': option_label,
+                'count': counts[name].get(value, 0),
+                'selected': value in selected,
+                'url': f'?{query.urlencode()}',
+            })
+        result.append({'name': name, 'label': label, 'options': links})
+    return result
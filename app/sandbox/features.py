@@ -0,0 +1,120 @@
+"""
+Candidate feature store.
+
+Keeps the scoring features of candidates as ``CandidateColumns`` arrays
+indexed by candidate id. Rows are loaded with ``values_list`` (no model
+instances, none of the profile text) and refreshed from
+``Candidate.last_modified``. Storage is append-only: a changed candidate
+gets a new row, the old one is marked dead in ``live`` and dropped when
+the store compacts, which renumbers the rows.
+
+A store is meant for one long-running process such as the rescore worker
+and is not thread-safe.
+"""
+from datetime import timedelta
+from itertools import islice
+
+import numpy as np
+from django.utils import timezone
+
+from .batch_scoring import CANDIDATE_FIELDS, CandidateColumns
+from .models import Candidate
+from .skills import candidate_skill_ids
+
+# Re-read edits committed late with an older last_modified
+REFRESH_OVERLAP = timedelta(seconds=60)
+# Compact once dead rows outnumber live ones
+COMPACT_MIN_ROWS = 10000
+
+
+class CandidateFeatureStore:
+    def __init__(self):
+        self.vocab = {}
+        self.columns = CandidateColumns([], [], vocab=self.vocab)
+        self.position = {}
+        # Candidate id and liveness of each row
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.live = np.zeros(0, dtype=bool)
+        self.compactions = 0
+        self.loaded_until = None
+
+    def __len__(self):
+        return len(self.position)
+
+    def _load(self, candidate_ids):
+        self._add(Candidate.objects.filter(id__in=candidate_ids))
+
+    def _add(self, candidates, chunk_size=20000):
+        rows = candidates.order_by().values_list('id', *CANDIDATE_FIELDS).iterator(chunk_size=chunk_size)
+        added = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            self._append(chunk)
+            added += len(chunk)
+
+        dead = self.columns.size - len(self.position)
+        if dead > max(len(self.position), COMPACT_MIN_ROWS):
+            self.compact()
+        return added
+
+    def _append(self, rows):
+        ids = [row[0] for row in rows]
+        skills = candidate_skill_ids(ids)
+        fresh = CandidateColumns(
+            [row[1:] for row in rows],
+            [tuple(skills.get(candidate_id, ())) for candidate_id in ids],
+            skill_split=lambda skill_ids: skill_ids,
+            vocab=self.vocab,
+        )
+        self.live[[self.position[i] for i in ids if i in self.position]] = False
+        start = self.columns.size
+        self.columns = self.columns.concat(fresh)
+        self.ids = np.concatenate([self.ids, np.array(ids, dtype=np.int64)])
+        self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+        for offset, candidate_id in enumerate(ids):
+            self.position[candidate_id] = start + offset
+
+    def load(self, candidates):
+        """Add or reload the candidates of a queryset, returns how many."""
+        started = timezone.now()
+        added = self._add(candidates)
+        if self.loaded_until is None:
+            self.loaded_until = started
+        return added
+
+    def discard(self, candidate_ids):
+        """Drop the given candidates, returns how many were stored."""
+        dropped = [self.position.pop(i) for i in candidate_ids if i in self.position]
+        self.live[dropped] = False
+        return len(dropped)
+
+    def refresh(self):
+        """Reload the stored candidates modified since the last refresh, returns how many."""
+        started = timezone.now()
+        if self.loaded_until is None or not self.position:
+            self.loaded_until = started
+            return 0
+        modified = Candidate.objects.filter(last_modified__gt=self.loaded_until - REFRESH_OVERLAP)
+        stale = [i for i in modified.values_list('id', flat=True).iterator() if i in self.position]
+        self._load(stale)
+        self.loaded_until = started
+        return len(stale)
+
+    def compact(self):
+        # In row order, keeps the tokens of each row stored together
+        ids = sorted(self.position, key=self.position.get)
+        self.columns = self.columns.take([self.position[i] for i in ids])
+        self.position = {candidate_id: n for n, candidate_id in enumerate(ids)}
+        self.ids = np.array(ids, dtype=np.int64)
+        self.live = np.ones(len(ids), dtype=bool)
+        self.compactions += 1
+
+    def columns_for(self, candidate_ids):
+        """Fresh columns of the given distinct candidates, in that order."""
+        self.refresh()
+        missing = [i for i in candidate_ids if i not in self.position]
+        if missing:
+            self._load(missing)
+        return self.columns.take([self.position[i] for i in candidate_ids])
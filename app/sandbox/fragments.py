@@ -0,0 +1,138 @@
+"""
+Rendered inbox card cache.
+
+Each thread card is cached as HTML under a key that embeds its version:
+thread ``last_updated``, candidate and job ``last_modified``, the last
+message's ``edited`` and the few other loaded fields the card shows. A changed thread or profile gets a new key,
+so nothing is ever invalidated explicitly and stale versions just expire.
+
+Lookups go through a small in-process LRU first, then the shared
+``fragments`` cache backend (one round trip for all misses of a page).
+"""
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .scoring import score_badges
+
+FRAGMENT_CACHE = 'fragments'
+FRAGMENT_TIMEOUT = 24 * 3600
+LRU_SIZE = getattr(settings, 'FRAGMENT_LRU_SIZE', 5000)
+
+CARD_TEMPLATE = 'inbox/_thread_card.html'
+# Bump when the card template changes
+CARD_TEMPLATE_VERSION = 2
+
+
+class LRU:
+    """Thread-safe bounded mapping evicting the least recently used key."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_lru = LRU(LRU_SIZE)
+_stats = Counter()
+
+
+def _timestamp(value):
+    return value.timestamp() if value else 0
+
+
+def card_key(thread):
+    candidate, job, message = thread.candidate, thread.job, thread.last_message
+    version = (
+        CARD_TEMPLATE_VERSION,
+        _timestamp(thread.last_updated),
+        _timestamp(candidate.last_modified),
+        _timestamp(job.last_modified) if job else 0,
+        _timestamp(message.edited) if message else 0,
+        # Fields that change without touching last_updated
+        thread.match_score,
+        thread.score_breakdown,
+        thread.last_message_id,
+        thread.job_id,
+        int(thread.is_anonymous),
+    )
+    return f"inbox-card:{thread.id}:{':'.join(map(str, version))}"
+
+
+def render_cards(threads):
+    """Rendered card HTML of each thread, only cache misses are rendered."""
+    keys = [card_key(thread) for thread in threads]
+    cards = {}
+    for key in keys:
+        html = _lru.get(key)
+        if html is not None:
+            cards[key] = html
+    _stats['lru_hits'] += len(cards)
+
+    missing = [key for key in keys if key not in cards]
+    if missing:
+        shared = caches[FRAGMENT_CACHE].get_many(missing)
+        _stats['shared_hits'] += len(shared)
+        for key, html in shared.items():
+            _lru.set(key, html)
+        cards.update(shared)
+
+    rendered = {}
+    template = None
+    for key, thread in zip(keys, threads):
+        if key in cards or key in rendered:
+            continue
+        template = template or get_template(CARD_TEMPLATE)
+        rendered[key] = template.render({'thread': thread, 'badges': score_badges(thread)})
+    if rendered:
+        _stats['misses'] += len(rendered)
+        caches[FRAGMENT_CACHE].set_many(rendered, FRAGMENT_TIMEOUT)
+        for key, html in rendered.items():
+            _lru.set(key, html)
+        cards.update(rendered)
+
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def fragment_stats():
+    """Hit/miss counters of this process since start or the last reset."""
+    lookups = sum(_stats.values())
+    hits = _stats['lru_hits'] + _stats['shared_hits']
+    return {
+        'lru_hits': _stats['lru_hits'],
+        'shared_hits': _stats['shared_hits'],
+        'misses': _stats['misses'],
+        'hit_ratio': round(hits / lookups, 4) if lookups else None,
+        'lru_size': len(_lru),
+    }
+
+
+def reset_fragment_cache():
+    _lru.clear()
+    _stats.clear()
+    caches[FRAGMENT_CACHE].clear()
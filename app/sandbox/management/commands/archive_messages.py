@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sandbox.partitions import (
+    MONTHS_AHEAD, archive_partitions, ensure_partitions, month_start, months_before, partitions,
+)
+
+
+class Command(BaseCommand):
+    help = "Create the coming monthly message partitions and move old months to the archive, run daily"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=12, help="Months kept hot besides the current one")
+        parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD, help="Partitions created in advance")
+        parser.add_argument('--no-cluster', action='store_false', dest='cluster', help="Skip rewriting archived partitions")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the partitions to archive")
+
+    def handle(self, *args, **options):
+        cutoff = months_before(month_start(timezone.now()), options['keep_months'])
+        if options['dry_run']:
+            for partition in partitions():
+                if partition.start is None and partition.end is not None and partition.end > cutoff:
+                    self.stdout.write(f"Would split {partition.name} at {cutoff:%Y-%m} and archive it")
+                elif partition.end is not None and partition.end <= cutoff:
+                    self.stdout.write(f"Would archive {partition.name}")
+            return
+
+        for name in ensure_partitions(options['months_ahead']):
+            self.stdout.write(f"Created {name}")
+        for partition in archive_partitions(cutoff, cluster=options['cluster']):
+            self.stdout.write(self.style.SUCCESS(f"Archived {partition.name}"))
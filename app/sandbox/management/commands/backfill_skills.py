@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sandbox.models import Candidate, JobPosting
+from sandbox.skills import sync_candidate_skills, sync_job_skills
+
+
+class Command(BaseCommand):
+    help = "Link candidates and jobs to canonical skills parsed from their free-text skills"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def backfill(self, queryset, text_field, sync, batch_size):
+        last_id, total = 0, 0
+        while True:
+            rows = list(
+                queryset.filter(id__gt=last_id).order_by('id').values_list('id', text_field)[:batch_size]
+            )
+            if not rows:
+                return total
+            with transaction.atomic():
+                sync(rows)
+            last_id = rows[-1][0]
+            total += len(rows)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        candidates = self.backfill(Candidate.objects, 'skills_cache', sync_candidate_skills, batch_size)
+        self.stdout.write(f"Linked skills of {candidates} candidates")
+        jobs = self.backfill(JobPosting.objects, 'extra_keywords', sync_job_skills, batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Linked skills of {jobs} jobs"))
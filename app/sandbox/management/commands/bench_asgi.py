@@ -0,0 +1,143 @@
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from sandbox.benchmarks import percentile
+from sandbox.models import Message
+from sandbox.views import RECRUITER_ID
+
+SERVERS = {
+    # Sync views on gunicorn threads
+    'wsgi': (
+        '/', 'gunicorn', 'project.wsgi:application', '--worker-class', 'gthread',
+        '--workers', '{workers}', '--threads', '{threads}', '--bind', '127.0.0.1:{port}',
+    ),
+    # Async views on uvicorn
+    'asgi': (
+        '/async/', 'uvicorn', 'project.asgi:application',
+        '--workers', '{workers}', '--host', '127.0.0.1', '--port', '{port}', '--no-access-log',
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the sync views under WSGI (gunicorn) against the async views under ASGI (uvicorn). "
+        "Runs against the current database, fill it first with generate_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, action='append', help="Concurrent clients, repeatable")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per run")
+        parser.add_argument('--workers', type=int, default=2, help="Server processes")
+        parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker")
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        endpoints = [('inbox', 'inbox/')]
+        longest = (
+            Message.objects.filter(recruiter_id=RECRUITER_ID, thread__isnull=False).order_by()
+            .values('thread_id').annotate(n=Count('id')).order_by('-n').first()
+        )
+        if longest is None:
+            raise CommandError(f"Recruiter {RECRUITER_ID} has no threads, run generate_data first")
+        endpoints.append((f"thread ({longest['n']} messages)", f"inbox/{longest['thread_id']}/"))
+
+        self.stdout.write(
+            f"  {'server':<6} {'endpoint':<24} {'clients':>7} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}"
+        )
+        for name, (prefix, *command) in SERVERS.items():
+            with self.server(command, options):
+                for label, path in endpoints:
+                    for concurrency in options['concurrency'] or [1, 8, 32]:
+                        self.load(options['port'], prefix + path, 2, 1)  # warm up
+                        latencies, errors, elapsed = self.load(
+                            options['port'], prefix + path, concurrency, options['duration']
+                        )
+                        self.stdout.write(
+                            f"  {name:<6} {label:<24} {concurrency:7d} {len(latencies) / elapsed:8.1f} "
+                            f"{percentile(latencies, 50) * 1000:8.1f} {percentile(latencies, 95) * 1000:8.1f} "
+                            f"{percentile(latencies, 99) * 1000:8.1f} {errors:6d}"
+                        )
+
+    def server(self, command, options):
+        command = [part.format(**options) for part in command]
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'project.settings')}
+        process = subprocess.Popen(
+            [sys.executable, '-m', *command], cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.wait_ready(options['port'], process)
+        return ServerProcess(process)
+
+    def wait_ready(self, port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Server exited with code {process.returncode}")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/')
+                connection.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError("Server did not start")
+
+    def load(self, port, path, concurrency, duration):
+        """``(latencies, errors, elapsed)`` of ``concurrency`` keep-alive clients hitting ``path``."""
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def client():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            mine, failed = [], 0
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        failed += 1
+                        continue
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    continue
+                mine.append(time.perf_counter() - started)
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors[0] += failed
+
+        started = time.perf_counter()
+        clients = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return latencies, errors[0], time.perf_counter() - started
+
+
+class ServerProcess:
+    def __init__(self, process):
+        self.process = process
+
+    def __enter__(self):
+        return self.process
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=10)
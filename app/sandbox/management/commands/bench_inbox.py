@@ -0,0 +1,115 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from sandbox import views
+from sandbox.benchmarks import percentile, timed
+from sandbox.models import Message, MessageThread, Recruiter
+from sandbox.pagination import keyset_page
+from sandbox.synthetic import generate
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark the inbox and thread views over growing synthetic data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, action='append',
+            help="Total synthetic messages to measure at, repeatable (default 10k, 100k, 1M)",
+        )
+        parser.add_argument('--recruiters', type=int, default=50, help="New recruiters per scale step")
+        parser.add_argument('--per-thread', type=int, default=10, help="Mean messages per thread")
+        parser.add_argument('--samples', type=int, default=30, help="Requests per endpoint")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Append results as JSON lines to this file")
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic rows")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write("Synthetic rows rolled back")
+
+    def run(self, options):
+        inbox_recruiter, _ = Recruiter.objects.get_or_create(
+            id=views.RECRUITER_ID, defaults={'email': f"recruiter{views.RECRUITER_ID}@example.com"}
+        )
+        factory = RequestFactory()
+        generated = 0
+        for step, scale in enumerate(sorted(options['scale'] or [10_000, 100_000, 1_000_000])):
+            if scale > generated:
+                self.stdout.write(f"\nGenerating {scale - generated} messages...")
+                generate(
+                    scale - generated, options['recruiters'], options['per_thread'],
+                    seed=options['seed'] + step, include=[inbox_recruiter],
+                )
+                generated = scale
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+
+            self.stdout.write(f"\n{scale} messages, {self.inbox_size(inbox_recruiter)} in the inbox")
+            self.stdout.write(f"  {'endpoint':<28} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}")
+            for name, path, params in self.endpoints(inbox_recruiter):
+                timings, queries = self.measure(factory, path, params, options['samples'])
+                result = {
+                    'scale': scale,
+                    'endpoint': name,
+                    'p50_ms': round(percentile(timings, 50) * 1000, 2),
+                    'p95_ms': round(percentile(timings, 95) * 1000, 2),
+                    'queries': queries,
+                }
+                self.stdout.write(
+                    f"  {name:<28} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {queries:8d}"
+                )
+                if options['output']:
+                    with open(options['output'], 'a') as f:
+                        f.write(json.dumps(result) + "\n")
+
+    def inbox_size(self, recruiter):
+        return MessageThread.objects.filter(recruiter=recruiter).count()
+
+    def endpoints(self, recruiter):
+        """``(name, path, query)`` of the requests to measure."""
+        inbox = reverse('inbox')
+        threads = MessageThread.objects.filter(recruiter=recruiter)
+        _, cursor = keyset_page(threads, views.INBOX_ORDERING['recent'], page_size=views.INBOX_PAGE_SIZE)
+        yield 'inbox recent', inbox, {}
+        yield 'inbox score', inbox, {'sort': 'score'}
+        yield 'inbox filtered', inbox, {'english': 'upper', 'salary': 'fits'}
+        if cursor:
+            yield 'inbox page 2', inbox, {'cursor': cursor, 'partial': '1'}
+
+        lengths = (
+            Message.objects.filter(recruiter=recruiter).order_by()
+            .values('thread_id').annotate(n=Count('id')).order_by('n')
+        )
+        lengths = list(lengths.values_list('thread_id', 'n'))
+        if lengths:
+            typical, longest = lengths[len(lengths) // 2], lengths[-1]
+            yield f'thread {typical[1]} messages', reverse('inbox_thread', args=[typical[0]]), {}
+            yield f'thread {longest[1]} messages', reverse('inbox_thread', args=[longest[0]]), {}
+
+    def measure(self, factory, path, params, samples):
+        """Timings of ``samples`` calls of the view, and the queries of the last one."""
+        match = resolve(path)
+        timings = []
+        for _ in range(samples):
+            request = factory.get(path, params)
+            with CaptureQueriesContext(connection) as queries:
+                seconds, response = timed(match.func, request, *match.args, **match.kwargs)
+            if response.status_code != 200:
+                raise AssertionError(f"{path} returned {response.status_code}")
+            timings.append(seconds)
+        return timings, len(queries)
@@ -0,0 +1,63 @@
+import random
+import time
+from itertools import islice, repeat
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from sandbox.batch_scoring import CANDIDATE_FIELDS, CandidateColumns
+from sandbox.matching import CandidateIndex
+from sandbox.skills import parse_skills
+from sandbox.synthetic import synthetic_candidates, synthetic_jobs
+
+
+class Command(BaseCommand):
+    help = "Compare top-K candidate retrieval through the inverted index with scoring every candidate"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=1000000)
+        parser.add_argument('--jobs', type=int, default=20)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        k = options['top']
+        rows, skills = [], []
+        for candidate in synthetic_candidates(options['candidates'], rng):
+            rows.append(tuple(getattr(candidate, f) for f in CANDIDATE_FIELDS))
+            skills.append(candidate.skills_cache)
+        columns = CandidateColumns(rows, skills)
+        del rows, skills
+        jobs = list(islice(synthetic_jobs(repeat(None), rng), options['jobs']))
+
+        started = time.perf_counter()
+        index = CandidateIndex(columns)
+        build_time = time.perf_counter() - started
+
+        full_time = index_time = 0.0
+        scored = 0
+        for job in jobs:
+            job_skills = parse_skills(job.extra_keywords)
+
+            started = time.perf_counter()
+            scores = columns.scores(job, job_skills)
+            expected = np.sort(scores[np.argpartition(scores, -k)[-k:]])[::-1].tolist()
+            full_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            result = index.top(columns, job, k, job_skills=job_skills)
+            index_time += time.perf_counter() - started
+            scored += result.scored
+
+            if [score for _, score in result.matches] != expected:
+                raise AssertionError(f"Top {k} differs from scoring every candidate for {job.position}")
+
+        n, runs = columns.size, len(jobs)
+        self.stdout.write(f"candidates:            {n}")
+        self.stdout.write(f"index build (once):    {build_time * 1000:9.1f} ms")
+        self.stdout.write(f"index memory:          {index.nbytes / 1024 ** 2:9.1f} MB, columns {columns.nbytes / 1024 ** 2:.1f} MB")
+        self.stdout.write(f"score all, top {k}:     {full_time / runs * 1000:9.1f} ms per job")
+        self.stdout.write(f"index top {k}:          {index_time / runs * 1000:9.1f} ms per job")
+        self.stdout.write(f"rows scored exactly:   {scored / runs / n:9.2%}")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {full_time / index_time:.1f}x per job"))
@@ -0,0 +1,57 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from sandbox.batch_scoring import CANDIDATE_FIELDS, CandidateColumns
+from sandbox.models import JobPosting
+from sandbox.scoring import compute_score
+from sandbox.synthetic import synthetic_candidates
+
+
+class Command(BaseCommand):
+    help = "Compare per-object match scoring with the vectorized batch scorer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        candidates = list(synthetic_candidates(options['candidates'], rng))
+        rows = [tuple(getattr(c, f) for f in CANDIDATE_FIELDS) for c in candidates]
+        skills = [c.skills_cache for c in candidates]
+        job = JobPosting(
+            primary_keyword="Python", secondary_keyword="DevOps",
+            extra_keywords="Django, PostgreSQL, Docker, AWS",
+            salary_min=3000, salary_max=4500, exp_years="3y", english_level="upper",
+            accept_region="europe", remote_type="full_remote", relocate_type="company_paid",
+            domain="gambling", company_type="agency",
+        )
+
+        def best_of(fn):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = fn()
+                timings.append(time.perf_counter() - started)
+            return min(timings), result
+
+        scalar_time, expected = best_of(lambda: [compute_score(c, job) for c in candidates])
+        load_time, columns = best_of(lambda: CandidateColumns(rows, skills))
+        vector_time, scores = best_of(lambda: columns.scores(job))
+
+        if scores.tolist() != expected:
+            raise AssertionError("Vectorized scores differ from compute_score")
+
+        n = len(candidates)
+        self.stdout.write(f"candidates:            {n}")
+        self.stdout.write(f"per-object scoring:    {scalar_time * 1000:9.1f} ms")
+        self.stdout.write(f"column load (once):    {load_time * 1000:9.1f} ms")
+        self.stdout.write(f"vectorized scoring:    {vector_time * 1000:9.1f} ms")
+        self.stdout.write(f"column memory:         {columns.nbytes / 1024:9.1f} KB, {columns.nbytes / n:.0f} bytes per candidate")
+        self.stdout.write(self.style.SUCCESS(
+            f"speedup: {scalar_time / vector_time:.1f}x per job, "
+            f"{scalar_time / (load_time + vector_time):.1f}x including load"
+        ))
@@ -0,0 +1,146 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from sandbox.benchmarks import summary, timed
+from sandbox.models import Candidate, Message, MessageThread
+from sandbox.search import SEARCH_LIMIT, SEARCH_SQL, search_params, search_thread_ids
+
+# Most frequent first, texts draw from it with a skew towards the head
+VOCABULARY = (
+    "hello thanks great experience project company vacancy schedule call tomorrow week "
+    "monday friday available position role team offer interview salary remote office hybrid "
+    "stack backend frontend senior middle junior lead english test task contract startup "
+    "product outsource fullstack devops qa data python django java react typescript golang "
+    "aws docker postgres flask fastapi vue rust kotlin swift android ios celery redis kafka "
+    "rabbitmq linux gcp azure terraform upwork freelance kubernetes relocate relocation"
+).split()
+
+# Text of ``words`` random vocabulary words, re-evaluated for every row of ``g``
+RANDOM_TEXT = (
+    "(SELECT string_agg((%(vocabulary)s::text[])[1 + floor(power(random(), 2) * {size})::int], ' ') "
+    "FROM generate_series(1, {words}) WHERE g > 0)"
+)
+
+CANDIDATES_SQL = """
+INSERT INTO sandbox_candidate (
+    email, position, primary_keyword, secondary_keyword, salary_min, employment,
+    experience_years, english_level, country_code, can_relocate, lang, signup_date,
+    skills_cache, moreinfo, looking_for, highlights
+)
+SELECT
+    'bench-' || %(run)s || '-' || g || '@example.com', {position}, 'Python', '', 3000, 'remote',
+    3, 'upper', 'UKR', false, 'EN', now(),
+    {skills}, {moreinfo}, {looking_for}, ''
+FROM generate_series(1, %(count)s) g
+"""
+
+RECRUITERS_SQL = """
+INSERT INTO sandbox_recruiter (email, name, lang, signup_date)
+SELECT 'bench-' || %(run)s || '-' || g || '@example.com', 'Bench ' || g, 'EN', now()
+FROM generate_series(1, %(count)s) g
+"""
+
+THREADS_SQL = """
+INSERT INTO sandbox_messagethread (
+    candidate_id, recruiter_id, last_updated, is_anonymous, candidate_archived, bucket,
+    match_score, score_breakdown, created, first_message, last_sender, iou_bonus
+)
+SELECT c.id, %(first_recruiter)s + (c.id %% %(recruiters)s), now(), true, false, 'inbox',
+    0, 0, now(), 'apply', 'candidate', 0
+FROM sandbox_candidate c
+WHERE c.id > %(after)s
+"""
+
+MESSAGES_SQL = """
+INSERT INTO sandbox_message (body, action, sender, created, candidate_id, recruiter_id, thread_id)
+SELECT {body}, '', 'candidate', now() - random() * interval '365 days',
+    t.candidate_id, t.recruiter_id, t.id
+FROM sandbox_messagethread t, generate_series(1, %(per_thread)s) g
+WHERE t.id > %(after)s
+"""
+
+
+def random_text(words):
+    return RANDOM_TEXT.format(size=len(VOCABULARY), words=words)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark inbox full-text search against icontains on a synthetic corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1_000_000)
+        parser.add_argument('--per-thread', type=int, default=10, help="Messages per thread")
+        parser.add_argument('--recruiters', type=int, default=50)
+        parser.add_argument('--samples', type=int, default=20, help="Recruiters sampled per query")
+        parser.add_argument('--query', action='append', help="Search text, repeatable")
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic rows")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write("Synthetic rows rolled back")
+
+    def last_id(self, model):
+        return model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def run(self, options):
+        per_thread = options['per_thread']
+        threads = max(1, options['messages'] // per_thread)
+        params = {'vocabulary': VOCABULARY, 'run': str(random.getrandbits(32))}
+
+        self.stdout.write(f"Generating {threads} threads with {threads * per_thread} messages...")
+        candidate_start = self.last_id(Candidate)
+        thread_start = self.last_id(MessageThread)
+        with connection.cursor() as cursor:
+            cursor.execute(RECRUITERS_SQL, {**params, 'count': options['recruiters']})
+            cursor.execute("SELECT max(id) - %s + 1 FROM sandbox_recruiter", [options['recruiters']])
+            first_recruiter = cursor.fetchone()[0]
+            cursor.execute(CANDIDATES_SQL.format(
+                position=random_text(3), skills=random_text(8),
+                moreinfo=random_text(60), looking_for=random_text(30),
+            ), {**params, 'count': threads})
+            cursor.execute(THREADS_SQL, {
+                'first_recruiter': first_recruiter, 'recruiters': options['recruiters'], 'after': candidate_start,
+            })
+            cursor.execute(MESSAGES_SQL.format(body=random_text(25)), {
+                **params, 'per_thread': per_thread, 'after': thread_start,
+            })
+            cursor.execute("ANALYZE sandbox_candidate, sandbox_messagethread, sandbox_message")
+
+        recruiter_ids = list(range(first_recruiter, first_recruiter + options['recruiters']))
+        sample = random.sample(recruiter_ids, min(options['samples'], len(recruiter_ids)))
+        for text in options['query'] or ["kubernetes", "relocate", "senior python"]:
+            fts, scan = [], []
+            for recruiter_id in sample:
+                fts.append(timed(search_thread_ids, recruiter_id, text)[0])
+                scan.append(timed(self.icontains, recruiter_id, text)[0])
+            self.stdout.write(f"\n{text!r}")
+            self.stdout.write(f"  full-text search: {summary(fts)}")
+            self.stdout.write(f"  icontains scan:   {summary(scan)}")
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN " + SEARCH_SQL.format(scope=''), [*search_params(sample[0], "kubernetes"), SEARCH_LIMIT]
+            )
+            self.stdout.write("\nPlan:\n" + "\n".join(row[0] for row in cursor.fetchall()))
+
+    def icontains(self, recruiter_id, text):
+        """The naive alternative: substring scans over messages and profiles."""
+        messages = Message.objects.filter(recruiter_id=recruiter_id, body__icontains=text)
+        profiles = MessageThread.objects.filter(recruiter_id=recruiter_id, candidate__in=Candidate.objects.filter(
+            moreinfo__icontains=text) | Candidate.objects.filter(looking_for__icontains=text)
+            | Candidate.objects.filter(highlights__icontains=text) | Candidate.objects.filter(skills_cache__icontains=text)
+        )
+        return list(messages.values_list('thread_id', flat=True)[:SEARCH_LIMIT]) + list(
+            profiles.values_list('id', flat=True)[:SEARCH_LIMIT]
+        )
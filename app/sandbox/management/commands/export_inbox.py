@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox.export import CHUNK_SIZE, FORMATS, export_lines, export_threads
+
+
+class Command(BaseCommand):
+    help = "Stream a recruiter's threads with candidate fields and scores as CSV or JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recruiter', type=int, required=True)
+        parser.add_argument('--job', type=int, action='append', help="Only threads of this job id, repeatable")
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write, standard output by default")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows fetched per round trip")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database alias to read, e.g. replica")
+
+    def handle(self, *args, **options):
+        threads = export_threads(options['recruiter'], job_ids=options['job'] or (), using=options['database'])
+        chunks = export_lines(threads, options['format'], options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sandbox.models import Recruiter
+from sandbox.synthetic import generate
+from sandbox.views import RECRUITER_ID
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic recruiters, jobs, candidates, threads and messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=100_000)
+        parser.add_argument('--recruiters', type=int, default=50)
+        parser.add_argument('--per-thread', type=int, default=10, help="Mean messages per thread")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--no-score', action='store_true', help="Leave match_score at 0")
+
+    def handle(self, *args, **options):
+        # The inbox views act as RECRUITER_ID, give it a share of the data
+        inbox_recruiter, _ = Recruiter.objects.get_or_create(
+            id=RECRUITER_ID, defaults={'email': f"recruiter{RECRUITER_ID}@example.com"}
+        )
+        with transaction.atomic():
+            created = generate(
+                options['messages'], options['recruiters'], options['per_thread'],
+                batch_size=options['batch_size'], seed=options['seed'],
+                include=[inbox_recruiter], score=not options['no_score'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{count} {name}" for name, count in created.items())
+        ))
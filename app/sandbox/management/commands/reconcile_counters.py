@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sandbox.counters import reconcile_counters
+from sandbox.models import Recruiter
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized inbox counters and repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recruiter', type=int, action='append', help="Only this recruiter id, repeatable")
+        parser.add_argument('--chunk', type=int, default=500, help="Recruiters per transaction")
+
+    def handle(self, *args, **options):
+        recruiter_ids = options['recruiter'] or list(Recruiter.objects.order_by('id').values_list('id', flat=True))
+        chunk = options['chunk']
+        repaired = 0
+        for i in range(0, len(recruiter_ids), chunk):
+            with transaction.atomic():
+                repaired += reconcile_counters(recruiter_ids[i:i + chunk])
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} counter rows"))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sandbox.features import CandidateFeatureStore
+from sandbox.rescoring import process_batch, rescore_status
+
+
+class Command(BaseCommand):
+    help = "Rescore threads of edited candidates and jobs from the rescore queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Requests per transaction")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when idle")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+        parser.add_argument('--status', action='store_true', help="Print the queue size and lag, then exit")
+
+    def handle(self, *args, **options):
+        if options['status']:
+            status = rescore_status()
+            self.stdout.write(f"{status['pending']} pending, oldest {status['lag']:.1f}s ago")
+            return
+
+        # Candidates stay loaded between batches, only edited ones are re-read
+        features = CandidateFeatureStore()
+        while True:
+            batch = process_batch(options['batch_size'], features)
+            if batch.requests:
+                self.stdout.write(
+                    f"Rescored {batch.requests} requests, {batch.changed} threads changed, lag {batch.lag:.2f}s"
+                )
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['interval'])
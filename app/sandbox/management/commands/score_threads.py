@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from sandbox.batch_scoring import rescore_job
+from sandbox.models import JobPosting, MessageThread
+from sandbox.scoring import score_threads
+
+
+class Command(BaseCommand):
+    help = "Recompute match scores of message threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recruiter', type=int, help="Only threads of this recruiter id")
+        parser.add_argument('--job', type=int, help="Only threads of this job id")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['job'] and not options['recruiter']:
+            job = JobPosting.objects.get(id=options['job'])
+            updated = rescore_job(job, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Rescored job {job.id}, {updated} threads changed"))
+            return
+
+        threads = MessageThread.objects.order_by('id')
+        if options['recruiter']:
+            threads = threads.filter(recruiter_id=options['recruiter'])
+        if options['job']:
+            threads = threads.filter(job_id=options['job'])
+
+        updated = score_threads(threads, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Scored {updated} threads"))
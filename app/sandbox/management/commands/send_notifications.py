@@ -0,0 +1,65 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from sandbox.notifications import dispatch_batch, notification_status
+
+# Longest wait between retries while sending fails
+MAX_BACKOFF = 300.0
+
+
+class Command(BaseCommand):
+    help = "Send notification digests for new messages and not interested threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Messages and notices per transaction")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when idle")
+        parser.add_argument('--once', action='store_true', help="Exit when nothing is pending")
+        parser.add_argument('--status', action='store_true', help="Print the pending counts, then exit")
+
+    def handle(self, *args, **options):
+        if options['status']:
+            status = notification_status()
+            self.stdout.write(f"{status['messages']} messages and {status['notices']} notices pending")
+            return
+
+        # One SMTP connection for consecutive batches, closed while idle
+        connection = get_connection()
+        failures = 0
+        try:
+            while True:
+                try:
+                    batch = dispatch_batch(options['batch_size'], connection)
+                except OSError as error:
+                    # smtplib errors and timeouts: the batch was rolled back,
+                    # retry it on a new connection, waiting longer each time
+                    if options['once']:
+                        raise CommandError(f"Sending failed: {error!r}")
+                    failures += 1
+                    delay = min(options['interval'] * 2 ** (failures - 1), MAX_BACKOFF)
+                    self.stderr.write(f"Sending failed ({error!r}), retrying in {delay:.0f}s")
+                    self.close(connection)
+                    time.sleep(delay)
+                    continue
+                failures = 0
+                if batch.messages or batch.notices or batch.expired:
+                    self.stdout.write(
+                        f"Notified {batch.messages} messages and {batch.notices} notices in {batch.digests} digests"
+                        + (f", {batch.refused} refused" if batch.refused else "")
+                        + (f", {batch.expired} expired" if batch.expired else "")
+                    )
+                elif options['once']:
+                    return
+                else:
+                    self.close(connection)
+                    time.sleep(options['interval'])
+        finally:
+            self.close(connection)
+
+    def close(self, connection):
+        try:
+            connection.close()
+        except OSError:
+            # Already broken, nothing left to close cleanly
+            pass
@@ -0,0 +1,337 @@
+"""
+Reverse matching: the best candidates for a job.
+
+``CandidateIndex`` is an inverted index over ``CandidateColumns``: for each
+primary keyword, secondary keyword, skill, region mask and English level
+the positions of the rows having it, sorted by code (one argsort per
+field). A query walks the postings of the job's terms only, term at a time,
+to bound every row's score: keyword, skills and English points exactly,
+location from the region, the components not indexed at their full weight.
+Rows are then scored exactly (``CandidateColumns.scores``, equal to
+``compute_score``) in decreasing bound order, in growing blocks, keeping
+the best K on a heap, until the K-th best score reaches the next bound.
+
+``CandidateMatcher`` serves queries from a ``CandidateFeatureStore`` of the
+candidates seen within ``MATCH_ACTIVE_FOR``, kept fresh from
+``Candidate.last_modified`` and ``last_seen``. Rows appended since the index
+was built are always scored; the index is rebuilt once they pass
+``REINDEX_TAIL`` of it, or after the store compacts.
+
+Each process has one ``MatcherService``: a daemon thread loads its matcher
+and then refreshes it every ``MATCHER_REFRESH_SECONDS``, so requests only
+query it and get ``MatcherLoading`` until the first load is done. With
+``MATCHER_PRELOAD`` the WSGI/ASGI entry points load it before serving,
+in the master process of a preforking server so workers share its memory.
+"""
+import heapq
+import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .features import REFRESH_OVERLAP, CandidateFeatureStore
+from .models import Candidate, JobPosting, MessageThread
+from .regions import accepted_regions
+from .scoring import ENGLISH_ORDINAL, ENGLISH_STEP_PENALTY, WEIGHTS
+from .skills import parse_skills
+
+# Components bounded from the index, the others count at full weight
+INDEXED = ('keyword', 'skills', 'english', 'location')
+UNINDEXED_MAX = sum(weight for component, weight in WEIGHTS.items() if component not in INDEXED)
+MAX_SCORE = sum(WEIGHTS.values())
+
+# Rows scored in the first block, each next block is twice as large
+BLOCK_SIZE = 1024
+
+MATCH_ACTIVE_FOR = timedelta(days=180)
+REINDEX_TAIL = 0.05
+REINDEX_MIN_ROWS = 1000
+
+REFRESH_SECONDS = getattr(settings, 'MATCHER_REFRESH_SECONDS', 60)
+
+TopCandidates = namedtuple('TopCandidates', 'matches scored')
+
+logger = logging.getLogger(__name__)
+
+
+class Postings:
+    """Positions of the rows having each code, grouped by code."""
+
+    def __init__(self, codes, rows=None):
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        self.rows = (order if rows is None else rows[order]).astype(np.int32)
+        distinct, starts = np.unique(codes, return_index=True)
+        ends = np.append(starts[1:], len(codes))
+        self.slices = {int(code): (start, end) for code, start, end in zip(distinct, starts, ends)}
+
+    def get(self, code):
+        start, end = self.slices.get(code, (0, 0))
+        return self.rows[start:end]
+
+    def distinct(self):
+        return self.slices.keys()
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes
+
+
+class CandidateIndex:
+    """Inverted index over the first ``size`` rows of some columns."""
+
+    def __init__(self, columns):
+        self.size = columns.size
+        self.vocab = columns.vocab
+        self.primary = Postings(columns.primary)
+        self.secondary = Postings(columns.secondary)
+        self.skills = Postings(columns.skills.ids, columns.skills.row_of)
+        self.english = Postings(columns.english)
+        self.regions = Postings(columns.regions)
+
+    @property
+    def nbytes(self):
+        return sum(p.nbytes for p in (self.primary, self.secondary, self.skills, self.english, self.regions))
+
+    def _keyword_points(self, job, size):
+        weight = WEIGHTS['keyword']
+        job_primary = (job.primary_keyword or '').lower()
+        job_secondary = (job.secondary_keyword or '').lower()
+        if not job_primary:
+            return weight
+        points = np.zeros(size, dtype=np.int16)
+        # Lowest first, a better match overwrites
+        if job_secondary:
+            secondary_code = self.vocab.get(job_secondary, -1)
+            points[self.secondary.get(secondary_code)] = weight // 2
+            points[self.primary.get(secondary_code)] = weight * 3 // 4
+        primary_code = self.vocab.get(job_primary, -1)
+        points[self.secondary.get(primary_code)] = weight * 3 // 4
+        points[self.primary.get(primary_code)] = weight
+        return points
+
+    def _skills_points(self, wanted, size):
+        if not wanted:
+            return WEIGHTS['skills']
+        codes = [self.vocab[s] for s in wanted if s in self.vocab]
+        if not codes:
+            return 0
+        hits = np.bincount(np.concatenate([self.skills.get(code) for code in codes]), minlength=size)
+        return (WEIGHTS['skills'] * hits // len(wanted)).astype(np.int16)
+
+    def _english_points(self, job, size):
+        weight = WEIGHTS['english']
+        required = ENGLISH_ORDINAL.get(job.english_level, 0)
+        points = np.full(size, weight, dtype=np.int16)
+        for level in range(required):
+            points[self.english.get(level)] = max(weight - ENGLISH_STEP_PENALTY * (required - level), 0)
+        return points
+
+    def _location_bound(self, job, size):
+        weight = WEIGHTS['location']
+        mask = accepted_regions(job)
+        if mask is None:
+            return weight
+        # Whether the candidate can relocate is not indexed
+        relocation = job.relocate_type not in ('', JobPosting.RelocateType.NO_RELOCATE)
+        points = np.full(size, weight // 2 if relocation else 0, dtype=np.int16)
+        for regions in self.regions.distinct():
+            if regions & mask:
+                points[self.regions.get(regions)] = weight
+        return points
+
+    def upper_bounds(self, size, job, wanted):
+        """Highest score each of ``size`` rows can get, rows past the index get the maximum."""
+        bounds = np.full(size, UNINDEXED_MAX, dtype=np.int16)
+        bounds += self._keyword_points(job, size)
+        bounds += self._skills_points(wanted, size)
+        bounds += self._english_points(job, size)
+        bounds += self._location_bound(job, size)
+        bounds[self.size:] = MAX_SCORE
+        return bounds
+
+    def top(self, columns, job, k, job_skills=None, eligible=None):
+        """
+        The ``k`` best ``(position, score)`` pairs among the ``eligible``
+        rows (a boolean mask, default all), best first. Ties at the K-th
+        score are broken arbitrarily.
+
+        ``columns`` are those the index was built from, possibly with rows
+        appended. ``job_skills`` must use the candidates' skills
+        representation, by default the job's parsed ``extra_keywords``.
+        """
+        if job_skills is None:
+            job_skills = parse_skills(job.extra_keywords)
+        job_skills = set(job_skills)
+        if k <= 0:
+            return TopCandidates([], 0)
+
+        bounds = self.upper_bounds(columns.size, job, job_skills)
+        order = np.argsort(-bounds, kind='stable')
+        if eligible is not None:
+            order = order[eligible[order]]
+
+        heap = []
+        scored, start, block = 0, 0, BLOCK_SIZE
+        while start < len(order):
+            if len(heap) == k and bounds[order[start]] <= heap[0][0]:
+                break
+            positions = order[start:start + block]
+            start, block = start + block, block * 2
+            scores = columns.take(positions).scores(job, job_skills)
+            scored += len(positions)
+            best = np.argpartition(scores, -k)[-k:] if len(scores) > k else range(len(scores))
+            for i in best:
+                item = (int(scores[i]), int(positions[i]))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        matches = [(position, score) for score, position in sorted(heap, reverse=True)]
+        return TopCandidates(matches, scored)
+
+
+class CandidateMatcher:
+    """
+    Top candidates for a job among the recently active ones, leaving out
+    those who already have a thread for it. Not thread-safe.
+    """
+
+    def __init__(self, store=None, active_for=MATCH_ACTIVE_FOR):
+        self.store = CandidateFeatureStore() if store is None else store
+        self.active_for = active_for
+        self.index = None
+        self._indexed_compactions = None
+        self.checked_until = None
+        self.cutoff = None
+
+    def _active(self, cutoff):
+        return Candidate.objects.filter(Q(last_seen__isnull=True) | Q(last_seen__gte=cutoff))
+
+    def refresh(self):
+        now = timezone.now()
+        cutoff = now - self.active_for
+        store = self.store
+        if self.checked_until is None:
+            store.load(self._active(cutoff))
+        else:
+            since = self.checked_until - REFRESH_OVERLAP
+            store.refresh()
+            appeared = (
+                self._active(cutoff).filter(Q(last_modified__gt=since) | Q(last_seen__gt=since))
+                .values_list('id', flat=True)
+            )
+            missing = [i for i in appeared.iterator() if i not in store.position]
+            if missing:
+                store.load(Candidate.objects.filter(id__in=missing))
+            expired = Candidate.objects.filter(
+                last_seen__lt=cutoff, last_seen__gte=self.cutoff - REFRESH_OVERLAP
+            )
+            store.discard(expired.values_list('id', flat=True).iterator())
+        self.checked_until, self.cutoff = now, cutoff
+
+        if (
+            self.index is None
+            or self._indexed_compactions != store.compactions
+            or store.columns.size - self.index.size > max(self.index.size * REINDEX_TAIL, REINDEX_MIN_ROWS)
+        ):
+            self.index = CandidateIndex(store.columns)
+            self._indexed_compactions = store.compactions
+
+    def top(self, job, k, refresh=True):
+        """Up to ``k`` ``(candidate_id, score)`` pairs, best first."""
+        if refresh or self.index is None:
+            self.refresh()
+        store = self.store
+        eligible = store.live.copy()
+        applied = MessageThread.objects.filter(job=job).values_list('candidate_id', flat=True)
+        eligible[[store.position[i] for i in applied if i in store.position]] = False
+        result = self.index.top(
+            store.columns, job, k, job_skills=job.skills.values_list('id', flat=True), eligible=eligible,
+        )
+        return [(int(store.ids[position]), score) for position, score in result.matches]
+
+
+class MatcherLoading(Exception):
+    """The process matcher has not been loaded yet."""
+
+
+class MatcherService:
+    """A ``CandidateMatcher`` kept loaded and fresh by a background thread."""
+
+    def __init__(self, interval=REFRESH_SECONDS):
+        self.interval = interval
+        self.matcher = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start the refresh thread of this process, again after a fork."""
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='candidate-matcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def refresh(self):
+        """Load the matcher, or catch up with candidate changes."""
+        if self.matcher is None:
+            # Loaded outside the lock, queries are refused meanwhile anyway
+            matcher = CandidateMatcher()
+            matcher.refresh()
+            self.matcher = matcher
+        else:
+            with self._lock:
+                self.matcher.refresh()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Candidate matcher refresh failed")
+            finally:
+                connection.close()
+            self._stopped.wait(self.interval)
+
+    def top(self, job, k):
+        """``CandidateMatcher.top`` without refreshing, raises MatcherLoading before the first load."""
+        self.start()
+        if self.matcher is None:
+            raise MatcherLoading
+        with self._lock:
+            return self.matcher.top(job, k, refresh=False)
+
+
+_service = MatcherService()
+
+
+def preload_matcher():
+    """Load this process's matcher now, before serving."""
+    _service.refresh()
+    # Forked workers must not share the connection
+    connection.close()
+
+
+def top_candidates(job, k):
+    """``MatcherService.top`` on this process's matcher."""
+    return _service.top(job, k)
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.23 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagethread',
+            name='match_score',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(fields=['recruiter', '-match_score', '-last_updated'], name='thread_recruiter_score_idx'),
+        ),
+    ]
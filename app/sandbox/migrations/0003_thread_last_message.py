@@ -0,0 +1,32 @@
+# Generated by Django 3.2.23 on 2026-10-18 10:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL_LAST_MESSAGE = """
+UPDATE sandbox_messagethread t
+SET last_message_id = m.id
+FROM (
+    SELECT DISTINCT ON (thread_id) id, thread_id
+    FROM sandbox_message
+    WHERE thread_id IS NOT NULL
+    ORDER BY thread_id, created DESC, id DESC
+) m
+WHERE m.thread_id = t.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0002_thread_match_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagethread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sandbox.message'),
+        ),
+        migrations.RunSQL(BACKFILL_LAST_MESSAGE, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.23 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0003_thread_last_message'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='messagethread',
+            name='thread_recruiter_score_idx',
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(fields=['recruiter', '-last_updated', '-id'], name='thread_recruiter_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(fields=['recruiter', '-match_score', '-last_updated', '-id'], name='thread_recruiter_score_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.23 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0004_thread_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=80, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='candidate',
+            name='skills',
+            field=models.ManyToManyField(blank=True, related_name='candidates', to='sandbox.Skill'),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='skills',
+            field=models.ManyToManyField(blank=True, related_name='jobs', to='sandbox.Skill'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.23 on 2026-10-18 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0005_skills'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread', models.IntegerField(default=0)),
+                ('bucket_archive', models.IntegerField(default=0)),
+                ('bucket_inbox', models.IntegerField(default=0)),
+                ('bucket_notinterested', models.IntegerField(default=0)),
+                ('bucket_pokes', models.IntegerField(default=0)),
+                ('bucket_shortlist', models.IntegerField(default=0)),
+                ('bucket_unread', models.IntegerField(default=0)),
+                ('applications_today', models.IntegerField(default=0)),
+                ('applications_day', models.DateField(blank=True, null=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='sandbox.jobposting')),
+                ('recruiter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sandbox.recruiter')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='inboxcounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('job__isnull', True)), fields=('recruiter',), name='inbox_counter_recruiter_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='inboxcounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('job__isnull', False)), fields=('recruiter', 'job'), name='inbox_counter_job_uniq'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Generated columns keep the vectors in step with the text without triggers,
+# and as the models don't declare them they are never loaded by the ORM.
+MESSAGE_VECTOR = """
+ALTER TABLE sandbox_message ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(body, ''))) STORED;
+CREATE INDEX message_search_idx ON sandbox_message USING gin (search_vector);
+"""
+
+CANDIDATE_VECTOR = """
+ALTER TABLE sandbox_candidate ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(position, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(skills_cache, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(highlights, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(looking_for, '')), 'C')
+        || setweight(to_tsvector('english', coalesce(moreinfo, '')), 'C')
+    ) STORED;
+CREATE INDEX candidate_search_idx ON sandbox_candidate USING gin (search_vector);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0006_inbox_counters'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            MESSAGE_VECTOR,
+            "ALTER TABLE sandbox_message DROP COLUMN search_vector;",
+        ),
+        migrations.RunSQL(
+            CANDIDATE_VECTOR,
+            "ALTER TABLE sandbox_candidate DROP COLUMN search_vector;",
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.23 on 2026-10-18 11:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0007_search_vectors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RescoreRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('candidate', 'Candidate'), ('job', 'Job')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('requested', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='rescorerequest',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='rescore_request_uniq'),
+        ),
+    ]
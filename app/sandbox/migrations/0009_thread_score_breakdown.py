@@ -0,0 +1,18 @@
+# Generated by Django 3.2.23 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0008_rescore_requests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagethread',
+            name='score_breakdown',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.23 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0009_thread_score_breakdown'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='action',
+            field=models.CharField(blank=True, choices=[('accept', 'Accept'), ('apply', 'Apply'), ('peek', 'Peek'), ('poke', 'Poke'), ('shadowpoke', 'Shadow Poke'), ('archive', 'Archive'), ('notinterested', 'Not interested'), ('shortlist', 'Shortlist')], default='', max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='first_message',
+            field=models.CharField(choices=[('accept', 'Accept'), ('apply', 'Apply'), ('peek', 'Peek'), ('poke', 'Poke'), ('shadowpoke', 'Shadow Poke'), ('archive', 'Archive'), ('notinterested', 'Not interested'), ('shortlist', 'Shortlist')], max_length=16),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.23 on 2026-10-18 11:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import sandbox.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0010_message_bucket_actions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='thread',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sandbox.messagethread'),
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='bucket',
+            field=models.CharField(default=sandbox.models.Bucket['INBOX'], max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='candidate_favorite',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='last_updated',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='recruiter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sandbox.recruiter'),
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='recruiter_favorite',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'created', 'id'], name='message_thread_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(fields=['recruiter', 'bucket', '-last_updated', '-id'], name='thread_recruiter_bucket_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(condition=models.Q(('recruiter_favorite', True)), fields=['recruiter', '-last_updated', '-id'], name='thread_recruiter_favorite_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# One NOTIFY per recruiter per insert statement, delivered on commit, see
+# sandbox.events. A statement trigger keeps bulk inserts to a few notifies.
+NOTIFY_TRIGGER = """
+CREATE FUNCTION sandbox_message_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('inbox_events', recruiter_id::text)
+    FROM (SELECT DISTINCT recruiter_id FROM inserted) AS recruiters;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER message_notify AFTER INSERT ON sandbox_message
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION sandbox_message_notify();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0011_inbox_access_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            NOTIFY_TRIGGER,
+            """
+            DROP TRIGGER message_notify ON sandbox_message;
+            DROP FUNCTION sandbox_message_notify();
+            """,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.23 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0012_message_notify_trigger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='candidate',
+            name='last_modified',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,177 @@
+# Generated by Django 3.2.23 on 2026-10-18 11:36
+
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+# Hot history stays in sandbox_message, now range partitioned by month of
+# created (see sandbox.partitions). The existing table is not copied: it
+# becomes the partition of everything before the current month, only the
+# rows of the current month on are moved to the new monthly partitions.
+# Partitioned tables need the partition key in the primary key, so it is
+# (id, created) and last_message can no longer be a foreign key.
+
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, body, action, sender, created, notified, edited, candidate_id, job_id, recruiter_id, thread_id'
+
+FOREIGN_KEYS = {
+    'sandbox_message_recruiter_id_1785d505_fk_sandbox_recruiter_id': ('recruiter_id', 'sandbox_recruiter'),
+    'sandbox_message_candidate_id_97611861_fk_sandbox_candidate_id': ('candidate_id', 'sandbox_candidate'),
+    'sandbox_message_job_id_140e5abb_fk_sandbox_jobposting_id': ('job_id', 'sandbox_jobposting'),
+    'sandbox_message_thread_id_f327ac98_fk_sandbox_messagethread_id': ('thread_id', 'sandbox_messagethread'),
+}
+
+INDEXES = {
+    'sandbox_message_created_eb3eac2e': 'btree (created)',
+    'sandbox_message_notified_a2d4f7ca': 'btree (notified)',
+    'sandbox_message_edited_2d75535c': 'btree (edited)',
+    'sandbox_message_candidate_id_97611861': 'btree (candidate_id)',
+    'sandbox_message_job_id_140e5abb': 'btree (job_id)',
+    'sandbox_message_recruiter_id_1785d505': 'btree (recruiter_id)',
+    'message_search_idx': 'gin (search_vector)',
+    'message_thread_created_idx': 'btree (thread_id, created, id)',
+}
+
+NOTIFY_TRIGGER = """
+CREATE TRIGGER message_notify AFTER INSERT ON sandbox_message
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION sandbox_message_notify();
+"""
+
+RENAME_LEGACY_INDEXES = """
+DO $$
+DECLARE name text;
+BEGIN
+    FOR name IN SELECT indexname FROM pg_indexes WHERE tablename = 'sandbox_message_legacy' LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', name, left('legacy_' || name, 63));
+    END LOOP;
+END $$;
+"""
+
+ARCHIVE = """
+CREATE TABLE sandbox_message_archive (LIKE sandbox_message) PARTITION BY RANGE (created);
+ALTER TABLE sandbox_message_archive DROP COLUMN search_vector;
+ALTER TABLE sandbox_message_archive ADD CONSTRAINT sandbox_message_archive_pkey PRIMARY KEY (id, created);
+CREATE INDEX message_archive_thread_created_idx ON sandbox_message_archive (thread_id, created, id);
+"""
+
+
+def month_start(moment):
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def create_constraints(execute):
+    for name, (column, table) in FOREIGN_KEYS.items():
+        execute(
+            f"ALTER TABLE sandbox_message ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+            f"REFERENCES {table} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+    for name, definition in INDEXES.items():
+        execute(f"CREATE INDEX {name} ON sandbox_message USING {definition}")
+
+
+def partition(apps, schema_editor):
+    execute = schema_editor.execute
+    month = month_start(timezone.now())
+
+    execute("DROP TRIGGER message_notify ON sandbox_message")
+    execute("ALTER TABLE sandbox_message DROP CONSTRAINT sandbox_message_pkey")
+    execute("ALTER TABLE sandbox_message RENAME TO sandbox_message_legacy")
+    execute(RENAME_LEGACY_INDEXES, None)
+
+    execute(
+        "CREATE TABLE sandbox_message (LIKE sandbox_message_legacy INCLUDING DEFAULTS INCLUDING GENERATED) "
+        "PARTITION BY RANGE (created)"
+    )
+    execute("ALTER SEQUENCE sandbox_message_id_seq OWNED BY sandbox_message.id")
+    execute("ALTER TABLE sandbox_message ADD CONSTRAINT sandbox_message_pkey PRIMARY KEY (id, created)")
+    create_constraints(execute)
+
+    execute("CREATE TABLE sandbox_message_default PARTITION OF sandbox_message DEFAULT")
+    start = month
+    for _ in range(MONTHS_AHEAD + 1):
+        end = next_month(start)
+        execute(
+            f"CREATE TABLE sandbox_message_y{start.year}m{start.month:02d} PARTITION OF sandbox_message "
+            "FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+        start = end
+
+    execute(
+        f"WITH moved AS (DELETE FROM sandbox_message_legacy WHERE created >= %s RETURNING {COLUMNS}) "
+        f"INSERT INTO sandbox_message ({COLUMNS}) SELECT {COLUMNS} FROM moved",
+        [month],
+    )
+    # Lets the attach skip scanning the table
+    execute(
+        "ALTER TABLE sandbox_message_legacy ADD CONSTRAINT sandbox_message_legacy_bounds CHECK (created < %s)",
+        [month],
+    )
+    execute(
+        "ALTER TABLE sandbox_message ATTACH PARTITION sandbox_message_legacy FOR VALUES FROM (MINVALUE) TO (%s)",
+        [month],
+    )
+    execute(NOTIFY_TRIGGER)
+    execute(ARCHIVE)
+
+
+def unpartition(apps, schema_editor):
+    execute = schema_editor.execute
+    execute("DROP TRIGGER message_notify ON sandbox_message")
+    execute("ALTER TABLE sandbox_message RENAME TO sandbox_message_partitioned")
+    execute(
+        "CREATE TABLE sandbox_message (LIKE sandbox_message_partitioned INCLUDING DEFAULTS INCLUDING GENERATED)"
+    )
+    execute(
+        f"INSERT INTO sandbox_message ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM sandbox_message_partitioned "
+        f"UNION ALL SELECT {COLUMNS} FROM sandbox_message_archive"
+    )
+    execute("ALTER SEQUENCE sandbox_message_id_seq OWNED BY sandbox_message.id")
+    execute("DROP TABLE sandbox_message_partitioned, sandbox_message_archive")
+    execute("ALTER TABLE sandbox_message ADD CONSTRAINT sandbox_message_pkey PRIMARY KEY (id)")
+    create_constraints(execute)
+    execute(NOTIFY_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0013_candidate_last_modified_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('body', models.TextField(default='')),
+                ('action', models.CharField(blank=True, choices=[('accept', 'Accept'), ('apply', 'Apply'), ('peek', 'Peek'), ('poke', 'Poke'), ('shadowpoke', 'Shadow Poke'), ('archive', 'Archive'), ('notinterested', 'Not interested'), ('shortlist', 'Shortlist')], default='', max_length=40)),
+                ('sender', models.CharField(choices=[('candidate', 'Candidate'), ('recruiter', 'Recruiter')], max_length=40)),
+                ('created', models.DateTimeField(db_index=True)),
+                ('notified', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('edited', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'db_table': 'sandbox_message_archive',
+                'ordering': ('created',),
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sandbox.message'),
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.23 on 2026-10-18 11:43
+
+from django.db import migrations, models
+
+# Threads moved to not interested before notifications existed are not announced
+MARK_NOTIFIED = """
+UPDATE sandbox_messagethread SET notified_notinterested = last_updated
+WHERE bucket = 'notinterested' AND notified_notinterested IS NULL
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0014_message_partitions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(MARK_NOTIFIED, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('notified__isnull', True)), fields=['created'], name='message_unnotified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(condition=models.Q(('bucket', 'notinterested'), ('notified_notinterested__isnull', True)), fields=['id'], name='thread_notinterested_idx'),
+        ),
+    ]
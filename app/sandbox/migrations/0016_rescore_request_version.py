@@ -0,0 +1,18 @@
+# Generated by Django 3.2.23 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0015_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rescorerequest',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -1,12 +1,62 @@
 import enum
+import threading
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-import pycountry
 
-COUNTRY_CHOICES: list[tuple[str, str]] = sorted(
-    ((c.alpha_3, c.name) for c in pycountry.countries),
-    key=lambda c: c[1],
-)
+
+class LazyChoices(list):
+    """List filled by calling ``load`` on first use."""
+    _lock = threading.Lock()
+
+    def __init__(self, load):
+        super().__init__()
+        self._load = load
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.extend(self._load())
+                    self._loaded = True
+
+    def __iter__(self):
+        self._ensure_loaded()
+        return super().__iter__()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return super().__len__()
+
+    def __getitem__(self, index):
+        self._ensure_loaded()
+        return super().__getitem__(index)
+
+    def __contains__(self, item):
+        self._ensure_loaded()
+        return super().__contains__(item)
+
+    def __eq__(self, other):
+        self._ensure_loaded()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        self._ensure_loaded()
+        return super().__ne__(other)
+
+    def __repr__(self):
+        self._ensure_loaded()
+        return super().__repr__()
+
+
+def _country_choices():
+    # pycountry loads its whole database on import
+    import pycountry
+    return sorted(((c.alpha_3, c.name) for c in pycountry.countries), key=lambda c: c[1])
+
+
+COUNTRY_CHOICES: list[tuple[str, str]] = LazyChoices(_country_choices)
 
 class LegacyUACity(models.TextChoices):
     """used in jobs/candidate"""
@@ -35,6 +85,14 @@ class EnglishLevel(models.TextChoices):
     UPPER = ("upper", "Upper-Intermediate")
     FLUENT = ("fluent", "Advanced/Fluent")
 
+class Skill(models.Model):
+    """Canonical skill, see sandbox.skills for normalization"""
+    name = models.CharField(max_length=80, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Candidate(models.Model):
     USERTYPE = "candidate"
 
@@ -68,6 +126,7 @@ class Candidate(models.Model):
         max_length=80, blank=True, default="", choices=EnglishLevel.choices
     )
     skills_cache = models.TextField(blank=True, default="")
+    skills = models.ManyToManyField("Skill", blank=True, related_name="candidates")
     location = models.CharField(max_length=255, blank=True, default="", null=True)
     country_code = models.CharField(
         max_length=3,
@@ -96,7 +155,7 @@ class Candidate(models.Model):
     lang = models.CharField(max_length=10, blank=True, default='EN')
 
     # Meta fields
-    last_modified = models.DateTimeField(blank=True, null=True)
+    last_modified = models.DateTimeField(blank=True, null=True, db_index=True)
     last_seen = models.DateTimeField(blank=True, null=True, db_index=True)
     signup_date = models.DateTimeField(auto_now_add=True)
 
@@ -149,6 +208,7 @@ class JobPosting(models.Model):
     long_description = models.TextField(blank=True, default='')
     # Skills
     extra_keywords = models.CharField(max_length=250, blank=True, default="")
+    skills = models.ManyToManyField("Skill", blank=True, related_name="jobs")
     location = models.CharField(max_length=250, blank=True, default="")
     country = models.CharField(max_length=250, blank=True, default="")
     salary_min = models.IntegerField(blank=True, null=True, default=0)
@@ -209,6 +269,11 @@ class Action(models.TextChoices):
     POKE = "poke"
     SHADOW_POKE = "shadowpoke"
 
+    # Recruiter moved the thread, see sandbox.bulk
+    ARCHIVE = "archive"
+    NOTINTERESTED = "notinterested", _("Not interested")
+    SHORTLIST = "shortlist"
+
 class Bucket(str, enum.Enum):
     """Bucket is the current state of the message thread"""
     ARCHIVE = 'archive'
@@ -218,7 +283,7 @@ class Bucket(str, enum.Enum):
     SHORTLIST = 'shortlist'  # TODO: looks deprecated by recruiter_favorite & candidate_favorite
     UNREAD = 'unread'  # TODO: for recruiter we use INBOX bucket with `last_seen_recruiter`
 
-class Message(models.Model):
+class BaseMessage(models.Model):
     class Sender(models.TextChoices):
         CANDIDATE = "candidate", _("Candidate")
         RECRUITER = "recruiter", _("Recruiter")
@@ -236,14 +301,38 @@ class Message(models.Model):
     job = models.ForeignKey(
         "JobPosting", on_delete=models.SET_NULL, null=True, blank=True
     )
+    # Indexed by message_thread_created_idx
     thread = models.ForeignKey(
-        "MessageThread", on_delete=models.SET_NULL, null=True, blank=True
+        "MessageThread", on_delete=models.SET_NULL, null=True, blank=True, db_index=False
     )
 
     class Meta:
+        abstract = True
         ordering = ('created',)
 
 
+class Message(BaseMessage):
+    """Partitioned by month of ``created``, see sandbox.partitions."""
+
+    class Meta(BaseMessage.Meta):
+        indexes = [
+            # Thread history, newest first, see sandbox.views.THREAD_ORDERING
+            models.Index(fields=['thread', 'created', 'id'], name='message_thread_created_idx'),
+            # Pending notifications, see sandbox.notifications
+            models.Index(
+                fields=['created'], name='message_unnotified_idx', condition=models.Q(notified__isnull=True),
+            ),
+        ]
+
+
+class ArchivedMessage(BaseMessage):
+    """Messages of the months moved to the archive table by ``archive_messages``."""
+
+    class Meta(BaseMessage.Meta):
+        managed = False
+        db_table = 'sandbox_message_archive'
+
+
 class MessageThread(models.Model):
     class MatchReason(models.TextChoices):
         MATCHED = "matched_v1"
@@ -261,29 +350,144 @@ class MessageThread(models.Model):
         max_length=40, blank=False, choices=Message.Sender.choices
     )
     first_message = models.CharField(max_length=16, blank=False, choices=Action.choices)
-    bucket = models.CharField(max_length=40, default=Bucket.INBOX, db_index=True)
+    bucket = models.CharField(max_length=40, default=Bucket.INBOX)
 
     candidate_archived = models.BooleanField(blank=True, default=False)
-    candidate_favorite = models.BooleanField(blank=True, null=True, db_index=True)
+    candidate_favorite = models.BooleanField(blank=True, null=True)
     feedback_candidate = models.CharField(max_length=20, blank=True, default="")
 
-    recruiter_favorite = models.BooleanField(blank=True, null=True, db_index=True)
+    recruiter_favorite = models.BooleanField(blank=True, null=True)
     feedback_recruiter = models.CharField(max_length=20, blank=True, default="")
     notified_notinterested = models.DateTimeField(blank=True, null=True, db_index=True)
 
     job = models.ForeignKey("JobPosting", on_delete=models.SET_NULL, null=True, blank=True)
     candidate = models.ForeignKey("Candidate", on_delete=models.CASCADE)
-    recruiter = models.ForeignKey("Recruiter", on_delete=models.CASCADE)
+    # Leads the composite indexes in Meta
+    recruiter = models.ForeignKey("Recruiter", on_delete=models.CASCADE, db_index=False)
 
-    last_updated = models.DateTimeField(blank=False, db_index=True)
+    last_updated = models.DateTimeField(blank=False)
     last_seen_recruiter = models.DateTimeField(null=True)
     last_seen_candidate = models.DateTimeField(null=True)
     created = models.DateTimeField(auto_now_add=True)
 
-    @property
-    def last_message(self):
-        return self.message_set.last()
+    # Candidate-to-job fit, see sandbox.scoring
+    match_score = models.PositiveSmallIntegerField(default=0)
+    # Points of each score component, one byte each in scoring.COMPONENTS order
+    score_breakdown = models.BigIntegerField(default=0)
+
+    # Denormalized pointer to the latest message, kept up to date by sandbox.signals.
+    # Not a database constraint: the partitioned message table has no unique id.
+    last_message = models.ForeignKey(
+        "Message", on_delete=models.SET_NULL, null=True, blank=True, related_name="+", db_constraint=False
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep loaded values so save signals can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {f.attname: getattr(self, f.attname) for f in self._meta.concrete_fields}
+
+    def has_changed(self, field):
+        """Whether the field differs from its value when loaded or last saved."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or field not in loaded:
+            return True
+        return loaded[field] != getattr(self, field)
+
+    def loaded_value(self, field):
+        """Value of the field when loaded or last saved, current value if unknown."""
+        return getattr(self, '_loaded_values', {}).get(field, getattr(self, field))
+
+    def refresh_last_message(self):
+        self.last_message = self.message_set.order_by('-created', '-id').first()
+        MessageThread.objects.filter(pk=self.pk).update(last_message=self.last_message)
 
     class Meta:
         ordering = ("-last_updated",)
         unique_together = (Message.Sender.CANDIDATE, Message.Sender.RECRUITER)
+        indexes = [
+            # Keyset pagination orderings of the inbox, see sandbox.views.INBOX_ORDERING
+            models.Index(
+                fields=['recruiter', '-last_updated', '-id'],
+                name='thread_recruiter_recent_idx',
+            ),
+            models.Index(
+                fields=['recruiter', '-match_score', '-last_updated', '-id'],
+                name='thread_recruiter_score_idx',
+            ),
+            # Same for the bucket and favorite facets
+            models.Index(
+                fields=['recruiter', 'bucket', '-last_updated', '-id'],
+                name='thread_recruiter_bucket_idx',
+            ),
+            models.Index(
+                fields=['recruiter', '-last_updated', '-id'],
+                name='thread_recruiter_favorite_idx',
+                condition=models.Q(recruiter_favorite=True),
+            ),
+            # Pending not interested notices, see sandbox.notifications
+            models.Index(
+                fields=['id'], name='thread_notinterested_idx',
+                condition=models.Q(bucket='notinterested', notified_notinterested__isnull=True),
+            ),
+        ]
+
+
+class InboxCounter(models.Model):
+    """Denormalized inbox counters of a recruiter (job is null) or of one job, see sandbox.counters"""
+    recruiter = models.ForeignKey("Recruiter", on_delete=models.CASCADE)
+    job = models.ForeignKey("JobPosting", on_delete=models.CASCADE, null=True, blank=True)
+
+    unread = models.IntegerField(default=0)
+
+    # Threads per Bucket
+    bucket_archive = models.IntegerField(default=0)
+    bucket_inbox = models.IntegerField(default=0)
+    bucket_notinterested = models.IntegerField(default=0)
+    bucket_pokes = models.IntegerField(default=0)
+    bucket_shortlist = models.IntegerField(default=0)
+    bucket_unread = models.IntegerField(default=0)
+
+    # Applications received on applications_day, reset on the first one of a new day
+    applications_today = models.IntegerField(default=0)
+    applications_day = models.DateField(null=True, blank=True)
+
+    @property
+    def new_applications(self):
+        return self.applications_today if self.applications_day == timezone.localdate() else 0
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recruiter'], condition=models.Q(job__isnull=True),
+                name='inbox_counter_recruiter_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['recruiter', 'job'], condition=models.Q(job__isnull=False),
+                name='inbox_counter_job_uniq',
+            ),
+        ]
+
+
+class RescoreRequest(models.Model):
+    """Outbox of candidates and jobs whose threads need new match scores, see sandbox.rescoring"""
+    class Kind(models.TextChoices):
+        CANDIDATE = "candidate"
+        JOB = "job"
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    # First unprocessed edit, repeated edits coalesce into the same row
+    requested = models.DateTimeField(default=timezone.now, db_index=True)
+    # Bumped by every edit, a worker deletes the row only if it is unchanged
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='rescore_request_uniq'),
+        ]
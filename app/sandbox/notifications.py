@@ -0,0 +1,198 @@
+"""
+Email notifications.
+
+New messages are announced to the other side of their thread, and threads
+moved to not interested to their candidate. ``dispatch_batch`` claims
+pending messages (``Message.notified`` is null) and notices
+(``MessageThread.notified_notinterested`` is null) with SELECT ... FOR
+UPDATE SKIP LOCKED, so several workers can run side by side. It sends one
+digest per recipient, a line per thread, over a single SMTP connection and
+marks everything it claimed with one UPDATE per table, all in one
+transaction: a crashed worker leaves its rows to the next one, so a
+digest may be sent twice but no notification is lost.
+
+Messages older than ``NOTIFY_WITHIN`` are not announced any more, each
+batch marks up to ``batch_size`` of them notified as well. A digest the
+server rejects for good is dropped; connection errors and temporary
+rejections roll the batch back for the worker to retry.
+"""
+import logging
+import smtplib
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import Truncator
+from django.utils.translation import ngettext
+
+from .models import Action, Bucket, Message, MessageThread
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_WITHIN = timedelta(days=3)
+EXCERPT_CHARS = 200
+# Thread moves and views, marked notified without a notification. Moving to
+# not interested is announced from the thread instead.
+SILENT_ACTIONS = frozenset((Action.ARCHIVE, Action.NOTINTERESTED, Action.SHORTLIST, Action.PEEK, Action.SHADOW_POKE))
+
+ACTION_LABELS = dict(Action.choices)
+
+THREAD_FIELDS = (
+    'id', 'is_anonymous', 'recruiter_id', 'candidate_id', 'job__position',
+    'recruiter__name', 'recruiter__email', 'candidate__name', 'candidate__position', 'candidate__email',
+)
+
+DispatchBatch = namedtuple('DispatchBatch', 'messages notices digests refused expired')
+
+
+class Digest:
+    """Notifications for one recipient, the latest per thread."""
+
+    def __init__(self, email):
+        self.email = email
+        self.threads = {}
+
+    def add(self, thread_id, line):
+        count, _ = self.threads.get(thread_id, (0, None))
+        self.threads[thread_id] = (count + 1, line)
+
+    def email_message(self):
+        lines = [line if count == 1 else f"{line} (+{count - 1} more)" for count, line in self.threads.values()]
+        subject = ngettext(
+            "News in %(count)d conversation", "News in %(count)d conversations", len(lines)
+        ) % {'count': len(lines)}
+        return EmailMessage(subject, '\n\n'.join(lines), settings.DEFAULT_FROM_EMAIL, [self.email])
+
+
+def _claim_messages(batch_size, since):
+    return list(
+        Message.objects.select_for_update(skip_locked=True)
+        .filter(notified__isnull=True, created__gte=since, thread__isnull=False)
+        .order_by('created').values_list('id', 'created', 'thread_id', 'sender', 'action', 'body')[:batch_size]
+    )
+
+
+def _claim_expired(batch_size, since):
+    return list(
+        Message.objects.select_for_update(skip_locked=True)
+        .filter(notified__isnull=True, created__lt=since)
+        .order_by('created').values_list('id', flat=True)[:batch_size]
+    )
+
+
+def _claim_notices(batch_size):
+    return list(
+        MessageThread.objects.select_for_update(skip_locked=True, of=('self',))
+        .filter(bucket=Bucket.NOTINTERESTED.value, notified_notinterested__isnull=True)
+        .order_by('id').values(*THREAD_FIELDS)[:batch_size]
+    )
+
+
+def _job(thread):
+    return thread['job__position'] or "your profile"
+
+
+def _digests(messages, notices, threads):
+    """Digests keyed by (sender kind, id) of the recipient."""
+    digests = {}
+
+    def add(recipient, email, thread_id, line):
+        digests.setdefault(recipient, Digest(email)).add(thread_id, line)
+
+    for _, _, thread_id, sender, action, body in messages:
+        thread = threads.get(thread_id)
+        if action in SILENT_ACTIONS or thread is None:
+            continue
+        excerpt = Truncator(body).chars(EXCERPT_CHARS) or ACTION_LABELS.get(action, action)
+        if sender == Message.Sender.CANDIDATE:
+            name = thread['candidate__position'] if thread['is_anonymous'] else thread['candidate__name']
+            add(
+                (Message.Sender.RECRUITER, thread['recruiter_id']), thread['recruiter__email'], thread_id,
+                f"{name or 'A candidate'} about {_job(thread)}: {excerpt}",
+            )
+        else:
+            add(
+                (Message.Sender.CANDIDATE, thread['candidate_id']), thread['candidate__email'], thread_id,
+                f"{thread['recruiter__name'] or 'A recruiter'} about {_job(thread)}: {excerpt}",
+            )
+    for thread in notices:
+        add(
+            (Message.Sender.CANDIDATE, thread['candidate_id']), thread['candidate__email'], thread['id'],
+            f"{thread['recruiter__name'] or 'The recruiter'} is not interested in {_job(thread)}",
+        )
+    return digests
+
+
+def _send(digests, connection):
+    """
+    Send the digests, returns how many were refused by the server. Other
+    errors are raised, the batch is to be retried.
+    """
+    connection.open()
+    refused = 0
+    for digest in digests:
+        try:
+            connection.send_messages([digest.email_message()])
+        except smtplib.SMTPRecipientsRefused:
+            # Retrying would not help, drop it instead of blocking the batch
+            logger.warning("Notification digest to %s refused", digest.email)
+            refused += 1
+        except smtplib.SMTPDataError as error:
+            if error.smtp_code < 500:
+                raise
+            logger.warning("Notification digest to %s rejected: %s", digest.email, error)
+            refused += 1
+    return refused
+
+
+def dispatch_batch(batch_size=100, connection=None):
+    """
+    Send the notifications of up to ``batch_size`` pending messages and as
+    many notices, oldest first. ``connection`` is an email backend kept
+    open between batches, a new one is opened and closed by default.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = _claim_messages(batch_size, now - NOTIFY_WITHIN)
+        notices = _claim_notices(batch_size)
+        expired = _claim_expired(batch_size, now - NOTIFY_WITHIN)
+        if not messages and not notices and not expired:
+            return DispatchBatch(0, 0, 0, 0, 0)
+
+        threads = {}
+        if messages:
+            details = MessageThread.objects.filter(id__in={m[2] for m in messages}).order_by().values(*THREAD_FIELDS)
+            threads = {thread['id']: thread for thread in details}
+        digests = _digests(messages, notices, threads).values()
+        if not digests:
+            refused = 0
+        elif connection is None:
+            with get_connection() as connection:
+                refused = _send(digests, connection)
+        else:
+            refused = _send(digests, connection)
+
+        if messages:
+            # Claimed in created order, the bound lets partitions be pruned
+            Message.objects.filter(id__in=[m[0] for m in messages], created__gte=messages[0][1]).update(notified=now)
+        if notices:
+            MessageThread.objects.filter(id__in=[t['id'] for t in notices]).update(notified_notinterested=now)
+        if expired:
+            # Left unmarked they would stay in message_unnotified_idx for good
+            Message.objects.filter(id__in=expired, created__lt=now - NOTIFY_WITHIN).update(notified=now)
+
+    return DispatchBatch(len(messages), len(notices), len(digests), refused, len(expired))
+
+
+def notification_status():
+    """Pending messages and notices."""
+    since = timezone.now() - NOTIFY_WITHIN
+    return {
+        'messages': Message.objects.filter(notified__isnull=True, created__gte=since, thread__isnull=False).count(),
+        'notices': MessageThread.objects.filter(
+            bucket=Bucket.NOTINTERESTED.value, notified_notinterested__isnull=True
+        ).count(),
+    }
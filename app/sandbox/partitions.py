@@ -0,0 +1,212 @@
+"""
+Monthly partitions of the message table.
+
+``sandbox_message`` is range partitioned on ``created`` (migration 0014):
+one partition per month, ``sandbox_message_legacy`` for everything before
+the migration and a default partition catching rows past the last month.
+``ensure_partitions`` creates the coming months, moving any of their rows
+out of the default partition.
+
+``archive_partitions`` moves months past a cutoff to
+``sandbox_message_archive`` (``ArchivedMessage``) without copying rows: the
+partition is detached, loses the search vector and every index but the
+thread history one, is attached to the archive and is then rewritten in
+thread order. That is all the compression archived months get: Postgres
+compresses a value only when its row is over the TOAST threshold of about
+2kB, fixed at build time (``toast_tuple_target`` cannot lower it for
+inserts), which few messages reach and which long ones already meet. A
+rewrite copies compressed values as they are, so switching the method to
+lz4 would not change existing rows either. The history from before partitioning, one partition up to
+the migration's month, is first split at the cutoff so its older months
+can go. Archived messages are left out of search and are read by the
+thread view on request.
+"""
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+HOT = 'sandbox_message'
+ARCHIVE = 'sandbox_message_archive'
+DEFAULT = 'sandbox_message_default'
+
+MONTHS_AHEAD = 3
+# Give up instead of queueing every message query behind a waiting DETACH
+LOCK_TIMEOUT = '5s'
+
+COLUMNS = 'id, body, action, sender, created, notified, edited, candidate_id, job_id, recruiter_id, thread_id'
+# The only index kept on archived partitions, matches message_archive_thread_created_idx
+THREAD_INDEX_COLUMNS = '(thread_id, created, id)'
+
+# Start and end of a range partition, None for MINVALUE / MAXVALUE
+Partition = namedtuple('Partition', 'name start end')
+
+_BOUND = r"(MINVALUE|MAXVALUE|'[^']+')"
+_RANGE = re.compile(rf"FOR VALUES FROM \({_BOUND}\) TO \({_BOUND}\)")
+
+
+def month_start(moment):
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def months_before(month, months):
+    for _ in range(months):
+        month = month_start(month - timedelta(days=1))
+    return month
+
+
+def partition_name(month):
+    return f"{HOT}_y{month.year}m{month.month:02d}"
+
+
+def _bound(value):
+    return None if value in ('MINVALUE', 'MAXVALUE') else parse_datetime(value.strip("'"))
+
+
+def partitions(table=HOT):
+    """Range partitions of the table, oldest first, without the default one."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [table],
+        )
+        rows = cursor.fetchall()
+    found = []
+    for name, bound in rows:
+        match = _RANGE.match(bound)
+        if match:
+            found.append(Partition(name, _bound(match.group(1)), _bound(match.group(2))))
+    return sorted(found, key=lambda p: (p.start is not None, p.start))
+
+
+def _covers(partition, moment):
+    return (partition.start is None or partition.start <= moment) and (partition.end is None or moment < partition.end)
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD, now=None):
+    """Create the missing partitions from this month to ``months_ahead`` later, returns their names."""
+    existing = partitions()
+    month = month_start(now or timezone.now())
+    created = []
+    for _ in range(months_ahead + 1):
+        end = next_month(month)
+        if not any(_covers(p, month) for p in existing):
+            name = partition_name(month)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"CREATE TABLE {name} (LIKE {HOT} INCLUDING DEFAULTS INCLUDING GENERATED)")
+                cursor.execute(
+                    f"WITH moved AS (DELETE FROM {DEFAULT} WHERE created >= %s AND created < %s RETURNING {COLUMNS}) "
+                    f"INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved",
+                    [month, end],
+                )
+                cursor.execute(f"ALTER TABLE {HOT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [month, end])
+            created.append(name)
+        month = end
+    return created
+
+
+def _range_sql(partition):
+    start = 'MINVALUE' if partition.start is None else '%s'
+    return f"FROM ({start}) TO (%s)", [p for p in (partition.start, partition.end) if p is not None]
+
+
+def archive_partition(partition, cluster=True):
+    """Move one hot partition to the archive."""
+    name = partition.name
+    bounds, params = _range_sql(partition)
+    with connection.cursor() as cursor:
+        # Validated before the DETACH, so attaching to the archive needs no scan
+        check = "created < %s" if partition.start is None else "created >= %s AND created < %s"
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s", [name, f"{name}_bounds"]
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds CHECK ({check}) NOT VALID", params)
+            cursor.execute(f"ALTER TABLE {name} VALIDATE CONSTRAINT {name}_bounds")
+
+        with transaction.atomic():
+            cursor.execute("SET LOCAL lock_timeout = %s", [LOCK_TIMEOUT])
+            cursor.execute(f"ALTER TABLE {HOT} DETACH PARTITION {name}")
+            cursor.execute(
+                """
+                SELECT i.relname, pg_get_indexdef(i.oid)
+                FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+                WHERE x.indrelid = %s::regclass AND NOT x.indisprimary
+                """,
+                [name],
+            )
+            thread_index = None
+            for index, definition in cursor.fetchall():
+                if definition.endswith(THREAD_INDEX_COLUMNS) and thread_index is None:
+                    thread_index = index
+                else:
+                    cursor.execute(f'DROP INDEX "{index}"')
+            if thread_index is None:
+                thread_index = f"{name}_thread_idx"
+                cursor.execute(f"CREATE INDEX {thread_index} ON {name} {THREAD_INDEX_COLUMNS}")
+            cursor.execute(f"ALTER TABLE {name} DROP COLUMN search_vector")
+            cursor.execute(f"ALTER TABLE {ARCHIVE} ATTACH PARTITION {name} FOR VALUES {bounds}", params)
+
+        if cluster:
+            # Reclaims the dropped vectors and stores each thread's history together
+            cursor.execute(f'CLUSTER {name} USING "{thread_index}"')
+
+
+def split_partition(partition, at):
+    """
+    Move the rows from ``at`` on out of a partition starting at MINVALUE
+    into new monthly partitions, so that it ends at ``at``. Returns the
+    names of the new partitions.
+    """
+    name = partition.name
+    months = []
+    month = at
+    while month < partition.end:
+        months.append((partition_name(month), month, min(next_month(month), partition.end)))
+        month = months[-1][2]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = %s", [LOCK_TIMEOUT])
+        cursor.execute(f"ALTER TABLE {HOT} DETACH PARTITION {name}")
+        for month_name, start, end in months:
+            cursor.execute(f"CREATE TABLE {month_name} (LIKE {HOT} INCLUDING DEFAULTS INCLUDING GENERATED)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {name} WHERE created >= %s AND created < %s RETURNING {COLUMNS}) "
+                f"INSERT INTO {month_name} ({COLUMNS}) SELECT {COLUMNS} FROM moved",
+                [start, end],
+            )
+        # Lets the attach below, and archive_partition later, skip scanning the table
+        cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {name}_bounds")
+        cursor.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds CHECK (created < %s)", [at])
+        cursor.execute(f"ALTER TABLE {HOT} ATTACH PARTITION {name} FOR VALUES FROM (MINVALUE) TO (%s)", [at])
+        for month_name, start, end in months:
+            cursor.execute(
+                f"ALTER TABLE {HOT} ATTACH PARTITION {month_name} FOR VALUES FROM (%s) TO (%s)", [start, end]
+            )
+    return [month_name for month_name, _, _ in months]
+
+
+def archive_partitions(before, cluster=True):
+    """
+    Move the hot partitions ending on or before ``before`` to the archive,
+    returns them. The history from before partitioning is split at
+    ``before`` first, it is kept in one partition until then.
+    """
+    for partition in partitions():
+        if partition.start is None and partition.end is not None and partition.end > before:
+            split_partition(partition, before)
+    archived = [p for p in partitions() if p.end is not None and p.end <= before]
+    for partition in archived:
+        archive_partition(partition, cluster=cluster)
+    return archived
@@ -0,0 +1,216 @@
+"""
+Per-request profiling of database and template work.
+
+``ProfileMiddleware`` records, for requests routed to a named view, the
+number of queries, time spent in the database and in templates, and SQL
+run more than once (duplicate fingerprints, the usual sign of an N+1).
+Results go to a Server-Timing header and to per-view totals served by
+``view_profiles``. Views can be given budgets in ``settings.VIEW_BUDGETS``;
+going over raises ``BudgetExceeded`` when ``settings.VIEW_BUDGETS_RAISE``
+is on (under ``manage.py test``) and logs a warning otherwise.
+
+Template time is measured by the ``Jinja2`` backend below, which replaces
+django_jinja's in settings.TEMPLATES.
+"""
+import asyncio
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django_jinja import backend
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """SQL with IN lists collapsed, equal for queries differing only in parameters."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.fingerprints = Counter()
+        # Async views run queries from several threads
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db_time += seconds
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def record_render(self, seconds):
+        with self._lock:
+            self.render_time += seconds
+
+    @property
+    def duplicates(self):
+        return {sql: n for sql, n in self.fingerprints.items() if n > 1}
+
+    def measures(self):
+        return {
+            'queries': self.queries,
+            'db_ms': self.db_time * 1000,
+            'render_ms': self.render_time * 1000,
+            'duplicates': len(self.duplicates),
+        }
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.render_time * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if profile is not None:
+            profile.record_query(sql, time.perf_counter() - started)
+
+
+@contextmanager
+def capture_queries():
+    """Count queries of this thread's connections into the current request profile."""
+    if _current.get() is None:
+        yield
+        return
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(_record_query))
+        yield
+
+
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+def _record_view(view, profile, total):
+    with _totals_lock:
+        totals = _totals.setdefault(view, Counter())
+        totals['requests'] += 1
+        totals['total_ms'] += total * 1000
+        totals.update(profile.measures())
+
+
+def view_profiles():
+    """Per-view request count and mean measures of this process."""
+    with _totals_lock:
+        return {
+            view: {
+                'requests': totals['requests'],
+                **{k: round(v / totals['requests'], 2) for k, v in totals.items() if k != 'requests'},
+            }
+            for view, totals in _totals.items()
+        }
+
+
+def reset_view_profiles():
+    with _totals_lock:
+        _totals.clear()
+
+
+def check_budget(view, profile):
+    budget = getattr(settings, 'VIEW_BUDGETS', {}).get(view)
+    if not budget:
+        return
+    measures = profile.measures()
+    over = {name: measures[name] for name, limit in budget.items() if measures[name] > limit}
+    if not over:
+        return
+    message = f"View {view!r} over budget {budget}: {over}"
+    if over.get('duplicates'):
+        message += "\nRepeated queries:\n" + "\n".join(
+            f"  {n}x {sql}" for sql, n in profile.duplicates.items()
+        )
+    if getattr(settings, 'VIEW_BUDGETS_RAISE', False):
+        raise BudgetExceeded(message)
+    logger.warning(message)
+
+
+class ProfileMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets the handler see this middleware as async
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with capture_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, time.perf_counter() - started)
+
+    async def _acall(self, request):
+        # Queries run in worker threads, each wrapped by views._gather
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, time.perf_counter() - started)
+
+    def _finish(self, request, response, profile, total):
+        response['Server-Timing'] = profile.server_timing(total)
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            _record_view(match.url_name, profile, total)
+            check_budget(match.url_name, profile)
+        return response
+
+
+class Template(backend.Template):
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.record_render(time.perf_counter() - started)
+
+
+class Jinja2(backend.Jinja2):
+    """django_jinja backend whose templates report their render time."""
+
+    def from_string(self, template_code):
+        return Template(self.env.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
@@ -0,0 +1,52 @@
+"""
+Region eligibility lookups.
+
+Every known country code maps to a bitmask of the regions it belongs to,
+and a job to the mask of the regions it accepts (None for worldwide), so
+checking a candidate's country is one dict lookup and an AND. Country sets
+per mask, for queries, are built on first use.
+"""
+from functools import lru_cache
+
+from .models import JobPosting
+
+UKRAINE = 1
+EUROPE = 2
+
+_EUROPE_CODES = (
+    'ALA', 'ALB', 'AND', 'AUT', 'BEL', 'BGR', 'BIH', 'CHE', 'CYP', 'CZE',
+    'DEU', 'DNK', 'ESP', 'EST', 'FIN', 'FRA', 'FRO', 'GBR', 'GGY', 'GIB',
+    'GRC', 'HRV', 'HUN', 'IMN', 'IRL', 'ISL', 'ITA', 'JEY', 'LIE', 'LTU',
+    'LUX', 'LVA', 'MCO', 'MDA', 'MKD', 'MLT', 'MNE', 'NLD', 'NOR', 'POL',
+    'PRT', 'ROU', 'SJM', 'SMR', 'SRB', 'SVK', 'SVN', 'SWE', 'VAT',
+)
+
+# Country code -> regions bitmask, countries in no region are left out
+COUNTRY_REGIONS = {'UKR': UKRAINE, **{code: EUROPE for code in _EUROPE_CODES}}
+
+ACCEPT_REGION_MASKS = {
+    JobPosting.AcceptRegion.UKRAINE: UKRAINE,
+    JobPosting.AcceptRegion.EUROPE: UKRAINE | EUROPE,
+    JobPosting.AcceptRegion.EUROPE_ONLY: EUROPE,
+}
+
+
+def country_regions(country_code):
+    return COUNTRY_REGIONS.get(country_code, 0)
+
+
+def accepted_regions(job):
+    """Mask of the regions the job accepts candidates from, None for worldwide."""
+    if job.is_ukraine_only:
+        return UKRAINE
+    return ACCEPT_REGION_MASKS.get(job.accept_region)
+
+
+def is_accepted(country_code, mask):
+    return mask is None or bool(COUNTRY_REGIONS.get(country_code, 0) & mask)
+
+
+@lru_cache(maxsize=None)
+def countries_in(mask):
+    """Codes of the countries in any of the mask's regions."""
+    return frozenset(code for code, regions in COUNTRY_REGIONS.items() if regions & mask)
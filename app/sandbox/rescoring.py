@@ -0,0 +1,102 @@
+"""
+Incremental match rescoring.
+
+Saving a candidate or a job with scoring fields changed adds a
+``RescoreRequest`` row in the same transaction (an outbox). Repeated edits
+coalesce into one row which keeps the time of the first edit, so the
+time from edit to new score can be measured, and bump its version.
+``process_batch`` claims rows with SELECT ... FOR UPDATE SKIP LOCKED, so
+several workers can run side by side, re-scores only the affected threads
+and deletes the rows in the same transaction: a crashed worker leaves its
+rows for the next one. Rows edited again meanwhile have a new version and
+are kept for the next batch. New threads are scored when created
+(``signals.score_new_thread``).
+"""
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .batch_scoring import CANDIDATE_FIELDS, rescore_job
+from .models import Candidate, JobPosting, MessageThread, RescoreRequest
+
+CANDIDATE_SCORE_FIELDS = frozenset((*CANDIDATE_FIELDS, 'skills_cache'))
+JOB_SCORE_FIELDS = frozenset((
+    'primary_keyword', 'secondary_keyword', 'extra_keywords', 'salary_min', 'salary_max',
+    'exp_years', 'english_level', 'is_ukraine_only', 'accept_region', 'relocate_type',
+    'remote_type', 'is_parttime', 'domain', 'company_type',
+))
+
+RescoreBatch = namedtuple('RescoreBatch', 'requests changed lag')
+
+# An edit racing a batch waits for it on the row lock, then inserts anew if
+# the batch deleted the row
+ENQUEUE_SQL = f"""
+    INSERT INTO {RescoreRequest._meta.db_table} (kind, object_id, requested, version)
+    SELECT %s, object_id, %s, 1 FROM unnest(%s::bigint[]) AS object_id ORDER BY object_id
+    ON CONFLICT (kind, object_id) DO UPDATE SET version = {RescoreRequest._meta.db_table}.version + 1
+"""
+
+
+def affects_score(fields, update_fields):
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+def enqueue_rescore(kind, ids):
+    with connection.cursor() as cursor:
+        cursor.execute(ENQUEUE_SQL, [kind, timezone.now(), list(ids)])
+
+
+def process_batch(batch_size=100, features=None):
+    """
+    Rescore the threads of up to ``batch_size`` pending requests, oldest first,
+    reading candidates from the ``features`` store if given.
+
+    ``lag`` is the seconds from the oldest claimed edit to its new score,
+    None when there was nothing to do.
+    """
+    with transaction.atomic():
+        requests = list(
+            RescoreRequest.objects.select_for_update(skip_locked=True).order_by('requested')[:batch_size]
+        )
+        if not requests:
+            return RescoreBatch(0, 0, None)
+
+        job_ids = {r.object_id for r in requests if r.kind == RescoreRequest.Kind.JOB}
+        candidate_ids = {r.object_id for r in requests if r.kind == RescoreRequest.Kind.CANDIDATE}
+
+        if features is not None and candidate_ids:
+            # Saves with update_fields leave last_modified alone, which refresh() goes by
+            features.load(Candidate.objects.filter(id__in=candidate_ids))
+
+        changed = 0
+        for job in JobPosting.objects.filter(id__in=job_ids):
+            changed += rescore_job(job, features=features)
+
+        # Threads of jobs rescored above are already up to date
+        candidates_of = {}
+        pairs = (
+            MessageThread.objects.filter(candidate_id__in=candidate_ids, job__isnull=False)
+            .exclude(job_id__in=job_ids).order_by().values_list('job_id', 'candidate_id').distinct()
+        )
+        for job_id, candidate_id in pairs:
+            candidates_of.setdefault(job_id, []).append(candidate_id)
+        for job in JobPosting.objects.filter(id__in=candidates_of):
+            changed += rescore_job(job, candidate_ids=candidates_of[job.id], features=features)
+
+        # Edits made while scoring bumped the version, they need another pass
+        RescoreRequest.objects.filter(reduce(or_, (Q(id=r.id, version=r.version) for r in requests))).delete()
+
+    lag = (timezone.now() - min(r.requested for r in requests)).total_seconds()
+    return RescoreBatch(len(requests), changed, lag)
+
+
+def rescore_status():
+    """Pending requests and the age in seconds of the oldest one."""
+    status = RescoreRequest.objects.aggregate(pending=Count('id'), oldest=Min('requested'))
+    oldest = status.pop('oldest')
+    status['lag'] = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+    return status
@@ -0,0 +1,153 @@
+"""
+Read replica routing and connection health checks.
+
+Views wrapped in ``replica_reads`` (the inbox pages) send their reads to
+``settings.REPLICA_DATABASE``; everything else, and every write, uses the
+primary. Reads stay on the primary inside a transaction and once the
+request has written. ``ReplicaPinningMiddleware`` also pins a client that
+wrote to the primary for ``settings.REPLICA_PIN_SECONDS`` with a cookie,
+so a recruiter sees their own bulk action even if the replica lags.
+
+Connections are persistent (``CONN_MAX_AGE``). Django 3.2 only drops one
+after an error, so ``check_connections`` pings connections that sat idle
+between requests and closes dead ones before the request reuses them.
+"""
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'pin_primary'
+
+_state = contextvars.ContextVar('routing_state', default=None)
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.replica = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+def _replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = _state.get()
+        if state is None or not state.replica or state.pinned:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return _replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == _replica_alias():
+            return False
+        return None
+
+
+@contextmanager
+def reading_from_replica():
+    state = _state.get()
+    token = None
+    if state is None:
+        state = RoutingState()
+        token = _state.set(state)
+    previous, state.replica = state.replica, True
+    try:
+        yield
+    finally:
+        state.replica = previous
+        if token is not None:
+            _state.reset(token)
+
+
+def replica_reads(view):
+    """Let ``view`` (sync or async) read from the replica unless the client is pinned."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with reading_from_replica():
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with reading_from_replica():
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaPinningMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets the handler see this middleware as async
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin(state, response)
+
+    async def _acall(self, request):
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin(state, response)
+
+    def _pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
+
+
+def check_connections():
+    """Close open connections that idled past CONN_HEALTH_CHECK_IDLE and no longer answer."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        released = getattr(connection, 'released_at', None)
+        if released is not None and now - released >= settings.CONN_HEALTH_CHECK_IDLE:
+            if not connection.is_usable():
+                connection.close()
+
+
+def release_connections():
+    """Mark this thread's open connections idle from now on."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.released_at = now
@@ -0,0 +1,221 @@
+"""
+Candidate-to-job match scoring.
+
+A score is an integer in 0..100 built from a handful of independent
+components (category, skills, salary, experience, English, location,
+employment, preferences). Scores are stored on ``MessageThread.match_score``
+so the inbox can be sorted by fit with a single indexed query, and the
+points of each component are packed into ``score_breakdown`` (one byte per
+component) so the inbox can explain low scores without recomputing them.
+"""
+import re
+
+from .models import EnglishLevel, JobPosting, MessageThread
+from .regions import accepted_regions, is_accepted
+from .skills import parse_skills
+
+# Max points per component, sums to 100
+WEIGHTS = {
+    'keyword': 20,
+    'skills': 15,
+    'salary': 20,
+    'experience': 15,
+    'english': 10,
+    'location': 10,
+    'employment': 5,
+    'preferences': 5,
+}
+
+# Why a component scored below its weight
+COMPONENT_REASONS = {
+    'keyword': "Other category",
+    'skills': "Missing skills",
+    'salary': "Salary above budget",
+    'experience': "Less experience",
+    'english': "English below required",
+    'location': "Outside accepted region",
+    'employment': "Employment type mismatch",
+    'preferences': "Not interested in domain",
+}
+
+# Bits per component in score_breakdown, every weight must stay below 128
+BREAKDOWN_BITS = 8
+
+ENGLISH_ORDINAL = {
+    EnglishLevel.NONE: 0,
+    EnglishLevel.BASIC: 1,
+    EnglishLevel.PRE: 2,
+    EnglishLevel.INTERMEDIATE: 3,
+    EnglishLevel.UPPER: 4,
+    EnglishLevel.FLUENT: 5,
+}
+# Points lost per English level below the required one
+ENGLISH_STEP_PENALTY = 4
+
+EXPERIENCE_YEARS = {
+    JobPosting.Experience.ZERO: 0,
+    JobPosting.Experience.ONE: 1,
+    JobPosting.Experience.TWO: 2,
+    JobPosting.Experience.THREE: 3,
+    JobPosting.Experience.FIVE: 5,
+}
+
+_WORDS = re.compile(r'[\w+#.-]+')
+
+
+def split_words(raw):
+    if not raw:
+        return set()
+    return {w.lower() for w in _WORDS.findall(raw)}
+
+
+def keyword_points(candidate, job):
+    job_primary = (job.primary_keyword or '').lower()
+    job_secondary = (job.secondary_keyword or '').lower()
+    primary = (candidate.primary_keyword or '').lower()
+    secondary = (candidate.secondary_keyword or '').lower()
+
+    if not job_primary:
+        return WEIGHTS['keyword']
+    if primary == job_primary:
+        return WEIGHTS['keyword']
+    if secondary == job_primary or (job_secondary and primary == job_secondary):
+        return WEIGHTS['keyword'] * 3 // 4
+    if job_secondary and secondary == job_secondary:
+        return WEIGHTS['keyword'] // 2
+    return 0
+
+
+def skills_points(candidate, job):
+    wanted = parse_skills(job.extra_keywords)
+    if not wanted:
+        return WEIGHTS['skills']
+    matched = len(wanted & parse_skills(candidate.skills_cache))
+    return WEIGHTS['skills'] * matched // len(wanted)
+
+
+def salary_points(candidate, job):
+    budget = job.salary_max or job.salary_min or 0
+    expected = candidate.salary_min or 0
+    if budget <= 0 or expected <= budget:
+        return WEIGHTS['salary']
+    # Linear falloff, nothing left when asking for twice the budget
+    points = WEIGHTS['salary'] * (2 * budget - expected) // budget
+    return max(points, 0)
+
+
+def experience_points(candidate, job):
+    required = EXPERIENCE_YEARS.get(job.exp_years, 0)
+    years = candidate.experience_years or 0.0
+    if years >= required:
+        return WEIGHTS['experience']
+    return int(WEIGHTS['experience'] * years / required)
+
+
+def english_points(candidate, job):
+    required = ENGLISH_ORDINAL.get(job.english_level, 0)
+    level = ENGLISH_ORDINAL.get(candidate.english_level, 0)
+    if level >= required:
+        return WEIGHTS['english']
+    return max(WEIGHTS['english'] - ENGLISH_STEP_PENALTY * (required - level), 0)
+
+
+def location_points(candidate, job):
+    if is_accepted(candidate.country_code, accepted_regions(job)):
+        return WEIGHTS['location']
+    if candidate.can_relocate and job.relocate_type not in ('', JobPosting.RelocateType.NO_RELOCATE):
+        return WEIGHTS['location'] // 2
+    return 0
+
+
+def employment_points(candidate, job):
+    options = split_words(candidate.employment)
+    if job.is_parttime and 'parttime' not in options:
+        return 0
+    remote_type = job.remote_type or ''
+    if remote_type == JobPosting.RemoteType.OFFICE:
+        ok = 'fulltime' in options or 'relocate' in options or 'move' in options
+    elif remote_type == JobPosting.RemoteType.FULL_REMOTE:
+        ok = 'remote' in options
+    elif remote_type == JobPosting.RemoteType.PARTLY_REMOTE:
+        ok = 'fulltime' in options or 'remote' in options
+    else:
+        ok = True
+    return WEIGHTS['employment'] if ok else 0
+
+
+def preferences_points(candidate, job):
+    domain = (job.domain or '').lower()
+    company_type = (job.company_type or '').lower()
+    if domain and domain in split_words(candidate.domain_zones):
+        return 0
+    if company_type and company_type in split_words(candidate.uninterested_company_types):
+        return 0
+    return WEIGHTS['preferences']
+
+
+COMPONENTS = (
+    ('keyword', keyword_points),
+    ('skills', skills_points),
+    ('salary', salary_points),
+    ('experience', experience_points),
+    ('english', english_points),
+    ('location', location_points),
+    ('employment', employment_points),
+    ('preferences', preferences_points),
+)
+
+
+def compute_breakdown(candidate, job):
+    """Points of each component in COMPONENTS order, all zero without a job."""
+    if job is None:
+        return [0] * len(COMPONENTS)
+    return [fn(candidate, job) for _, fn in COMPONENTS]
+
+
+def compute_score(candidate, job):
+    """Match score of the candidate for the job, 0..100."""
+    return sum(compute_breakdown(candidate, job))
+
+
+def pack_breakdown(points):
+    packed = 0
+    for i, value in enumerate(points):
+        packed |= value << (BREAKDOWN_BITS * i)
+    return packed
+
+
+def unpack_breakdown(packed):
+    mask = (1 << BREAKDOWN_BITS) - 1
+    return [(packed >> (BREAKDOWN_BITS * i)) & mask for i in range(len(COMPONENTS))]
+
+
+def score_badges(thread):
+    """``(reason, points, weight)`` of each component that cost the thread points."""
+    if thread.job_id is None or not thread.score_breakdown:
+        return []
+    return [
+        (COMPONENT_REASONS[name], points, WEIGHTS[name])
+        for (name, _), points in zip(COMPONENTS, unpack_breakdown(thread.score_breakdown))
+        if points < WEIGHTS[name]
+    ]
+
+
+def score_threads(threads, batch_size=1000):
+    """Recompute and persist ``match_score`` and ``score_breakdown`` for the given threads queryset."""
+    fields = ['match_score', 'score_breakdown']
+    batch = []
+    updated = 0
+    for thread in threads.select_related('candidate', 'job').iterator(chunk_size=batch_size):
+        points = compute_breakdown(thread.candidate, thread.job)
+        thread.match_score = sum(points)
+        thread.score_breakdown = pack_breakdown(points)
+        batch.append(thread)
+        if len(batch) >= batch_size:
+            MessageThread.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+    if batch:
+        MessageThread.objects.bulk_update(batch, fields)
+        updated += len(batch)
+    return updated
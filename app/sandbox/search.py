@@ -0,0 +1,87 @@
+"""
+Full-text search over a recruiter's inbox.
+
+Messages and candidate profiles carry a ``search_vector`` tsvector column
+generated by PostgreSQL with a GIN index (migration 0007). The columns are
+not declared on the models so regular queries never fetch them; searching
+goes through the raw SQL below and returns ranked thread ids.
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'english'
+SEARCH_LIMIT = 100
+
+# Positional parameters from search_params(), then those of the scope, then the limit
+SEARCH_SQL = """
+WITH hits AS (
+    SELECT m.thread_id, ts_rank(m.search_vector, websearch_to_tsquery(%s, %s)) AS rank
+    FROM sandbox_message m
+    WHERE m.recruiter_id = %s
+      AND m.thread_id IS NOT NULL
+      AND m.search_vector @@ websearch_to_tsquery(%s, %s)
+    UNION ALL
+    SELECT t.id, ts_rank(c.search_vector, websearch_to_tsquery(%s, %s))
+    FROM sandbox_messagethread t
+    JOIN sandbox_candidate c ON c.id = t.candidate_id
+    WHERE t.recruiter_id = %s
+      AND c.search_vector @@ websearch_to_tsquery(%s, %s)
+)
+SELECT thread_id, max(rank) AS rank
+FROM hits
+{scope}
+GROUP BY thread_id
+ORDER BY rank DESC, thread_id DESC
+LIMIT %s
+"""
+
+# Every matching thread, unranked, for bulk actions on all search results
+MATCH_SQL = """
+SELECT m.thread_id
+FROM sandbox_message m
+WHERE m.recruiter_id = %s
+  AND m.thread_id IS NOT NULL
+  AND m.search_vector @@ websearch_to_tsquery(%s, %s)
+UNION
+SELECT t.id
+FROM sandbox_messagethread t
+JOIN sandbox_candidate c ON c.id = t.candidate_id
+WHERE t.recruiter_id = %s
+  AND c.search_vector @@ websearch_to_tsquery(%s, %s)
+"""
+
+
+def matching_thread_ids(recruiter_id, text):
+    """Subquery of the ids of all threads matching ``text``, for an ``id__in`` filter."""
+    return RawSQL(MATCH_SQL, [recruiter_id, SEARCH_CONFIG, text, recruiter_id, SEARCH_CONFIG, text])
+
+
+def search_params(recruiter_id, text):
+    query = [SEARCH_CONFIG, text]
+    return [*query, recruiter_id, *query, *query, recruiter_id, *query]
+
+
+def search_thread_ids(recruiter_id, text, limit=SEARCH_LIMIT, threads=None):
+    """
+    ``[(thread_id, rank), ...]`` best first, matching messages or the
+    candidate profile, among the ``threads`` queryset if given.
+    """
+    text = (text or '').strip()
+    if not text:
+        return []
+    scope, scope_params = '', ()
+    if threads is not None:
+        # Filtered before ranking, so the limit counts only threads in scope
+        sql, scope_params = threads.order_by().values('id').query.sql_with_params()
+        scope = f"WHERE thread_id IN ({sql})"
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL.format(scope=scope), [*search_params(recruiter_id, text), *scope_params, limit])
+        return cursor.fetchall()
+
+
+def search_threads(threads, recruiter_id, text, limit=SEARCH_LIMIT):
+    """Rows of the ``threads`` queryset matching ``text``, ranked best first."""
+    ranks = dict(search_thread_ids(recruiter_id, text, limit, threads))
+    rows = list(threads.filter(id__in=ranks))
+    rows.sort(key=lambda t: (-ranks[t.id], -t.id))
+    return rows
@@ -0,0 +1,118 @@
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, routing
+from .facets import invalidate_facet_counts
+from .models import Candidate, JobPosting, Message, MessageThread, RescoreRequest
+from .rescoring import CANDIDATE_SCORE_FIELDS, JOB_SCORE_FIELDS, affects_score, enqueue_rescore
+from .scoring import compute_breakdown, pack_breakdown
+from .skills import sync_candidate_skills, sync_job_skills
+
+
+@receiver(post_save, sender=Message)
+def advance_thread_to_new_message(sender, instance, created, **kwargs):
+    if not created or instance.thread_id is None:
+        return
+    with transaction.atomic():
+        thread = (
+            MessageThread.objects.select_for_update(of=('self',)).select_related('last_message')
+            .filter(pk=instance.thread_id).first()
+        )
+        if thread is None:
+            return
+        # Only move the pointer forward, messages may be saved out of order
+        if thread.last_message is None or thread.last_message.created <= instance.created:
+            thread.last_message = instance
+            thread.last_sender = instance.sender
+        # Announces the thread to inbox_changes, the save moves the unread counters
+        thread.last_updated = max(thread.last_updated, instance.created)
+        thread.save(update_fields=['last_message', 'last_sender', 'last_updated'])
+
+
+@receiver(post_delete, sender=Message)
+def repoint_thread_after_delete(sender, instance, **kwargs):
+    if instance.thread_id is None:
+        return
+    thread = MessageThread.objects.filter(pk=instance.thread_id, last_message__isnull=True).first()
+    if thread is not None:
+        thread.refresh_last_message()
+
+
+@receiver(post_save, sender=Message)
+def drop_facets_on_new_message(sender, instance, created, **kwargs):
+    if created:
+        invalidate_facet_counts(instance.recruiter_id)
+
+
+@receiver(post_save, sender=MessageThread)
+def drop_facets_on_thread_change(sender, instance, created, **kwargs):
+    if created or instance.has_changed('bucket') or instance.has_changed('recruiter_favorite'):
+        invalidate_facet_counts(instance.recruiter_id)
+
+
+@receiver(post_save, sender=MessageThread)
+def count_thread_change(sender, instance, created, **kwargs):
+    counters.thread_saved(instance, created)
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, **kwargs):
+    if created:
+        counters.message_created(instance)
+
+
+@receiver(post_save, sender=Candidate)
+def link_candidate_skills(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'skills_cache' in update_fields:
+        sync_candidate_skills([(instance.pk, instance.skills_cache)])
+
+
+@receiver(post_save, sender=JobPosting)
+def link_job_skills(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'extra_keywords' in update_fields:
+        sync_job_skills([(instance.pk, instance.extra_keywords)])
+
+
+@receiver(pre_save, sender=Candidate)
+def touch_candidate(sender, instance, update_fields=None, **kwargs):
+    # last_modified versions the cached inbox cards, see sandbox.fragments
+    if update_fields is None or 'last_modified' in update_fields:
+        instance.last_modified = timezone.now()
+
+
+@receiver(post_save, sender=MessageThread)
+def score_new_thread(sender, instance, created, **kwargs):
+    # Scored once here, later candidate and job edits go through the rescore queue
+    if not created or instance.job_id is None or instance.match_score or instance.score_breakdown:
+        return
+    points = compute_breakdown(instance.candidate, instance.job)
+    instance.match_score, instance.score_breakdown = sum(points), pack_breakdown(points)
+    MessageThread.objects.filter(pk=instance.pk).update(
+        match_score=instance.match_score, score_breakdown=instance.score_breakdown
+    )
+
+
+@receiver(post_save, sender=Candidate)
+def queue_candidate_rescore(sender, instance, created, update_fields=None, **kwargs):
+    # New profiles and jobs have no threads to rescore yet
+    if not created and affects_score(CANDIDATE_SCORE_FIELDS, update_fields):
+        enqueue_rescore(RescoreRequest.Kind.CANDIDATE, [instance.pk])
+
+
+@receiver(post_save, sender=JobPosting)
+def queue_job_rescore(sender, instance, created, update_fields=None, **kwargs):
+    if not created and affects_score(JOB_SCORE_FIELDS, update_fields):
+        enqueue_rescore(RescoreRequest.Kind.JOB, [instance.pk])
+
+
+@receiver(request_started)
+def check_idle_connections(sender, **kwargs):
+    routing.check_connections()
+
+
+@receiver(request_finished)
+def release_connections(sender, **kwargs):
+    routing.release_connections()
@@ -0,0 +1,110 @@
+"""
+Canonical skill dictionary.
+
+Free-text skills (``Candidate.skills_cache``, ``JobPosting.extra_keywords``)
+are split, normalized through ``ALIASES`` and linked to ``Skill`` rows, so
+skill overlap can be computed over integer ids instead of strings.
+"""
+import re
+
+from .models import Candidate, JobPosting, Skill
+
+MAX_SKILL_LENGTH = Skill._meta.get_field('name').max_length
+
+ALIASES = {
+    'amazon web services': 'aws',
+    'angularjs': 'angular',
+    'c sharp': 'c#',
+    'cpp': 'c++',
+    'csharp': 'c#',
+    'django-rest-framework': 'django rest framework',
+    'drf': 'django rest framework',
+    'ecmascript': 'javascript',
+    'golang': 'go',
+    'google cloud': 'gcp',
+    'google cloud platform': 'gcp',
+    'js': 'javascript',
+    'k8s': 'kubernetes',
+    'mongo': 'mongodb',
+    'node': 'node.js',
+    'node js': 'node.js',
+    'nodejs': 'node.js',
+    'postgre': 'postgresql',
+    'postgres': 'postgresql',
+    'psql': 'postgresql',
+    'py': 'python',
+    'python3': 'python',
+    'react js': 'react',
+    'react.js': 'react',
+    'reactjs': 'react',
+    'restful': 'rest',
+    'restful api': 'rest',
+    'rest api': 'rest',
+    'ts': 'typescript',
+    'vue': 'vue.js',
+    'vuejs': 'vue.js',
+}
+
+_SEPARATORS = re.compile(r'[,;|\n]+')
+
+
+def normalize_skill(raw):
+    name = ' '.join(raw.lower().split()).rstrip('.')
+    return ALIASES.get(name, name)
+
+
+def parse_skills(raw):
+    """Set of canonical skill names in a free-text skills string."""
+    if not raw:
+        return set()
+    names = (normalize_skill(s) for s in _SEPARATORS.split(raw))
+    return {n for n in names if n and len(n) <= MAX_SKILL_LENGTH}
+
+
+def resolve_skills(names):
+    """Map canonical names to Skill ids, creating the missing skills."""
+    names = set(names)
+    ids = dict(Skill.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - ids.keys()
+    if missing:
+        Skill.objects.bulk_create([Skill(name=n) for n in missing], ignore_conflicts=True)
+        ids.update(Skill.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def _sync(field, rows):
+    """Replace the skill links of ``(owner_id, raw_skills)`` rows."""
+    through = field.remote_field.through
+    owner = field.m2m_field_name()
+    parsed = [(owner_id, parse_skills(raw)) for owner_id, raw in rows]
+    ids = resolve_skills(set().union(*(names for _, names in parsed)))
+
+    through.objects.filter(**{f'{owner}__in': [owner_id for owner_id, _ in parsed]}).delete()
+    through.objects.bulk_create(
+        [
+            through(**{f'{owner}_id': owner_id, 'skill_id': ids[name]})
+            for owner_id, names in parsed
+            for name in names
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def sync_candidate_skills(rows):
+    """Relink skills of ``(candidate_id, skills_cache)`` rows."""
+    _sync(Candidate._meta.get_field('skills'), rows)
+
+
+def sync_job_skills(rows):
+    """Relink skills of ``(job_id, extra_keywords)`` rows."""
+    _sync(JobPosting._meta.get_field('skills'), rows)
+
+
+def candidate_skill_ids(candidate_ids):
+    """Skill ids of each candidate, as ``{candidate_id: [skill_id, ...]}``."""
+    through = Candidate.skills.through
+    skills = {}
+    rows = through.objects.filter(candidate_id__in=candidate_ids).values_list('candidate_id', 'skill_id')
+    for candidate_id, skill_id in rows.iterator():
+        skills.setdefault(candidate_id, []).append(skill_id)
+    return skills
@@ -0,0 +1,180 @@
+"""
+Synthetic inbox data for benchmarks.
+
+``generate`` bulk-creates recruiters, jobs, candidates, threads and messages
+in chunks so memory stays flat up to millions of messages. Thread lengths
+follow a long-tailed distribution, a few conversations run to hundreds of
+messages. bulk_create skips the save signals, so the denormalized fields
+(last message, skill links, match scores, counters) are filled in bulk
+afterwards.
+"""
+import random
+import secrets
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .batch_scoring import rescore_job
+from .counters import reconcile_counters
+from .facets import invalidate_facet_counts
+from .models import Action, Bucket, Candidate, EnglishLevel, JobPosting, Message, MessageThread, Recruiter
+from .skills import sync_candidate_skills, sync_job_skills
+
+KEYWORDS = ["Python", "JavaScript", "Java", "PHP", "Golang", "DevOps", "QA", "Data Science"]
+SKILLS = ["Django", "Flask", "FastAPI", "PostgreSQL", "MySQL", "Redis", "Docker",
+          "Kubernetes", "AWS", "GCP", "React", "Celery", "Kafka", "Linux", "Git"]
+COUNTRIES = ["UKR", "POL", "DEU", "ESP", "PRT", "USA", "GBR", "ROU", "GEO", "TUR"]
+EMPLOYMENT = ["fulltime remote", "remote", "fulltime", "remote parttime", "fulltime relocate"]
+WORDS = (
+    "hello thanks great experience project company vacancy schedule call tomorrow week "
+    "available position role team offer interview salary remote office stack backend "
+    "frontend senior middle lead english test task contract startup product"
+).split()
+
+# Threads per candidate, each with a different recruiter
+THREADS_PER_CANDIDATE = 3
+JOBS_PER_RECRUITER = 3
+# Cap on a single conversation
+MAX_THREAD_MESSAGES = 500
+# Conversations start within HISTORY and last up to THREAD_SPAN, ending by now
+HISTORY = timedelta(days=365)
+THREAD_SPAN = timedelta(days=30)
+
+BUCKET_WEIGHTS = {
+    Bucket.INBOX.value: 70,
+    Bucket.ARCHIVE.value: 15,
+    Bucket.NOTINTERESTED.value: 8,
+    Bucket.SHORTLIST.value: 5,
+    Bucket.POKES.value: 2,
+}
+
+
+def synthetic_candidates(count, rng, prefix='bench'):
+    for i in range(count):
+        yield Candidate(
+            email=f"{prefix}{i}@example.com",
+            position=f"{rng.choice(['Junior', 'Middle', 'Senior', 'Lead'])} {rng.choice(KEYWORDS)} Developer",
+            primary_keyword=rng.choice(KEYWORDS),
+            secondary_keyword=rng.choice(KEYWORDS + [""]),
+            salary_min=rng.randrange(500, 8000, 100),
+            experience_years=rng.choice([0, 0.5, 1, 2, 3, 4, 5, 7, 10]),
+            english_level=rng.choice(EnglishLevel.values + [""]),
+            skills_cache=", ".join(rng.sample(SKILLS, rng.randint(0, 8))),
+            country_code=rng.choice(COUNTRIES),
+            employment=rng.choice(EMPLOYMENT),
+            can_relocate=rng.random() < 0.2,
+            domain_zones=rng.choice(["", "gambling", "adult gambling"]),
+            uninterested_company_types=rng.choice(["", "agency", "outsource"]),
+            moreinfo=sentence(rng, 40),
+            looking_for=sentence(rng, 15),
+        )
+
+
+def synthetic_jobs(recruiters, rng):
+    for recruiter in recruiters:
+        for _ in range(JOBS_PER_RECRUITER):
+            yield JobPosting(
+                recruiter=recruiter,
+                position=f"{rng.choice(['Middle', 'Senior'])} {rng.choice(KEYWORDS)} Developer",
+                primary_keyword=rng.choice(KEYWORDS),
+                extra_keywords=", ".join(rng.sample(SKILLS, rng.randint(1, 5))),
+                salary_min=rng.randrange(1000, 5000, 500),
+                salary_max=rng.randrange(5000, 9000, 500),
+                exp_years=rng.choice(JobPosting.Experience.values),
+                english_level=rng.choice(EnglishLevel.values),
+                accept_region=rng.choice(JobPosting.AcceptRegion.values) or '',
+                remote_type=rng.choice(JobPosting.RemoteType.values),
+            )
+
+
+def sentence(rng, words):
+    return " ".join(rng.choices(WORDS, k=rng.randint(1, words)))
+
+
+def thread_length(rng, mean):
+    """Long-tailed message count with the given mean (Pareto, alpha 1.5)."""
+    return min(MAX_THREAD_MESSAGES, max(1, int(rng.paretovariate(1.5) * mean / 3)))
+
+
+def generate(messages, recruiters=50, per_thread=10, batch_size=2000, seed=None, include=(), score=True):
+    """
+    Create about ``messages`` messages spread over new recruiters plus the
+    ``include`` recruiters, returns ``{model_name: created_count}``.
+    The same ``seed`` gives the same data, emails get a per run token so it
+    can be generated again into the same database.
+    """
+    rng = random.Random(seed)
+    run = f"synth{rng.getrandbits(32):08x}{secrets.token_hex(4)}"
+    now = timezone.now()
+
+    new_recruiters = Recruiter.objects.bulk_create(
+        [Recruiter(name=f"Recruiter {i}", email=f"{run}-r{i}@example.com") for i in range(recruiters)],
+        batch_size=batch_size,
+    )
+    all_recruiters = new_recruiters + list(include)
+    jobs = JobPosting.objects.bulk_create(synthetic_jobs(all_recruiters, rng), batch_size=batch_size)
+    sync_job_skills([(job.id, job.extra_keywords) for job in jobs])
+    jobs_of = {}
+    for job in jobs:
+        jobs_of.setdefault(job.recruiter_id, []).append(job)
+
+    created = {'recruiters': len(new_recruiters), 'jobs': len(jobs), 'candidates': 0, 'threads': 0, 'messages': 0}
+    per_candidate = min(THREADS_PER_CANDIDATE, len(all_recruiters))
+    candidates_per_batch = max(1, batch_size // per_candidate)
+    while created['messages'] < messages:
+        candidates = Candidate.objects.bulk_create(
+            synthetic_candidates(candidates_per_batch, rng, prefix=f"{run}-c{created['candidates']}-")
+        )
+        sync_candidate_skills([(c.id, c.skills_cache) for c in candidates])
+        created['candidates'] += len(candidates)
+
+        threads, thread_messages = [], []
+        for candidate in candidates:
+            for recruiter in rng.sample(all_recruiters, per_candidate):
+                if created['messages'] >= messages:
+                    break
+                count = min(thread_length(rng, per_thread), messages - created['messages'])
+                created['messages'] += count
+                job = rng.choice(jobs_of[recruiter.id])
+                start = now - THREAD_SPAN - rng.uniform(0, 1) * (HISTORY - THREAD_SPAN)
+                times = sorted(start + rng.uniform(0, 1) * THREAD_SPAN for _ in range(count))
+                senders = [Message.Sender.CANDIDATE] + [
+                    rng.choice(Message.Sender.values) for _ in range(count - 1)
+                ]
+                threads.append(MessageThread(
+                    candidate=candidate, recruiter=recruiter, job=job,
+                    bucket=rng.choices(list(BUCKET_WEIGHTS), weights=BUCKET_WEIGHTS.values())[0],
+                    first_message=Action.APPLY, last_sender=senders[-1],
+                    last_updated=times[-1],
+                    last_seen_recruiter=times[-1] if rng.random() < 0.6 else None,
+                    recruiter_favorite=True if rng.random() < 0.05 else None,
+                ))
+                thread_messages.append([
+                    Message(
+                        body=sentence(rng, 60), sender=sender, created=at,
+                        action=Action.APPLY if i == 0 else '',
+                        recruiter=recruiter, candidate=candidate, job=job,
+                    )
+                    for i, (sender, at) in enumerate(zip(senders, times))
+                ])
+
+        MessageThread.objects.bulk_create(threads, batch_size=batch_size)
+        rows = []
+        for thread, thread_rows in zip(threads, thread_messages):
+            for message in thread_rows:
+                message.thread = thread
+            rows.extend(thread_rows)
+        Message.objects.bulk_create(rows, batch_size=batch_size)
+        for thread, thread_rows in zip(threads, thread_messages):
+            thread.last_message = thread_rows[-1]
+        MessageThread.objects.bulk_update(threads, ['last_message'], batch_size=batch_size)
+        created['threads'] += len(threads)
+
+    if score:
+        for job in jobs:
+            rescore_job(job, batch_size)
+    recruiter_ids = [r.id for r in all_recruiters]
+    reconcile_counters(recruiter_ids, batch_size)
+    for recruiter_id in recruiter_ids:
+        invalidate_facet_counts(recruiter_id)
+    return created
@@ -1,3 +1,1560 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import random
+import re
+import smtplib
+import time
+from datetime import timedelta
+from io import StringIO
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import events, export, fragments, matching, partitions, regions, routing, views
+from .batch_scoring import CANDIDATE_FIELDS, CandidateColumns, pack_components, rescore_job
+from .counters import reconcile_counters, recruiter_counter
+from .facets import FACETS_CACHE, compute_facet_counts, facet_counts
+from .features import CandidateFeatureStore
+from .matching import CandidateIndex, CandidateMatcher, MatcherService
+from .fragments import fragment_stats, reset_fragment_cache
+from .models import (
+    Action, ArchivedMessage, Bucket, Candidate, InboxCounter, JobPosting, LazyChoices, Message, MessageThread,
+    Recruiter, Skill,
+)
+from .notifications import NOTIFY_WITHIN, DispatchBatch, dispatch_batch, notification_status
+from .pagination import encode_cursor, keyset_page
+from .profiling import BudgetExceeded, ProfileMiddleware, fingerprint, reset_view_profiles
+from .rescoring import process_batch, rescore_status
+from .scoring import (
+    WEIGHTS, compute_breakdown, compute_score, pack_breakdown, score_badges, score_threads, unpack_breakdown,
+)
+from .search import SEARCH_LIMIT, search_thread_ids, search_threads
+from .skills import parse_skills
+from .synthetic import generate, synthetic_candidates
+from .views import RECRUITER_ID
+
+_seq = count(1)
+
+
+def make_recruiter(**kwargs):
+    kwargs.setdefault('email', f"recruiter{next(_seq)}@example.com")
+    return Recruiter.objects.create(**kwargs)
+
+
+def make_candidate(save=True, **kwargs):
+    fields = {
+        'email': f"candidate{next(_seq)}@example.com",
+        'position': "Python Developer",
+        'primary_keyword': "Python",
+        'salary_min': 3000,
+        'experience_years': 4.0,
+        'english_level': 'upper',
+        'skills_cache': "Django, PostgreSQL, Docker",
+        'country_code': 'UKR',
+        'employment': 'fulltime remote',
+    }
+    fields.update(kwargs)
+    candidate = Candidate(**fields)
+    if save:
+        candidate.save()
+    return candidate
+
+
+def make_job(recruiter=None, save=True, **kwargs):
+    fields = {
+        'position': "Senior Python Developer",
+        'primary_keyword': "Python",
+        'extra_keywords': "Django, PostgreSQL",
+        'salary_min': 3000,
+        'salary_max': 4000,
+        'exp_years': '3y',
+        'english_level': 'intermediate',
+        'accept_region': 'europe',
+        'remote_type': 'full_remote',
+    }
+    fields.update(kwargs)
+    job = JobPosting(recruiter=recruiter, **fields)
+    if save:
+        job.save()
+    return job
+
+
+def make_thread(recruiter, candidate, job=None, **kwargs):
+    kwargs.setdefault('last_updated', timezone.now())
+    kwargs.setdefault('last_sender', 'candidate')
+    kwargs.setdefault('first_message', 'apply')
+    return MessageThread.objects.create(recruiter=recruiter, candidate=candidate, job=job, **kwargs)
+
+
+def make_message(thread, **kwargs):
+    kwargs.setdefault('created', timezone.now())
+    kwargs.setdefault('sender', Message.Sender.CANDIDATE)
+    kwargs.setdefault('body', "Hello")
+    return Message.objects.create(
+        thread=thread, recruiter_id=thread.recruiter_id, candidate_id=thread.candidate_id,
+        job_id=thread.job_id, **kwargs
+    )
+
+
+class ScoringTests(SimpleTestCase):
+    def test_perfect_match(self):
+        self.assertEqual(compute_score(make_candidate(save=False), make_job(save=False)), 100)
+
+    def test_no_job(self):
+        self.assertEqual(compute_score(make_candidate(save=False), None), 0)
+
+    def test_salary_above_budget(self):
+        job = make_job(save=False, salary_max=4000)
+        candidate = make_candidate(save=False, salary_min=5000)
+        self.assertEqual(compute_score(candidate, job), 100 - WEIGHTS['salary'] // 4)
+
+        candidate.salary_min = 8000
+        self.assertEqual(compute_score(candidate, job), 100 - WEIGHTS['salary'])
+
+    def test_english_below_required(self):
+        job = make_job(save=False, english_level='upper')
+        candidate = make_candidate(save=False, english_level='pre')
+        self.assertEqual(compute_score(candidate, job), 100 - 8)
+
+    def test_country_outside_region(self):
+        job = make_job(save=False, accept_region='ukraine')
+        candidate = make_candidate(save=False, country_code='POL')
+        self.assertEqual(compute_score(candidate, job), 100 - WEIGHTS['location'])
+
+    def test_null_profile_fields(self):
+        candidate = make_candidate(save=False, skills_cache=None, secondary_keyword=None, domain_zones=None)
+        self.assertEqual(compute_score(candidate, make_job(save=False)), 100 - WEIGHTS['skills'])
+
+    def test_breakdown(self):
+        job = make_job(save=False, accept_region='ukraine', salary_max=4000)
+        candidate = make_candidate(save=False, country_code='POL', salary_min=8000)
+        points = compute_breakdown(candidate, job)
+        self.assertEqual(sum(points), compute_score(candidate, job))
+        self.assertEqual(unpack_breakdown(pack_breakdown(points)), points)
+
+        thread = MessageThread(job_id=1, score_breakdown=pack_breakdown(points))
+        self.assertEqual(score_badges(thread), [
+            ("Salary above budget", 0, WEIGHTS['salary']),
+            ("Outside accepted region", 0, WEIGHTS['location']),
+        ])
+        self.assertEqual(score_badges(MessageThread(job_id=1)), [])
+
+
+class RegionTests(SimpleTestCase):
+    def test_accepted_regions(self):
+        cases = [
+            ({}, ['UKR', 'POL'], ['USA', '']),
+            ({'accept_region': 'europe_only'}, ['POL'], ['UKR', 'USA']),
+            ({'accept_region': 'ukraine'}, ['UKR'], ['POL']),
+            ({'accept_region': '', 'is_ukraine_only': True}, ['UKR'], ['POL']),
+            ({'accept_region': ''}, ['UKR', 'USA', ''], []),
+        ]
+        for kwargs, accepted, rejected in cases:
+            mask = regions.accepted_regions(make_job(save=False, **kwargs))
+            with self.subTest(job=kwargs):
+                self.assertTrue(all(regions.is_accepted(c, mask) for c in accepted))
+                self.assertFalse(any(regions.is_accepted(c, mask) for c in rejected))
+        self.assertEqual(regions.countries_in(regions.UKRAINE), {'UKR'})
+        self.assertIn('POL', regions.countries_in(regions.UKRAINE | regions.EUROPE))
+
+    def test_lazy_choices(self):
+        load = mock.Mock(return_value=[('UKR', "Ukraine")])
+        choices = LazyChoices(load)
+        load.assert_not_called()
+        self.assertEqual(dict(choices), {'UKR': "Ukraine"})
+        self.assertEqual((len(choices), choices[0]), (1, ('UKR', "Ukraine")))
+        self.assertEqual(choices, [('UKR', "Ukraine")])
+        load.assert_called_once()
+
+
+class BatchScoringTests(SimpleTestCase):
+    candidates = [
+        {},
+        {'primary_keyword': "PHP", 'secondary_keyword': "Python"},
+        {'primary_keyword': "DevOps", 'secondary_keyword': None},
+        {'salary_min': 5100, 'experience_years': 1.5, 'english_level': ''},
+        {'salary_min': 9000, 'english_level': 'basic', 'skills_cache': None},
+        {'country_code': 'USA', 'can_relocate': True, 'employment': 'fulltime'},
+        {'country_code': 'POL', 'employment': 'parttime', 'domain_zones': "gambling, adult"},
+        {'uninterested_company_types': "agency", 'skills_cache': "django,\nDocker"},
+    ]
+    jobs = [
+        {},
+        {'secondary_keyword': "DevOps", 'accept_region': 'ukraine', 'relocate_type': 'company_paid'},
+        {'salary_max': 0, 'salary_min': 2000, 'exp_years': '5y', 'english_level': 'fluent'},
+        {'primary_keyword': "", 'extra_keywords': "", 'remote_type': 'office', 'is_parttime': True},
+        {'accept_region': 'europe_only', 'domain': "gambling", 'company_type': "agency"},
+        {'exp_years': 'no_exp', 'remote_type': 'partly_remote', 'salary_max': None, 'salary_min': None},
+    ]
+
+    def test_matches_scalar_scoring(self):
+        candidates = [make_candidate(save=False, **kw) for kw in self.candidates]
+        columns = CandidateColumns(
+            [tuple(getattr(c, f) for f in CANDIDATE_FIELDS) for c in candidates],
+            [c.skills_cache for c in candidates],
+        )
+        for kwargs in self.jobs:
+            job = make_job(save=False, **kwargs)
+            with self.subTest(job=kwargs):
+                self.assertEqual(columns.scores(job).tolist(), [compute_score(c, job) for c in candidates])
+
+    def test_breakdown_matches_scalar(self):
+        candidates = [make_candidate(save=False, **kw) for kw in self.candidates]
+        columns = CandidateColumns(
+            [tuple(getattr(c, f) for f in CANDIDATE_FIELDS) for c in candidates],
+            [c.skills_cache for c in candidates],
+        )
+        for kwargs in self.jobs:
+            job = make_job(save=False, **kwargs)
+            with self.subTest(job=kwargs):
+                self.assertEqual(
+                    pack_components(columns.components(job)).tolist(),
+                    [pack_breakdown(compute_breakdown(c, job)) for c in candidates],
+                )
+
+    def test_empty(self):
+        self.assertEqual(CandidateColumns([], []).scores(make_job(save=False)).tolist(), [])
+
+    def test_take_and_concat(self):
+        candidates = [make_candidate(save=False, **kw) for kw in self.candidates]
+        rows = [tuple(getattr(c, f) for f in CANDIDATE_FIELDS) for c in candidates]
+        skills = [c.skills_cache for c in candidates]
+        vocab = {}
+        head = CandidateColumns(rows[:3], skills[:3], vocab=vocab)
+        tail = CandidateColumns(rows[3:], skills[3:], vocab=vocab)
+        columns = head.concat(tail)
+        picked = columns.take([6, 0, 3])
+        for kwargs in self.jobs:
+            job = make_job(save=False, **kwargs)
+            with self.subTest(job=kwargs):
+                expected = [compute_score(c, job) for c in candidates]
+                self.assertEqual(columns.scores(job).tolist(), expected)
+                self.assertEqual(picked.scores(job).tolist(), [expected[6], expected[0], expected[3]])
+
+
+class InboxSortTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        self.job = make_job(self.recruiter)
+        self.strong = make_thread(self.recruiter, make_candidate(), self.job)
+        self.weak = make_thread(self.recruiter, make_candidate(primary_keyword="PHP"), self.job)
+        score_threads(MessageThread.objects.all())
+
+    def test_sort_by_score(self):
+        response = self.client.get(reverse('inbox'), {'sort': 'score'})
+        html = response.content.decode()
+        self.assertLess(html.index(f'id="thread-{self.strong.id}"'), html.index(f'id="thread-{self.weak.id}"'))
+        self.assertEqual(MessageThread.objects.get(id=self.strong.id).match_score, 100)
+
+    def test_score_badges(self):
+        html = self.client.get(reverse('inbox')).content.decode()
+        weak = html[html.index(f'id="thread-{self.weak.id}"'):html.index(f'id="thread-{self.strong.id}"')]
+        self.assertIn("Other category", weak)
+        self.assertEqual(html.count("Other category"), 1)
+
+        html = self.client.get(reverse('inbox_thread', args=[self.weak.id])).content.decode()
+        self.assertIn("Other category", html)
+
+    def test_rescore_job(self):
+        JobPosting.objects.filter(id=self.job.id).update(primary_keyword="PHP")
+        self.job.refresh_from_db()
+
+        self.assertEqual(rescore_job(self.job), 2)
+        weak = MessageThread.objects.get(id=self.weak.id)
+        self.assertEqual(weak.match_score, 100)
+        self.assertEqual(score_badges(weak), [])
+        self.assertEqual(rescore_job(self.job), 0)
+
+    def test_sort_by_recent(self):
+        html = self.client.get(reverse('inbox')).content.decode()
+        self.assertLess(html.index(f'id="thread-{self.weak.id}"'), html.index(f'id="thread-{self.strong.id}"'))
+
+
+class LastMessageTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        self.job = make_job(self.recruiter)
+
+    def add_threads(self, n):
+        for _ in range(n):
+            thread = make_thread(self.recruiter, make_candidate(), self.job)
+            make_message(thread, action='apply')
+            make_message(thread, sender=Message.Sender.RECRUITER, body="Thanks")
+
+    def count_inbox_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse('inbox')).status_code, 200)
+        return len(ctx)
+
+    def test_constant_query_count(self):
+        self.add_threads(1)
+        baseline = self.count_inbox_queries()
+        self.add_threads(10)
+        self.assertEqual(self.count_inbox_queries(), baseline)
+
+    def test_pointer_follows_latest_message(self):
+        thread = make_thread(self.recruiter, make_candidate(), self.job)
+        first = make_message(thread)
+        latest = make_message(thread, created=first.created + timedelta(hours=1))
+        make_message(thread, created=first.created - timedelta(hours=1))
+
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message, latest)
+
+        latest.delete()
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message, first)
+
+
+class InboxPaginationTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        job = make_job(self.recruiter)
+        now = timezone.now()
+        # Ties on last_updated and match_score must not lose or repeat rows
+        for i in range(7):
+            make_thread(
+                self.recruiter, make_candidate(), job,
+                last_updated=now - timedelta(minutes=i // 2), match_score=50 + i % 3,
+            )
+
+    def walk(self, ordering, page_size=3):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(MessageThread.objects.all(), ordering, cursor, page_size)
+            seen.extend(t.id for t in rows)
+            if cursor is None:
+                return seen
+
+    def test_pages_cover_ordering(self):
+        for ordering in views.INBOX_ORDERING.values():
+            with self.subTest(ordering=ordering):
+                expected = list(MessageThread.objects.order_by(*ordering).values_list('id', flat=True))
+                self.assertEqual(self.walk(ordering), expected)
+
+    def test_infinite_scroll_pages(self):
+        with mock.patch.object(views, 'INBOX_PAGE_SIZE', 5):
+            first = self.client.get(reverse('inbox')).content.decode()
+            self.assertEqual(first.count('class="card mb-4"'), 5)
+            self.assertIn('<html', first)
+
+            next_url = first.split('data-next="', 1)[1].split('"', 1)[0].replace('&amp;', '&')
+            second = self.client.get(next_url).content.decode()
+            self.assertEqual(second.count('class="card mb-4"'), 2)
+            self.assertNotIn('<html', second)
+            self.assertNotIn('data-next', second)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('inbox'), {'cursor': 'garbage'}).status_code, 400)
+
+    def test_cursor_values_of_wrong_type(self):
+        thread = MessageThread.objects.first()
+        pages = [
+            (reverse('inbox'), 'cursor'),
+            (reverse('inbox_thread', args=[thread.id]), 'cursor'),
+            (reverse('inbox_changes'), 'since'),
+        ]
+        for values in (["garbage", 1], [None, None], [{'a': 1}, 1], [timezone.now().isoformat(), "x"]):
+            for url, param in pages:
+                with self.subTest(url=url, values=values):
+                    response = self.client.get(url, {param: encode_cursor(values)})
+                    self.assertEqual(response.status_code, 400)
+
+
+class SkillTests(TestCase):
+    def test_parse_normalizes_aliases(self):
+        self.assertEqual(
+            parse_skills("K8s, Postgres;  ReactJS |Node.js.\nC Sharp,,"),
+            {'kubernetes', 'postgresql', 'react', 'node.js', 'c#'},
+        )
+
+    def test_save_links_skills(self):
+        candidate = make_candidate(skills_cache="Python, Django, golang")
+        self.assertEqual(set(candidate.skills.values_list('name', flat=True)), {'python', 'django', 'go'})
+
+        candidate.skills_cache = "Go"
+        candidate.save(update_fields=['skills_cache'])
+        self.assertEqual(list(candidate.skills.values_list('name', flat=True)), ['go'])
+        self.assertEqual(Skill.objects.filter(name='go').count(), 1)
+
+    def test_backfill(self):
+        candidate = make_candidate()
+        Candidate.objects.filter(id=candidate.id).update(skills_cache="Docker, AWS")
+        call_command('backfill_skills', stdout=StringIO())
+        self.assertEqual(set(candidate.skills.values_list('name', flat=True)), {'docker', 'aws'})
+
+    def test_rescore_matches_aliases_by_id(self):
+        recruiter = make_recruiter()
+        job = make_job(recruiter, extra_keywords="Kubernetes, PostgreSQL")
+        candidate = make_candidate(skills_cache="k8s, postgres")
+        thread = make_thread(recruiter, candidate, job)
+        # New threads are scored on creation
+        MessageThread.objects.filter(pk=thread.pk).update(match_score=0, score_breakdown=0)
+
+        self.assertEqual(rescore_job(job), 1)
+        thread.refresh_from_db()
+        self.assertEqual(thread.match_score, compute_score(candidate, job))
+        self.assertEqual(thread.match_score, 100)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        caches[FACETS_CACHE].clear()
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        job = make_job(self.recruiter, salary_max=4000)
+        self.upper = make_thread(self.recruiter, make_candidate(salary_min=3000), job, recruiter_favorite=True)
+        make_thread(self.recruiter, make_candidate(english_level='fluent', salary_min=5000, country_code='POL'), job)
+        make_thread(
+            self.recruiter, make_candidate(english_level='fluent', experience_years=0.5),
+            None, bucket=Bucket.ARCHIVE.value,
+        )
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = compute_facet_counts(self.recruiter.id)
+        self.assertEqual(counts['english']['upper'], 1)
+        self.assertEqual(counts['english']['fluent'], 2)
+        self.assertEqual(counts['experience'], {'0-1': 1, '1-3': 0, '3-5': 2, '5+': 0})
+        self.assertEqual(counts['salary'], {'fits': 1, 'above': 1, 'unknown': 1})
+        self.assertEqual(counts['bucket']['inbox'], 2)
+        self.assertEqual(counts['bucket']['archive'], 1)
+        self.assertEqual(counts['favorite'], {'yes': 1})
+        self.assertEqual(counts['country'], {'UKR': 2, 'POL': 1})
+
+    def test_cached_until_bucket_change(self):
+        facet_counts(self.recruiter.id)
+        with self.assertNumQueries(0):
+            facet_counts(self.recruiter.id)
+
+        thread = MessageThread.objects.get(id=self.upper.id)
+        thread.save()
+        with self.assertNumQueries(0):
+            facet_counts(self.recruiter.id)
+
+        thread.bucket = Bucket.ARCHIVE.value
+        thread.save()
+        self.assertEqual(facet_counts(self.recruiter.id)['bucket']['archive'], 2)
+
+    def test_new_message_invalidates(self):
+        facet_counts(self.recruiter.id)
+        make_message(self.upper)
+        with self.assertNumQueries(1):
+            facet_counts(self.recruiter.id)
+
+    def test_shared_between_processes(self):
+        # A separate backend instance stands in for another worker process
+        other = caches.create_connection(FACETS_CACHE)
+        counts = facet_counts(self.recruiter.id)
+        self.assertEqual(other.get(f'inbox-facets:{self.recruiter.id}'), counts)
+
+        thread = MessageThread.objects.get(id=self.upper.id)
+        thread.bucket = Bucket.ARCHIVE.value
+        thread.save()
+        self.assertIsNone(other.get(f'inbox-facets:{self.recruiter.id}'))
+
+    def test_filter_inbox(self):
+        html = self.client.get(reverse('inbox'), {'english': 'fluent', 'country': 'UKR'}).content.decode()
+        self.assertEqual(html.count('class="card mb-4"'), 1)
+
+        html = self.client.get(reverse('inbox'), {'salary': ['fits', 'unknown']}).content.decode()
+        self.assertEqual(html.count('class="card mb-4"'), 2)
+        self.assertIn(f'id="thread-{self.upper.id}"', html)
+
+    def test_json_api(self):
+        data = self.client.get(reverse('inbox_facets')).json()
+        self.assertEqual(data['country'], {'UKR': 2, 'POL': 1})
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        self.job = make_job(self.recruiter)
+
+    def counter(self, job=None):
+        return InboxCounter.objects.get(recruiter=self.recruiter, job=job)
+
+    def test_thread_lifecycle(self):
+        thread = make_thread(self.recruiter, make_candidate(), self.job)
+        make_message(thread, action='apply')
+        self.assertEqual((self.counter().unread, self.counter().bucket_inbox), (1, 1))
+        self.assertEqual(self.counter(self.job).new_applications, 1)
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.unread_count, self.job.applications_count), (1, 1))
+
+        thread = MessageThread.objects.get(id=thread.id)
+        thread.last_seen_recruiter = timezone.now()
+        thread.save()
+        self.assertEqual(self.counter().unread, 0)
+
+        thread.bucket = Bucket.ARCHIVE.value
+        thread.save()
+        counter = self.counter(self.job)
+        self.assertEqual((counter.bucket_inbox, counter.bucket_archive), (0, 1))
+
+    def test_unsaved_changes_are_not_counted_twice(self):
+        thread = make_thread(self.recruiter, make_candidate(), self.job)
+        thread.save()
+        thread.save()
+        self.assertEqual(self.counter().bucket_inbox, 1)
+
+    def test_reconcile_repairs_drift(self):
+        thread = make_thread(self.recruiter, make_candidate(), self.job)
+        make_thread(self.recruiter, make_candidate(), None, last_sender='recruiter')
+        make_message(thread, action='apply')
+        MessageThread.objects.filter(id=thread.id).update(bucket=Bucket.SHORTLIST.value)
+        InboxCounter.objects.filter(job=None).update(applications_today=7)
+
+        self.assertEqual(reconcile_counters(), 2)
+        counter = self.counter()
+        self.assertEqual(
+            (counter.unread, counter.bucket_inbox, counter.bucket_shortlist, counter.new_applications),
+            (1, 1, 1, 1),
+        )
+        self.assertEqual(self.counter(self.job).bucket_shortlist, 1)
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_inbox_badge(self):
+        make_thread(self.recruiter, make_candidate(), self.job)
+        self.assertContains(self.client.get(reverse('inbox')), "1 unread")
+
+
+class BulkActionTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        jobs = [make_job(self.recruiter), make_job(self.recruiter)]
+        self.threads = [make_thread(self.recruiter, make_candidate(), jobs[i % 2]) for i in range(5)]
+        for thread in self.threads:
+            make_message(thread, action='apply')
+
+    def post(self, action, **params):
+        return self.client.post(reverse('inbox_bulk'), {'action': action, **params})
+
+    def test_archive_selected(self):
+        ids = [t.id for t in self.threads]
+        # Queries grow with the number of jobs touched, not of threads
+        with CaptureQueriesContext(connection) as two:
+            self.assertEqual(self.post('archive', ids=ids[:2]).json(), {'updated': 2})
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.post('archive', ids=ids).json(), {'updated': 3})
+        self.assertEqual(len(many), len(two))
+
+        archived = MessageThread.objects.filter(id__in=ids).select_related('last_message')
+        self.assertEqual({t.bucket for t in archived}, {Bucket.ARCHIVE.value})
+        self.assertEqual({t.last_message.action for t in archived}, {'archive'})
+        self.assertEqual(Message.objects.filter(action='archive').count(), 5)
+        counter = InboxCounter.objects.get(recruiter=self.recruiter, job=None)
+        self.assertEqual((counter.unread, counter.bucket_inbox, counter.bucket_archive), (0, 0, 5))
+        self.assertEqual(reconcile_counters(), 0)
+
+        self.assertEqual(self.post('archive', ids=ids).json(), {'updated': 0})
+
+    def test_filter_selection(self):
+        MessageThread.objects.filter(id=self.threads[0].id).update(bucket=Bucket.SHORTLIST.value)
+        reconcile_counters()
+        self.assertEqual(self.post('read', select='all', bucket='inbox').json(), {'updated': 4})
+        self.assertEqual(InboxCounter.objects.get(recruiter=self.recruiter, job=None).unread, 1)
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_search_selection_is_not_capped(self):
+        job = self.threads[0].job
+        threads = MessageThread.objects.bulk_create([
+            MessageThread(
+                recruiter=self.recruiter, candidate=make_candidate(), job=job,
+                last_updated=timezone.now(), last_sender='candidate', first_message='apply',
+            )
+            for _ in range(SEARCH_LIMIT + 5)
+        ])
+        Message.objects.bulk_create([
+            Message(
+                thread=t, recruiter=self.recruiter, candidate_id=t.candidate_id, job=job,
+                sender=Message.Sender.CANDIDATE, body="Kubernetes", created=timezone.now(),
+            )
+            for t in threads
+        ])
+        response = self.post('favorite', select='all', q="kubernetes")
+        self.assertEqual(response.json(), {'updated': SEARCH_LIMIT + 5})
+
+    def test_favorite(self):
+        ids = [t.id for t in self.threads[:2]]
+        self.assertEqual(self.post('favorite', ids=ids).json(), {'updated': 2})
+        self.assertEqual(self.post('favorite', ids=ids).json(), {'updated': 0})
+        self.assertEqual(facet_counts(RECRUITER_ID)['favorite']['yes'], 2)
+        self.assertEqual(self.post('unfavorite', ids=ids).json(), {'updated': 2})
+
+    def test_bad_requests(self):
+        self.assertEqual(self.post('delete', ids=[self.threads[0].id]).status_code, 400)
+        self.assertEqual(self.post('archive', ids=['x']).status_code, 400)
+        self.assertEqual(self.client.get(reverse('inbox_bulk')).status_code, 405)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        self.python = make_job(self.recruiter)
+        self.go = make_job(self.recruiter, position="Go Developer", primary_keyword="Go")
+        self.first = make_thread(
+            self.recruiter, make_candidate(name="Ann"), self.python, match_score=80, is_anonymous=False
+        )
+        self.second = make_thread(
+            self.recruiter, make_candidate(name="Bob", english_level='fluent'), self.go, is_anonymous=False
+        )
+        make_thread(make_recruiter(), make_candidate(), self.python)
+
+    def export(self, **params):
+        response = self.client.get(reverse('inbox_export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="inbox-', response['Content-Disposition'])
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual([int(row['thread_id']) for row in rows], [self.first.id, self.second.id])
+        self.assertEqual(rows[0]['name'], "Ann")
+        self.assertEqual(rows[0]['job'], "Senior Python Developer")
+        self.assertEqual(rows[0]['match_score'], '80')
+        self.assertEqual(rows[0]['skills'], "Django, PostgreSQL, Docker")
+
+    def test_jsonl(self):
+        response, content = self.export(format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['name'] for row in rows], ["Ann", "Bob"])
+        self.assertEqual(rows[1]['job_id'], self.go.id)
+
+    def test_filters(self):
+        _, content = self.export(format='jsonl', job=self.go.id)
+        self.assertEqual([json.loads(line)['name'] for line in content.splitlines()], ["Bob"])
+        _, content = self.export(format='jsonl', english='fluent', job=[self.python.id, self.go.id])
+        self.assertEqual([json.loads(line)['name'] for line in content.splitlines()], ["Bob"])
+
+    def test_anonymous_thread(self):
+        make_thread(self.recruiter, make_candidate(name="Carol", position="Go Developer"), self.go)
+        _, content = self.export(format='jsonl', job=self.go.id)
+        bob, anonymous = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual((bob['name'], anonymous['name']), ("Bob", ""))
+        self.assertEqual(anonymous['candidate_id'], None)
+        self.assertEqual(anonymous['position'], "Go Developer")
+        _, content = self.export()
+        self.assertNotIn("Carol", content)
+
+    def test_invalid(self):
+        self.assertEqual(self.client.get(reverse('inbox_export'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('inbox_export'), {'job': 'x'}).status_code, 400)
+
+    def test_streams_in_chunks_from_one_query(self):
+        with mock.patch.object(export, 'FLUSH_ROWS', 1), CaptureQueriesContext(connection) as queries:
+            chunks = export.export_lines(export.export_threads(RECRUITER_ID), 'jsonl', chunk_size=1)
+            self.assertIn('"Ann"', next(chunks))
+            self.assertIn('"Bob"', next(chunks))
+            self.assertEqual(list(chunks), [])
+        self.assertEqual(len(queries), 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_inbox', recruiter=RECRUITER_ID, job=[self.python.id], stdout=out)
+        rows = list(csv.DictReader(out.getvalue().splitlines()))
+        self.assertEqual([row['name'] for row in rows], ["Ann"])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        job = make_job(self.recruiter)
+        self.by_message = make_thread(self.recruiter, make_candidate(), job)
+        make_message(self.by_message, body="We run everything on Kubernetes, are you ready to relocate?")
+        self.by_profile = make_thread(
+            self.recruiter, make_candidate(position="Kubernetes engineer", moreinfo="Relocating to Lisbon"), job,
+        )
+        other = make_thread(make_recruiter(), make_candidate(), None)
+        make_message(other, body="kubernetes")
+
+    def test_benchmark_command(self):
+        threads = MessageThread.objects.count()
+        out = StringIO()
+        call_command('bench_search', messages=100, recruiters=2, samples=1, query=["python"], stdout=out)
+        self.assertIn("Synthetic rows rolled back", out.getvalue())
+        self.assertEqual(MessageThread.objects.count(), threads)
+
+    def test_messages_and_profiles(self):
+        hits = search_thread_ids(self.recruiter.id, "kubernetes")
+        # Profile position is weighted above message text
+        self.assertEqual([thread_id for thread_id, _ in hits], [self.by_profile.id, self.by_message.id])
+
+    def test_stemming_and_operators(self):
+        self.assertEqual(len(search_thread_ids(self.recruiter.id, "relocation")), 2)
+        self.assertEqual(
+            [t for t, _ in search_thread_ids(self.recruiter.id, "relocate -lisbon")], [self.by_message.id]
+        )
+        self.assertEqual(search_thread_ids(self.recruiter.id, "   "), [])
+
+    def test_filters_apply_before_limit(self):
+        MessageThread.objects.filter(id=self.by_profile.id).update(bucket=Bucket.ARCHIVE.value)
+        inbox = MessageThread.objects.filter(bucket=Bucket.INBOX.value)
+        self.assertEqual(search_threads(inbox, self.recruiter.id, "kubernetes", limit=1), [self.by_message])
+
+    def test_inbox_search(self):
+        html = self.client.get(reverse('inbox'), {'q': "lisbon"}).content.decode()
+        self.assertEqual(html.count('class="card mb-4"'), 1)
+        self.assertIn(f'id="thread-{self.by_profile.id}"', html)
+
+
+class ThreadViewTests(TestCase):
+    def setUp(self):
+        recruiter = make_recruiter(id=RECRUITER_ID)
+        job = make_job(recruiter)
+        self.thread = make_thread(recruiter, make_candidate(), job)
+        start = timezone.now() - timedelta(days=1)
+        for i in range(7):
+            make_message(self.thread, body=f"message {i}", job=job, created=start + timedelta(minutes=i // 2))
+
+    def bodies(self, html):
+        return [int(b.split('<', 1)[0]) for b in html.split('message ')[1:]]
+
+    def test_latest_page_then_older_history(self):
+        with mock.patch.object(views, 'THREAD_PAGE_SIZE', 3):
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(reverse('inbox_thread', args=[self.thread.id])).content.decode()
+            self.assertEqual(self.bodies(page), [4, 5, 6])
+            self.assertEqual(len(queries), 2)
+
+            seen = []
+            while 'data-older="' in page:
+                older_url = page.split('data-older="', 1)[1].split('"', 1)[0].replace('&amp;', '&')
+                page = self.client.get(older_url).content.decode()
+                self.assertNotIn('<html', page)
+                seen = self.bodies(page) + seen
+            self.assertEqual(seen, [0, 1, 2, 3])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('inbox_thread', args=[self.thread.id]), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_thread(self):
+        for name in ('inbox_thread', 'inbox_thread_async'):
+            self.assertEqual(self.client.get(reverse(name, args=[999999999])).status_code, 404)
+            self.assertEqual(self.client.get(reverse(name, args=[1]).replace('/1/', '/abc/')).status_code, 404)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate(self):
+        recruiter = make_recruiter(id=RECRUITER_ID)
+        created = generate(300, recruiters=4, per_thread=5, batch_size=50, seed=1, include=[recruiter])
+        now = timezone.now()
+        self.assertEqual(created['messages'], 300)
+        self.assertEqual(Message.objects.count(), 300)
+        self.assertEqual(MessageThread.objects.count(), created['threads'])
+        self.assertFalse(Message.objects.filter(created__gt=now).exists())
+        self.assertFalse(MessageThread.objects.filter(last_updated__gt=now).exists())
+
+        # Denormalized fields match what the save signals would have produced
+        for thread in MessageThread.objects.all():
+            self.assertEqual(thread.last_message, thread.message_set.order_by('-created', '-id').first())
+        self.assertEqual(reconcile_counters(), 0)
+        self.assertTrue(Candidate.skills.through.objects.exists())
+        self.assertTrue(MessageThread.objects.filter(match_score__gt=0).exists())
+
+    def test_generate_twice_with_same_seed(self):
+        generate(20, recruiters=2, seed=1)
+        generate(20, recruiters=2, seed=1)
+        self.assertEqual(Recruiter.objects.count(), 4)
+        self.assertEqual(Message.objects.count(), 40)
+
+
+class IndexPlanTests(TestCase):
+    """The inbox queries are served by index range scans, without a sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recruiter = make_recruiter(id=RECRUITER_ID)
+        generate(2000, recruiters=5, per_thread=10, batch_size=500, seed=1, include=[cls.recruiter])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE sandbox_messagethread, sandbox_message")
+
+    # The test data is small enough for scanning and sorting to be cheaper
+    PLANNER_OFF = ('enable_seqscan', 'enable_bitmapscan')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            for setting in self.PLANNER_OFF:
+                cursor.execute(f"SET {setting} = off")
+        self.addCleanup(self.reset)
+
+    def reset(self):
+        with connection.cursor() as cursor:
+            for setting in self.PLANNER_OFF:
+                cursor.execute(f"RESET {setting}")
+
+    def assertPlan(self, queryset, index, scan="Index Scan"):
+        plan = queryset.explain()
+        self.assertRegex(plan, f"{scan} using {index}")
+        # Merging sorted partitions lists a "Sort Key", a sort node would be "Sort  (cost"
+        self.assertNotRegex(plan, r"\bSort  \(")
+        self.assertNotIn("Seq Scan", plan)
+        return plan
+
+    def test_bucket(self):
+        threads = MessageThread.objects.filter(recruiter_id=RECRUITER_ID, bucket=Bucket.INBOX.value)
+        self.assertPlan(threads.order_by('-last_updated', '-id')[:50], 'thread_recruiter_bucket_idx')
+        self.assertPlan(threads.values('id'), 'thread_recruiter_bucket_idx', scan="Index Only Scan")
+
+    def test_favorites(self):
+        threads = MessageThread.objects.filter(recruiter_id=RECRUITER_ID, recruiter_favorite=True)
+        self.assertPlan(threads.order_by('-last_updated', '-id')[:50], 'thread_recruiter_favorite_idx')
+
+    def test_thread_history(self):
+        thread = MessageThread.objects.filter(recruiter_id=RECRUITER_ID).first()
+        messages = Message.objects.filter(thread_id=thread.id).order_by('-created', '-id')[:30]
+        plan = self.assertPlan(messages, 'legacy_message_thread_created_idx', scan="Index Scan Backward")
+        # The monthly partitions are read through their copies of the thread index
+        scanned = set(re.findall(r"Index Scan Backward using \w+_thread_id_created_id_idx on (\w+)", plan))
+        self.assertEqual(scanned, {p.name for p in partitions.partitions()} - {'sandbox_message_legacy'} | {partitions.DEFAULT})
+
+
+class PartitionTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        self.thread = make_thread(self.recruiter, make_candidate(), make_job(self.recruiter))
+        self.month = partitions.month_start(timezone.now())
+
+    def partition_of(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM sandbox_message WHERE id = %s", [message.id])
+            return cursor.fetchone()[0]
+
+    def test_messages_go_to_their_month(self):
+        current = make_message(self.thread)
+        old = make_message(self.thread, created=partitions.months_before(self.month, 2))
+        later = self.month.replace(year=self.month.year + 2)
+        future = make_message(self.thread, created=later + timedelta(days=3))
+        self.assertEqual(self.partition_of(current), partitions.partition_name(self.month))
+        self.assertEqual(self.partition_of(old), 'sandbox_message_legacy')
+        self.assertEqual(self.partition_of(future), partitions.DEFAULT)
+
+        self.assertEqual(partitions.ensure_partitions(now=later, months_ahead=0), [partitions.partition_name(later)])
+        self.assertEqual(self.partition_of(future), partitions.partition_name(later))
+        self.assertEqual(partitions.ensure_partitions(now=later, months_ahead=0), [])
+
+    def test_archived_history(self):
+        old = partitions.months_before(self.month, 1)
+        for i in range(3):
+            make_message(self.thread, body=f"old {i}", created=old + timedelta(days=i))
+        make_message(self.thread, body="recent", created=timezone.now())
+        # Run the deferred foreign key checks of the inserts, as a commit would
+        connection.check_constraints()
+
+        archived = partitions.archive_partitions(self.month)
+        self.assertEqual([p.name for p in archived], ['sandbox_message_legacy'])
+        self.assertEqual(partitions.partitions(partitions.ARCHIVE), archived)
+        self.assertEqual(list(Message.objects.values_list('body', flat=True)), ["recent"])
+        self.assertEqual(ArchivedMessage.objects.count(), 3)
+
+        url = reverse('inbox_thread', args=[self.thread.id])
+        with mock.patch.object(views, 'THREAD_PAGE_SIZE', 2):
+            page = self.client.get(url).content.decode()
+            self.assertIn("recent", page)
+            self.assertIn("Load archived messages", page)
+            older_url = page.split('data-older="', 1)[1].split('"', 1)[0].replace('&amp;', '&')
+            page = self.client.get(older_url).content.decode()
+            self.assertEqual(re.findall(r"old \d", page), ["old 1", "old 2"])
+            older_url = page.split('data-older="', 1)[1].split('"', 1)[0].replace('&amp;', '&')
+            self.assertIn("archived=1", older_url)
+            page = self.client.get(older_url).content.decode()
+            self.assertEqual(re.findall(r"old \d", page), ["old 0"])
+            self.assertNotIn('data-older="', page)
+
+        other = make_thread(self.recruiter, make_candidate())
+        make_message(other)
+        self.assertNotIn('data-older="', self.client.get(reverse('inbox_thread', args=[other.id])).content.decode())
+
+    def test_legacy_history_split_before_archiving(self):
+        last_month = partitions.months_before(self.month, 1)
+        older = make_message(self.thread, body="older", created=partitions.months_before(self.month, 2))
+        recent = make_message(self.thread, body="recent", created=last_month + timedelta(days=1))
+        connection.check_constraints()
+
+        archived = partitions.archive_partitions(last_month)
+        self.assertEqual([p.name for p in archived], ['sandbox_message_legacy'])
+        self.assertEqual(self.partition_of(recent), partitions.partition_name(last_month))
+        self.assertEqual(list(ArchivedMessage.objects.values_list('id', flat=True)), [older.id])
+        self.assertEqual(list(Message.objects.values_list('id', flat=True)), [recent.id])
+
+        archived = partitions.archive_partitions(self.month)
+        self.assertEqual([p.name for p in archived], [partitions.partition_name(last_month)])
+        self.assertEqual(ArchivedMessage.objects.count(), 2)
+
+    def test_counters_include_archived_messages(self):
+        make_message(self.thread, action=Action.APPLY, created=partitions.months_before(self.month, 2))
+        make_message(self.thread, action=Action.POKE, created=timezone.now())
+        connection.check_constraints()
+        reconcile_counters()
+
+        partitions.archive_partitions(self.month, cluster=False)
+        self.assertEqual(reconcile_counters(), 0)
+        job = JobPosting.objects.get(id=self.thread.job_id)
+        self.assertEqual((job.applications_count, job.sent_count), (1, 1))
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        reset_fragment_cache()
+        self.addCleanup(reset_fragment_cache)
+        recruiter = make_recruiter(id=RECRUITER_ID)
+        job = make_job(recruiter)
+        self.threads = [make_thread(recruiter, make_candidate(), job) for _ in range(3)]
+
+    def test_only_changed_cards_are_rendered(self):
+        first = self.client.get(reverse('inbox')).content.decode()
+        self.assertEqual(fragment_stats()['misses'], 3)
+
+        thread = self.threads[0]
+        thread.last_updated = timezone.now()
+        thread.save()
+        candidate = self.threads[1].candidate
+        candidate.position = "Go Developer"
+        candidate.save()
+
+        second = self.client.get(reverse('inbox')).content.decode()
+        stats = fragment_stats()
+        self.assertEqual((stats['misses'], stats['lru_hits']), (5, 1))
+        self.assertNotIn("Go Developer", first)
+        self.assertIn("Go Developer", second)
+        self.assertEqual(second.count('class="card mb-4"'), 3)
+
+    def test_job_and_message_edits_change_cards(self):
+        message = make_message(self.threads[0], body="Hello")
+        self.client.get(reverse('inbox'))
+        job = self.threads[1].job
+        job.position = "Staff Python Developer"
+        job.save()
+        Message.objects.filter(id=message.id).update(body="Hello again", edited=timezone.now())
+
+        html = self.client.get(reverse('inbox')).content.decode()
+        self.assertEqual(fragment_stats()['lru_hits'], 0)
+        self.assertIn("Staff Python Developer", html)
+        self.assertIn("Hello again", html)
+
+    def test_shared_tier_behind_lru(self):
+        self.client.get(reverse('inbox'))
+        with mock.patch('sandbox.fragments._lru', fragments.LRU(10)):
+            self.client.get(reverse('inbox'))
+        self.assertEqual(fragment_stats()['shared_hits'], 3)
+        self.assertEqual(self.client.get(reverse('inbox_cache_stats')).json()['misses'], 3)
+
+
+class AsyncViewTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        # Worker thread connections must not outlive the test database
+        for alias in self.databases:
+            patcher = mock.patch.dict(connections[alias].settings_dict, CONN_MAX_AGE=0)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        reset_fragment_cache()
+        self.addCleanup(reset_fragment_cache)
+
+        recruiter = make_recruiter(id=RECRUITER_ID)
+        job = make_job(recruiter)
+        self.threads = [make_thread(recruiter, make_candidate(), job) for _ in range(4)]
+        for i in range(5):
+            make_message(self.threads[0], body=f"message {i}", created=timezone.now() - timedelta(minutes=i))
+
+    def items(self, html):
+        """Thread card ids and message bodies in page order."""
+        return re.findall(r'id="thread-\d+"|message \d', html)
+
+    def test_same_pages_as_sync_views(self):
+        pages = [
+            ('inbox', 'inbox_async', [], {}),
+            ('inbox', 'inbox_async', [], {'sort': 'score', 'partial': '1'}),
+            ('inbox_thread', 'inbox_thread_async', [self.threads[0].id], {}),
+        ]
+        for sync_name, async_name, args, params in pages:
+            with self.subTest(view=async_name, params=params):
+                expected = self.client.get(reverse(sync_name, args=args), params).content.decode()
+                response = self.client.get(reverse(async_name, args=args), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.items(response.content.decode()), self.items(expected))
+                self.assertTrue(self.items(expected))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('inbox_async'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class InboxChangesTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        self.job = make_job(self.recruiter)
+        self.old = make_thread(self.recruiter, make_candidate(), self.job, last_updated=timezone.now() - timedelta(hours=1))
+
+    def changes(self, since):
+        response = self.client.get(reverse('inbox_changes'), {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_since_watermark(self):
+        html = self.client.get(reverse('inbox')).content.decode()
+        since = re.search(r'data-since="([^"]+)"', html).group(1)
+        self.assertEqual(self.changes(since), {'cards': [], 'watermark': since, 'more': False})
+
+        later = timezone.now() + timedelta(seconds=1)
+        new = make_thread(self.recruiter, make_candidate(), self.job, last_updated=later)
+        make_message(self.old, created=later + timedelta(seconds=1))
+        with mock.patch.object(views, 'CHANGES_LIMIT', 1):
+            data = self.changes(since)
+            self.assertEqual(([c['id'] for c in data['cards']], data['more']), ([new.id], True))
+            self.assertIn(f'id="thread-{new.id}"', data['cards'][0]['html'])
+            data = self.changes(data['watermark'])
+            self.assertEqual(([c['id'] for c in data['cards']], data['more']), ([self.old.id], False))
+        # The last watermark stays CHANGES_OVERLAP back, recent threads come again
+        self.assertEqual([c['id'] for c in self.changes(data['watermark'])['cards']], [new.id, self.old.id])
+
+    def test_thread_committed_after_render(self):
+        recent = make_thread(self.recruiter, make_candidate(), self.job)
+        html = self.client.get(reverse('inbox')).content.decode()
+        since = re.search(r'data-since="([^"]+)"', html).group(1)
+        # Stamped before the page was rendered, committed after it
+        late = make_thread(
+            self.recruiter, make_candidate(), self.job, last_updated=recent.last_updated - timedelta(seconds=5)
+        )
+        self.assertEqual([c['id'] for c in self.changes(since)['cards']], [late.id, recent.id])
+
+    def test_new_message_and_bulk_action_appear(self):
+        since = views._changes_watermark()
+        make_message(self.old, body="Any news?")
+        data = self.changes(since)
+        self.assertEqual([c['id'] for c in data['cards']], [self.old.id])
+        self.assertIn("Any news?", data['cards'][0]['html'])
+
+        other = make_thread(self.recruiter, make_candidate(), self.job, last_updated=timezone.now() - timedelta(days=1))
+        since = data['watermark']
+        self.client.post(reverse('inbox_bulk'), {'action': 'shortlist', 'ids': [other.id]})
+        self.assertEqual([c['id'] for c in self.changes(since)['cards']], [self.old.id, other.id])
+        # The candidate's message is unread, the shortlisted thread was answered by the action
+        counter = recruiter_counter(RECRUITER_ID)
+        self.assertEqual((counter.unread, counter.bucket_inbox, counter.bucket_shortlist), (1, 1, 1))
+
+    def test_live_updates_only_on_recent_unfiltered_inbox(self):
+        self.assertNotContains(self.client.get(reverse('inbox'), {'sort': 'score'}), 'data-since')
+        self.assertNotContains(self.client.get(reverse('inbox'), {'english': 'upper'}), 'data-since')
+
+    def test_invalid_watermark(self):
+        self.assertEqual(self.client.get(reverse('inbox_changes'), {'since': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('inbox_changes')).status_code, 400)
+
+
+class InboxEventsTests(TransactionTestCase):
+    def setUp(self):
+        recruiter = make_recruiter(id=RECRUITER_ID)
+        self.thread = make_thread(recruiter, make_candidate())
+        self.other = make_thread(make_recruiter(), make_candidate())
+
+        source = events.listener()
+        self.addCleanup(events.stop_listener)
+        source.subscribe(events.Subscription(0))
+        self.assertTrue(source.connected.wait(5))
+
+    def test_listener_wakes_recruiter_subscribers(self):
+        mine = events.listener().subscribe(events.Subscription(RECRUITER_ID))
+        other = events.listener().subscribe(events.Subscription(self.other.recruiter_id))
+        Message.objects.bulk_create([
+            Message(thread=self.thread, recruiter_id=RECRUITER_ID, candidate_id=self.thread.candidate_id,
+                    sender='candidate', created=timezone.now())
+            for _ in range(3)
+        ])
+        self.assertTrue(mine.wait(5))
+        self.assertFalse(other.wait(0.2))
+        self.assertFalse(mine.wait(0.2))
+
+    def test_sync_stream(self):
+        response = self.client.get(reverse('inbox_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), events.RETRY)
+        make_message(self.thread)
+        self.assertEqual(next(stream), events.format_event('changed', {}))
+        response.close()
+
+    def test_asgi_stream(self):
+        def insert():
+            make_message(self.thread)
+            connections.close_all()
+
+        async def scenario():
+            disconnect = asyncio.Event()
+            bodies = []
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] != 'http.response.body':
+                    return
+                bodies.append(message['body'])
+                if message['body'] == events.RETRY:
+                    await asyncio.get_running_loop().run_in_executor(None, insert)
+                else:
+                    disconnect.set()
+
+            app = events.EventStreamApp(None, '/inbox/events/', RECRUITER_ID)
+            await asyncio.wait_for(app({'type': 'http', 'path': '/inbox/events/'}, receive, send), 10)
+            return bodies
+
+        self.assertEqual(asyncio.run(scenario()), [events.RETRY, events.format_event('changed', {})])
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        recruiter = make_recruiter(id=RECRUITER_ID)
+        self.thread = make_thread(recruiter, make_candidate(), make_job(recruiter))
+
+    def test_router(self):
+        self.assertEqual(Recruiter.objects.all().db, 'default')
+        with routing.reading_from_replica():
+            self.assertEqual(Recruiter.objects.all().db, 'replica')
+            self.assertEqual(Recruiter.objects.get(id=RECRUITER_ID)._state.db, 'replica')
+            with transaction.atomic():
+                self.assertEqual(Recruiter.objects.all().db, 'default')
+            make_candidate()
+            # Read your writes for the rest of the request
+            self.assertEqual(Recruiter.objects.all().db, 'default')
+
+    def test_inbox_reads_replica_until_pinned(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.client.get(reverse('inbox')).status_code, 200)
+        self.assertEqual(len(primary), 0)
+        self.assertGreater(len(replica), 0)
+
+        response = self.client.post(reverse('inbox_bulk'), {'action': 'archive', 'ids': [self.thread.id]})
+        self.assertIn(routing.PIN_COOKIE, response.cookies)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.client.get(reverse('inbox_thread', args=[self.thread.id]))
+        self.assertEqual(len(replica), 0)
+
+    def test_async_middleware(self):
+        @routing.replica_reads
+        async def view(request):
+            await asyncio.sleep(0)
+            if 'write' in request.GET:
+                routing.ReplicaRouter().db_for_write(Recruiter)
+            return HttpResponse(Recruiter.objects.all().db)
+
+        middleware = routing.ReplicaPinningMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        factory = RequestFactory()
+        self.assertEqual(asyncio.run(middleware(factory.get('/'))).content, b'replica')
+
+        response = asyncio.run(middleware(factory.get('/', {'write': 1})))
+        self.assertIn(routing.PIN_COOKIE, response.cookies)
+        factory.cookies[routing.PIN_COOKIE] = '1'
+        self.assertEqual(asyncio.run(middleware(factory.get('/'))).content, b'default')
+
+    def test_dead_idle_connection_closed(self):
+        Recruiter.objects.exists()
+        routing.release_connections()
+        connection.released_at -= settings.CONN_HEALTH_CHECK_IDLE
+        with mock.patch.object(connection, 'is_usable', return_value=False):
+            routing.check_connections()
+        self.assertIsNone(connection.connection)
+        self.assertTrue(Recruiter.objects.exists())
+
+
+class RescoringTests(TestCase):
+    def setUp(self):
+        recruiter = make_recruiter()
+        self.job = make_job(recruiter)
+        self.candidate = make_candidate()
+        self.thread = make_thread(recruiter, self.candidate, self.job)
+        self.other = make_thread(recruiter, make_candidate(), self.job)
+        score_threads(MessageThread.objects.all())
+
+    def score(self, thread):
+        thread.refresh_from_db()
+        return thread.match_score
+
+    def test_candidate_edits_coalesce(self):
+        self.candidate.salary_min = 8000
+        self.candidate.save()
+        self.candidate.english_level = 'basic'
+        self.candidate.save()
+        self.candidate.position = "Unrelated"
+        self.candidate.save(update_fields=['position'])
+        self.assertEqual(rescore_status()['pending'], 1)
+
+        batch = process_batch()
+        self.assertEqual((batch.requests, batch.changed), (1, 1))
+        self.assertGreaterEqual(batch.lag, 0)
+        self.assertEqual(self.score(self.thread), compute_score(self.candidate, self.job))
+        self.assertEqual(rescore_status(), {'pending': 0, 'lag': 0.0})
+
+    def test_job_edit_rescores_all_threads(self):
+        before = self.score(self.other)
+        self.job.english_level = 'fluent'
+        self.job.save(update_fields=['english_level'])
+        self.job.position = "Renamed"
+        self.job.save(update_fields=['position'])
+
+        batch = process_batch()
+        self.assertEqual((batch.requests, batch.changed), (1, 2))
+        self.assertLess(self.score(self.other), before)
+        self.assertIsNone(process_batch().lag)
+
+    def test_new_thread_is_scored(self):
+        thread = make_thread(self.job.recruiter, make_candidate(english_level='basic'), self.job)
+        self.assertEqual(self.score(thread), compute_score(thread.candidate, self.job))
+        self.assertGreater(thread.match_score, 0)
+        self.assertEqual(self.score(make_thread(self.job.recruiter, make_candidate(), None)), 0)
+
+    def test_update_fields_edit_with_feature_store(self):
+        Candidate.objects.update(last_modified=timezone.now() - timedelta(hours=1))
+        features = CandidateFeatureStore()
+        process_batch(features=features)
+        features.columns_for([self.candidate.id])
+        self.candidate.salary_min = 8000
+        self.candidate.save(update_fields=['salary_min'])
+
+        self.assertEqual(process_batch(features=features).changed, 1)
+        self.assertEqual(self.score(self.thread), compute_score(self.candidate, self.job))
+
+    def test_edit_during_batch_is_kept(self):
+        self.candidate.salary_min = 8000
+        self.candidate.save()
+
+        def edit_while_scoring(*args, **kwargs):
+            changed = rescore_job(*args, **kwargs)
+            Candidate.objects.get(id=self.candidate.id).save(update_fields=['english_level'])
+            return changed
+
+        with mock.patch('sandbox.rescoring.rescore_job', side_effect=edit_while_scoring):
+            self.assertEqual(process_batch().requests, 1)
+        self.assertEqual(rescore_status()['pending'], 1)
+        self.assertEqual(process_batch().requests, 1)
+        self.assertEqual(rescore_status()['pending'], 0)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(name="Olena")
+        self.job = make_job(self.recruiter)
+        self.ann = make_candidate(name="Ann", email="ann@example.com")
+        self.thread = make_thread(self.recruiter, self.ann, self.job, is_anonymous=False)
+
+    def test_digest_per_recipient(self):
+        other = make_thread(self.recruiter, make_candidate(position="Go Developer"), self.job)
+        make_message(self.thread, body="Hi")
+        make_message(self.thread, body="Still there?")
+        make_message(other, body="Hello")
+        make_message(self.thread, sender=Message.Sender.RECRUITER, body="Sure")
+
+        # Three claims, the thread details and one UPDATE, within a savepoint
+        with self.assertNumQueries(7):
+            batch = dispatch_batch()
+        self.assertEqual(batch, (4, 0, 2, 0, 0))
+        recruiter_mail, candidate_mail = sorted(mail.outbox, key=lambda m: m.to != [self.recruiter.email])
+        self.assertEqual(recruiter_mail.subject, "News in 2 conversations")
+        self.assertIn("Ann about Senior Python Developer: Still there? (+1 more)", recruiter_mail.body)
+        # Anonymous candidates go by their position
+        self.assertIn("Go Developer about Senior Python Developer: Hello", recruiter_mail.body)
+        self.assertEqual(candidate_mail.to, ["ann@example.com"])
+        self.assertEqual(candidate_mail.body, "Olena about Senior Python Developer: Sure")
+
+        self.assertFalse(Message.objects.filter(notified__isnull=True).exists())
+        self.assertEqual(dispatch_batch(), (0, 0, 0, 0, 0))
+
+    def test_silent_and_old_messages(self):
+        make_message(self.thread, sender=Message.Sender.RECRUITER, action=Action.SHORTLIST)
+        old = make_message(self.thread, created=timezone.now() - NOTIFY_WITHIN - timedelta(hours=1))
+        self.assertEqual(notification_status(), {'messages': 1, 'notices': 0})
+
+        self.assertEqual(dispatch_batch(), (1, 0, 0, 0, 1))
+        self.assertEqual(mail.outbox, [])
+        # Marked without a notification, so it leaves the pending index
+        old.refresh_from_db()
+        self.assertIsNotNone(old.notified)
+        self.assertEqual(dispatch_batch(), (0, 0, 0, 0, 0))
+
+    def test_not_interested_notice(self):
+        call = make_thread(self.recruiter, make_candidate(), None, bucket=Bucket.NOTINTERESTED.value)
+        batch = dispatch_batch()
+        self.assertEqual((batch.notices, batch.digests), (1, 1))
+        self.assertEqual(mail.outbox[0].body, "Olena is not interested in your profile")
+        call.refresh_from_db()
+        self.assertIsNotNone(call.notified_notinterested)
+        self.assertEqual(dispatch_batch().notices, 0)
+
+    def test_batches_share_connection(self):
+        for _ in range(3):
+            make_message(self.thread)
+        connection = mail.get_connection()
+        with mock.patch.object(connection, 'send_messages', wraps=connection.send_messages) as send:
+            self.assertEqual(dispatch_batch(2, connection).messages, 2)
+            self.assertEqual(dispatch_batch(2, connection).messages, 1)
+        self.assertEqual(send.call_count, 2)
+
+    def test_refused_recipient_is_dropped(self):
+        make_message(self.thread)
+        connection = mail.get_connection()
+        refused = smtplib.SMTPRecipientsRefused({self.recruiter.email: (550, b"No such user")})
+        with self.assertLogs('sandbox.notifications', 'WARNING'), \
+                mock.patch.object(connection, 'send_messages', side_effect=refused):
+            self.assertEqual(dispatch_batch(connection=connection).refused, 1)
+        self.assertEqual(notification_status()['messages'], 0)
+
+    def test_send_failure_keeps_pending(self):
+        make_message(self.thread)
+        connection = mail.get_connection()
+        for error in (smtplib.SMTPServerDisconnected(), smtplib.SMTPDataError(451, b"Try again later")):
+            with mock.patch.object(connection, 'send_messages', side_effect=error):
+                with self.assertRaises(type(error)):
+                    dispatch_batch(connection=connection)
+            self.assertEqual(notification_status()['messages'], 1)
+
+        rejected = smtplib.SMTPDataError(554, b"Message rejected")
+        with self.assertLogs('sandbox.notifications', 'WARNING'), \
+                mock.patch.object(connection, 'send_messages', side_effect=rejected):
+            self.assertEqual(dispatch_batch(connection=connection).refused, 1)
+        self.assertEqual(notification_status()['messages'], 0)
+
+    def test_worker_backs_off_on_errors(self):
+        class Stop(Exception):
+            pass
+
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 4:
+                raise Stop
+
+        command = 'sandbox.management.commands.send_notifications'
+        batches = [smtplib.SMTPAuthenticationError(535, b"Bad credentials"), TimeoutError(), TimeoutError(),
+                   DispatchBatch(0, 0, 0, 0, 0)]
+        with mock.patch(f'{command}.dispatch_batch', side_effect=batches), \
+                mock.patch(f'{command}.time.sleep', side_effect=sleep), self.assertRaises(Stop):
+            call_command('send_notifications', interval=2, stdout=StringIO(), stderr=StringIO())
+        # Doubled after each failure, the idle interval again after a success
+        self.assertEqual(sleeps, [2, 4, 8, 2])
+
+        with mock.patch(f'{command}.dispatch_batch', side_effect=TimeoutError), self.assertRaises(CommandError):
+            call_command('send_notifications', once=True, stdout=StringIO())
+
+
+class FeatureStoreTests(TestCase):
+    def setUp(self):
+        recruiter = make_recruiter()
+        self.job = make_job(recruiter)
+        self.candidates = [make_candidate(salary_min=3000 + 1000 * i) for i in range(4)]
+        for candidate in self.candidates:
+            make_thread(recruiter, candidate, self.job)
+        self.job_skills = list(self.job.skills.values_list('id', flat=True))
+
+    def scores(self, store, candidates):
+        columns = store.columns_for([c.id for c in candidates])
+        return columns.scores(self.job, self.job_skills).tolist()
+
+    def test_loads_lazily_and_refreshes_edits(self):
+        store = CandidateFeatureStore()
+        self.assertEqual(self.scores(store, self.candidates[:2]), [compute_score(c, self.job) for c in self.candidates[:2]])
+        self.assertEqual(len(store), 2)
+
+        edited = self.candidates[0]
+        edited.salary_min = 7500
+        edited.skills_cache = "Django"
+        edited.save()
+        with self.assertNumQueries(5):
+            # Modified ids, reload of the modified rows with skills, the new rows with skills
+            scores = self.scores(store, self.candidates)
+        self.assertEqual(scores, [compute_score(c, self.job) for c in self.candidates])
+        self.assertEqual(len(store), 4)
+        self.assertGreater(store.columns.size, 4)
+
+        store.compact()
+        self.assertEqual(store.columns.size, 4)
+        self.assertEqual(self.scores(store, self.candidates), scores)
+
+    def test_rescore_with_store(self):
+        MessageThread.objects.update(match_score=0)
+        self.assertEqual(rescore_job(self.job, features=CandidateFeatureStore()), 4)
+        self.assertEqual(
+            sorted(MessageThread.objects.values_list('match_score', flat=True)),
+            sorted(compute_score(c, self.job) for c in self.candidates),
+        )
+
+
+class CandidateIndexTests(SimpleTestCase):
+    jobs = BatchScoringTests.jobs + [
+        {'primary_keyword': "Java", 'secondary_keyword': "Python", 'english_level': 'fluent', 'relocate_type': 'no_relocate'},
+        {'extra_keywords': "Kubernetes, Go, Rust", 'accept_region': 'ukraine'},
+    ]
+
+    def setUp(self):
+        candidates = list(synthetic_candidates(600, random.Random(7)))
+        self.rows = [tuple(getattr(c, f) for f in CANDIDATE_FIELDS) for c in candidates]
+        self.skills = [c.skills_cache for c in candidates]
+        patcher = mock.patch.object(matching, 'BLOCK_SIZE', 16)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertTopScores(self, columns, index, job, k, eligible=None):
+        scores = columns.scores(job)
+        if eligible is not None:
+            scores = scores[eligible]
+        result = index.top(columns, job, k, eligible=eligible)
+        self.assertEqual([score for _, score in result.matches], sorted(scores.tolist(), reverse=True)[:k])
+        self.assertEqual(
+            [score for _, score in result.matches], columns.take([p for p, _ in result.matches]).scores(job).tolist()
+        )
+        return result
+
+    def test_top_matches_scoring_all(self):
+        columns = CandidateColumns(self.rows, self.skills)
+        index = CandidateIndex(columns)
+        for kwargs in self.jobs:
+            job = make_job(save=False, **kwargs)
+            with self.subTest(job=kwargs):
+                for k in (1, 10, 700):
+                    result = self.assertTopScores(columns, index, job, k)
+                self.assertEqual(len(result.matches), len(self.rows))
+                self.assertLess(self.assertTopScores(columns, index, job, 5).scored, len(self.rows))
+
+    def test_eligible_and_appended_rows(self):
+        vocab = {}
+        head = CandidateColumns(self.rows[:500], self.skills[:500], vocab=vocab)
+        columns = head.concat(CandidateColumns(self.rows[500:], self.skills[500:], vocab=vocab))
+        index = CandidateIndex(head)
+        eligible = np.ones(columns.size, dtype=bool)
+        eligible[::3] = False
+        for kwargs in self.jobs:
+            job = make_job(save=False, **kwargs)
+            with self.subTest(job=kwargs):
+                result = self.assertTopScores(columns, index, job, 10, eligible)
+                self.assertTrue(all(eligible[p] for p, _ in result.matches))
+
+
+class CandidateMatcherTests(TestCase):
+    def setUp(self):
+        self.recruiter = make_recruiter(id=RECRUITER_ID)
+        self.job = make_job(self.recruiter)
+        self.best = make_candidate(last_seen=timezone.now())
+        self.good = make_candidate(salary_min=5000, last_seen=timezone.now() - timedelta(days=179))
+        self.poor = make_candidate(primary_keyword="PHP", skills_cache="Laravel")
+        self.applied = make_candidate()
+        self.inactive = make_candidate(last_seen=timezone.now() - timedelta(days=365))
+        make_thread(self.recruiter, self.applied, self.job)
+
+    def test_top_candidates(self):
+        matcher = CandidateMatcher()
+        expected = [(c.id, compute_score(c, self.job)) for c in (self.best, self.good, self.poor)]
+        self.assertEqual(matcher.top(self.job, 10), expected)
+        self.assertEqual(matcher.top(self.job, 1), expected[:1])
+
+        self.poor.primary_keyword = "Python"
+        self.poor.skills_cache = "Django, PostgreSQL"
+        self.poor.save()
+        Candidate.objects.filter(id=self.inactive.id).update(last_seen=timezone.now())
+        # Two days later the good candidate has not been seen for too long
+        later = timezone.now() + timedelta(days=2)
+        with mock.patch('sandbox.matching.timezone.now', return_value=later):
+            top = dict(matcher.top(self.job, 10))
+        self.assertEqual(set(top), {self.best.id, self.poor.id, self.inactive.id})
+        self.assertEqual(top[self.poor.id], 100)
+
+    def test_view(self):
+        service = MatcherService()
+        # The refresh thread would not see the test's transaction
+        with mock.patch.object(matching, '_service', service), mock.patch.object(MatcherService, 'start') as start:
+            response = self.client.get(reverse('job_candidates', args=[self.job.id]))
+            self.assertEqual((response.status_code, response['Retry-After']), (503, '10'))
+            service.refresh()
+            response = self.client.get(reverse('job_candidates', args=[self.job.id]), {'limit': 2})
+        self.assertTrue(start.called)
+        self.assertEqual(
+            [(c['id'], c['score']) for c in response.json()['candidates']],
+            [(self.best.id, 100), (self.good.id, compute_score(self.good, self.job))],
+        )
+        other = make_job(make_recruiter())
+        self.assertEqual(self.client.get(reverse('job_candidates', args=[other.id])).status_code, 404)
+
+    def test_service_refreshes_in_background(self):
+        service = MatcherService()
+        service.refresh()
+        with self.assertNumQueries(2), mock.patch.object(MatcherService, 'start'):
+            self.assertEqual(service.top(self.job, 1)[0][0], self.best.id)
+
+        self.best.english_level = 'basic'
+        self.best.save()
+        with mock.patch.object(MatcherService, 'start'):
+            self.assertEqual(service.top(self.job, 1)[0][0], self.best.id)
+            service.refresh()
+            self.assertNotEqual(service.top(self.job, 1)[0][0], self.best.id)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        reset_fragment_cache()
+        self.addCleanup(reset_fragment_cache)
+        reset_view_profiles()
+        recruiter = make_recruiter(id=RECRUITER_ID)
+        job = make_job(recruiter)
+        for _ in range(3):
+            make_message(make_thread(recruiter, make_candidate(), job))
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('inbox'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=')
+        stats = self.client.get(reverse('inbox_profile_stats')).json()
+        self.assertEqual(stats['inbox']['requests'], 1)
+        self.assertGreater(stats['inbox']['render_ms'], 0)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND x = %s'),
+            'SELECT 1 FROM t WHERE id IN (...) AND x = %s',
+        )
+
+    def test_async_requests_run_concurrently(self):
+        async def view(request):
+            await asyncio.sleep(0.2)
+            return HttpResponse()
+
+        middleware = ProfileMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+
+        async def run():
+            return await asyncio.gather(*(middleware(RequestFactory().get('/')) for _ in range(4)))
+
+        started = time.perf_counter()
+        responses = asyncio.run(run())
+        self.assertLess(time.perf_counter() - started, 0.6)
+        self.assertTrue(all('Server-Timing' in response for response in responses))
+
+    @override_settings(VIEW_BUDGETS={'inbox': {'queries': 1}})
+    def test_query_budget(self):
+        with self.assertRaisesMessage(BudgetExceeded, "'queries'"):
+            self.client.get(reverse('inbox'))
+
+    def test_n_plus_one_is_caught(self):
+        with mock.patch.object(QuerySet, 'select_related', lambda qs, *fields: qs):
+            with self.assertRaisesMessage(BudgetExceeded, "Repeated queries"):
+                self.client.get(reverse('inbox'))
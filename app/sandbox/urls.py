@@ -6,5 +6,16 @@ from . import views
 urlpatterns = [
 	path('', RedirectView.as_view(url='/inbox', permanent=False), name='root-redirect'),
   path('inbox/', views.inbox, name='inbox'),
-  path('inbox/<pk>/', views.inbox_thread, name='inbox_thread'),
+  path('inbox/bulk/', views.inbox_bulk, name='inbox_bulk'),
+  path('inbox/changes/', views.inbox_changes, name='inbox_changes'),
+  path('inbox/events/', views.inbox_events, name='inbox_events'),
+  path('inbox/export/', views.inbox_export, name='inbox_export'),
+  path('inbox/facets/', views.inbox_facets, name='inbox_facets'),
+  path('inbox/cache-stats/', views.inbox_cache_stats, name='inbox_cache_stats'),
+  path('inbox/profile-stats/', views.inbox_profile_stats, name='inbox_profile_stats'),
+  path('inbox/<int:pk>/', views.inbox_thread, name='inbox_thread'),
+  path('jobs/<int:pk>/candidates/', views.job_candidates, name='job_candidates'),
+  # Async variants, served concurrently under ASGI (uvicorn project.asgi:application)
+  path('async/inbox/', views.inbox_async, name='inbox_async'),
+  path('async/inbox/<int:pk>/', views.inbox_thread_async, name='inbox_thread_async'),
 ]
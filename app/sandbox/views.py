@@ -1,31 +1,333 @@
-from django.http import HttpResponse
-from django.db.models import Count, Q
-from django.shortcuts import render
+import asyncio
+from datetime import timedelta
 
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.db import close_old_connections, router
+from django.db.models import Count, Exists, OuterRef, Q
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+from django.views.decorators.http import require_POST
 
-from .models import Recruiter, MessageThread
+from .bulk import ACTIONS as BULK_ACTIONS
+from .counters import recruiter_counter
+from .events import STREAM_HEADERS, event_stream
+from .export import FORMATS as EXPORT_FORMATS, export_lines, export_threads
+from .facets import facet_counts, facet_links, filter_threads
+from .fragments import fragment_stats, render_cards
+from .matching import MatcherLoading, top_candidates
+from .models import ArchivedMessage, Candidate, JobPosting, Message, Recruiter, MessageThread
+from .pagination import InvalidCursor, encode_cursor, keyset_page
+from .profiling import capture_queries, view_profiles
+from .routing import replica_reads
+from .scoring import score_badges
+from .search import matching_thread_ids, search_threads
 
 # Hardcode for logged in as recruiter
 RECRUITER_ID = 125528
 
+INBOX_PAGE_SIZE = 50
+
+# Keyset orderings, each backed by a composite index on MessageThread
+INBOX_ORDERING = {
+    'recent': ('-last_updated', '-id'),
+    'score': ('-match_score', '-last_updated', '-id'),
+}
+
+THREAD_PAGE_SIZE = 30
+
+# Changed threads oldest first, the watermark is a keyset cursor in this ordering
+CHANGES_ORDERING = ('last_updated', 'id')
+CHANGES_LIMIT = 100
+# last_updated is stamped before commit, watermarks stay this far back to
+# catch threads committed late; the page replaces the cards it already has
+CHANGES_OVERLAP = timedelta(seconds=30)
+
+THREAD_ORDERING = ('-created', '-id')
+
+MATCH_LIMIT = 20
+MATCH_MAX_LIMIT = 100
+# Seconds, the first load of the matcher takes about that much
+MATCH_RETRY_AFTER = 10
+
+def _inbox_sort(params):
+    sort = params.get('sort', 'recent')
+    return sort if sort in INBOX_ORDERING else 'recent'
+
+def _inbox_page(recruiter_id, params):
+    """``(threads, cards, next_cursor)`` of the requested inbox page, may raise InvalidCursor."""
+    threads = (
+        MessageThread.objects.filter(recruiter_id = recruiter_id)
+        .select_related('candidate', 'job', 'last_message')
+    )
+    threads = filter_threads(threads, params)
+    search = params.get('q', '').strip()
+    if search:
+        # Ranked results replace the sort order and are not paginated
+        threads, next_cursor = search_threads(threads, recruiter_id, search), None
+    else:
+        threads, next_cursor = keyset_page(
+            threads, INBOX_ORDERING[_inbox_sort(params)], params.get('cursor'), INBOX_PAGE_SIZE
+        )
+    return threads, render_cards(threads), next_cursor
+
+def _inbox_context(request, recruiter, page):
+    threads, cards, next_cursor = page
+    next_url = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        query.pop('partial', None)
+        next_url = f"{request.path}?{query.urlencode()}"
+    # Live updates only where new threads belong on top
+    live = set(request.GET) <= {'sort'} and _inbox_sort(request.GET) == 'recent'
+
+    return {
+        'title': "Djinni - Inbox",
+        'recruiter': recruiter,
+        'threads': threads,
+        'cards': cards,
+        'sort': _inbox_sort(request.GET),
+        'search': request.GET.get('q', '').strip(),
+        'next_url': next_url,
+        'changes_since': _changes_watermark(threads[0] if threads else None) if live else None,
+    }
+
+def _sort_urls(params):
+    urls = {}
+    for key in INBOX_ORDERING:
+        query = params.copy()
+        query.pop('cursor', None)
+        query['sort'] = key
+        urls[key] = f"?{query.urlencode()}"
+    return urls
+
+@replica_reads
 def inbox(request):
     recruiter = Recruiter.objects.get(id = RECRUITER_ID)
-    threads = MessageThread.objects.filter(recruiter = recruiter).select_related('candidate', 'job')
+    try:
+        page = _inbox_page(recruiter.id, request.GET)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    _context = _inbox_context(request, recruiter, page)
 
-    _context = { 'title': "Djinni - Inbox", 'recruiter': recruiter, 'threads': threads }
+    if request.GET.get('partial'):
+        return render(request, 'inbox/_threads_page.html', _context)
 
+    _context['counter'] = recruiter_counter(recruiter.id)
+    _context['facets'] = facet_links(facet_counts(recruiter.id), request.GET)
+    _context['sort_urls'] = _sort_urls(request.GET)
     return render(request, 'inbox/chats.html', _context)
 
-def inbox_thread(request, pk):
-    thread = MessageThread.objects.get(id = pk)
-    messages = thread.message_set.all().order_by('created')
+async def _gather(*calls):
+    """
+    Run independent sync calls concurrently, each in a worker thread with
+    its own database connection. Calls must not depend on each other.
+    """
+    def run(call):
+        try:
+            with capture_queries():
+                return call()
+        finally:
+            # Worker threads miss the request_finished cleanup
+            close_old_connections()
+
+    return await asyncio.gather(*(sync_to_async(run, thread_sensitive=False)(call) for call in calls))
+
+@replica_reads
+async def inbox_async(request):
+    """``inbox`` with the recruiter, page, counter and facet queries run concurrently."""
+    params = request.GET
+    calls = [
+        lambda: Recruiter.objects.get(id = RECRUITER_ID),
+        lambda: _inbox_page(RECRUITER_ID, params),
+    ]
+    if not params.get('partial'):
+        calls += [lambda: recruiter_counter(RECRUITER_ID), lambda: facet_counts(RECRUITER_ID)]
+    try:
+        recruiter, page, *extra = await _gather(*calls)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    _context = _inbox_context(request, recruiter, page)
+
+    if params.get('partial'):
+        return await sync_to_async(render)(request, 'inbox/_threads_page.html', _context)
+
+    counter, counts = extra
+    _context['counter'] = counter
+    _context['facets'] = facet_links(counts, params)
+    _context['sort_urls'] = _sort_urls(params)
+    return await sync_to_async(render)(request, 'inbox/chats.html', _context)
 
-    _context = {
+def _changes_watermark(thread=None, overlap=True):
+    """
+    Watermark after ``thread``, the newest one seen, but no later than
+    ``CHANGES_OVERLAP`` ago unless ``overlap`` is false.
+    """
+    horizon = timezone.now() - CHANGES_OVERLAP
+    if thread is None or (overlap and thread.last_updated > horizon):
+        return encode_cursor([horizon, 0])
+    return encode_cursor([thread.last_updated, thread.id])
+
+# Reads the primary: a lagging replica would hold back changes the events announced
+def inbox_changes(request):
+    """Cards of the threads updated after the ``since`` watermark, oldest first."""
+    since = request.GET.get('since')
+    if not since:
+        return HttpResponseBadRequest("Missing watermark")
+    threads = (
+        MessageThread.objects.filter(recruiter_id = RECRUITER_ID)
+        .select_related('candidate', 'job', 'last_message')
+    )
+    try:
+        threads, more = keyset_page(threads, CHANGES_ORDERING, since, CHANGES_LIMIT)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid watermark")
+    return JsonResponse({
+        'cards': [{'id': thread.id, 'html': card} for thread, card in zip(threads, render_cards(threads))],
+        # The next page follows on exactly, the last one goes back to overlap
+        'watermark': _changes_watermark(threads[-1], overlap=more is None) if threads else since,
+        'more': more is not None,
+    })
+
+def inbox_events(request):
+    """Server-sent events announcing inbox changes, served by events.EventStreamApp under ASGI."""
+    response = StreamingHttpResponse(event_stream(RECRUITER_ID), content_type='text/event-stream')
+    for header, value in STREAM_HEADERS.items():
+        response[header] = value
+    return response
+
+def job_candidates(request, pk):
+    """Best matching candidates without a thread for the job, see sandbox.matching."""
+    job = get_object_or_404(JobPosting, pk=pk, recruiter_id = RECRUITER_ID)
+    try:
+        limit = min(int(request.GET.get('limit', MATCH_LIMIT)), MATCH_MAX_LIMIT)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid limit")
+    try:
+        matches = top_candidates(job, limit)
+    except MatcherLoading:
+        response = HttpResponse("Candidates are still loading", status=503)
+        response['Retry-After'] = MATCH_RETRY_AFTER
+        return response
+    candidates = Candidate.objects.only('name', 'position').in_bulk([i for i, _ in matches])
+    return JsonResponse({
+        'candidates': [
+            {'id': i, 'name': candidates[i].name, 'position': candidates[i].position, 'score': score}
+            for i, score in matches if i in candidates
+        ],
+    })
+
+@replica_reads
+def inbox_export(request):
+    """Threads matching the inbox filters, optionally of some ``job`` ids, streamed as CSV or JSON lines."""
+    format = request.GET.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown format")
+    try:
+        job_ids = [int(i) for i in request.GET.getlist('job')]
+    except ValueError:
+        return HttpResponseBadRequest("Invalid job")
+    # Rows are read after the view returned, outside the routing context
+    using = router.db_for_read(MessageThread)
+    threads = export_threads(RECRUITER_ID, request.GET, job_ids, using=using)
+    response = StreamingHttpResponse(export_lines(threads, format), content_type=EXPORT_FORMATS[format])
+    response['Content-Disposition'] = f'attachment; filename="inbox-{timezone.now():%Y%m%d}.{format}"'
+    return response
+
+def _bulk_selection(recruiter_id, params):
+    """Thread ids picked by ``ids``, or with ``select=all`` the threads matching the inbox filters."""
+    if params.get('select') != 'all':
+        return [int(i) for i in params.getlist('ids')]
+    threads = filter_threads(MessageThread.objects.filter(recruiter_id = recruiter_id), params)
+    search = params.get('q', '').strip()
+    if search:
+        threads = threads.filter(id__in=matching_thread_ids(recruiter_id, search))
+    return threads.values('id')
+
+@require_POST
+def inbox_bulk(request):
+    """Apply one bulk action (a bucket, favorite, unfavorite or read) to many threads."""
+    action = BULK_ACTIONS.get(request.POST.get('action'))
+    if action is None:
+        return HttpResponseBadRequest("Unknown action")
+    try:
+        selected = _bulk_selection(RECRUITER_ID, request.POST)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid thread ids")
+    return JsonResponse({'updated': action(RECRUITER_ID, selected)})
+
+def inbox_facets(request):
+    return JsonResponse(facet_counts(RECRUITER_ID))
+
+def inbox_cache_stats(request):
+    return JsonResponse(fragment_stats())
+
+def inbox_profile_stats(request):
+    return JsonResponse(view_profiles())
+
+def _thread(pk):
+    # One probe of the thread index per archived month
+    archived = ArchivedMessage.objects.filter(thread_id=OuterRef('id'))
+    return get_object_or_404(
+        MessageThread.objects.select_related('candidate', 'job').annotate(has_archived=Exists(archived)), id = pk
+    )
+
+def _message_page(thread_id, cursor, archived=False):
+    """
+    Newest page of the thread's messages first, older history is fetched with the cursor on demand.
+    Archived messages, all older than the others, are paged separately.
+    """
+    model = ArchivedMessage if archived else Message
+    messages = model.objects.filter(thread_id = thread_id).select_related('job')
+    messages, older_cursor = keyset_page(messages, THREAD_ORDERING, cursor, THREAD_PAGE_SIZE)
+    messages.reverse()
+    return messages, older_cursor
+
+def _archived(request):
+    return bool(request.GET.get('archived'))
+
+def _thread_context(request, pk, thread, page):
+    messages, older_cursor = page
+    archived = _archived(request)
+    older_url = None
+    if older_cursor:
+        older_url = f"{request.path}?cursor={older_cursor}" + ("&archived=1" if archived else "")
+    elif not archived and thread.has_archived:
+        older_url = f"{request.path}?archived=1"
+
+    return {
         'pk': pk,
         'title': "Djinni - Inbox",
         'thread': thread,
         'messages': messages,
         'candidate': thread.candidate,
+        'badges': score_badges(thread),
+        'older_url': older_url,
+        'older_archived': older_url is not None and (archived or not older_cursor),
     }
 
-    return render(request, 'inbox/thread.html', _context)
+def _thread_template(request):
+    return 'inbox/_messages_page.html' if request.GET.get('partial') else 'inbox/thread.html'
+
+@replica_reads
+def inbox_thread(request, pk):
+    thread = _thread(pk)
+    try:
+        page = _message_page(thread.id, request.GET.get('cursor'), _archived(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, _thread_template(request), _thread_context(request, pk, thread, page))
+
+@replica_reads
+async def inbox_thread_async(request, pk):
+    """``inbox_thread`` with the thread and message queries run concurrently."""
+    try:
+        thread, page = await _gather(
+            lambda: _thread(pk),
+            lambda: _message_page(pk, request.GET.get('cursor'), _archived(request)),
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    _context = _thread_context(request, pk, thread, page)
+    return await sync_to_async(render)(request, _thread_template(request), _context)